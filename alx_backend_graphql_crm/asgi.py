@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx_backend_graphql_crm.settings')
+# Serve /graphql with the async view (see CRM_ASYNC_GRAPHQL).
+os.environ.setdefault('CRM_ASYNC_GRAPHQL', '1')
 
 application = get_asgi_application()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -127,11 +128,95 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Keep graphene-django from adding its DjangoDebugMiddleware when DEBUG is on:
+# the schema has no ``_debug`` field to read it, yet it wraps every DB cursor
+# for the rest of the process and formats each SQL statement it sees.
+GRAPHENE = {
+    'SCHEMA': 'alx_backend_graphql_crm.schema.schema',
+    'MIDDLEWARE': [],
+}
+
 CRONJOBS = [
     ('*/5 * * * *', 'crm.cron.log_crm_heartbeat'),
     ('0 */12 * * *', 'crm.cron.update_low_stock'),
 ]
 
+# Scheduled jobs execute GraphQL in-process (crm/client.py). Set this to
+# exercise the web server end to end from the heartbeat instead.
+CRM_HEARTBEAT_OVER_HTTP = False
+CRM_GRAPHQL_URL = 'http://localhost:8000/graphql'
+
+# SDL used by internal gql clients instead of introspecting on every run
+# (python manage.py export_client_schema; refreshed automatically if stale).
+CRM_CLIENT_SCHEMA_PATH = BASE_DIR / 'schema.graphql'
+
+# Fixture databases and JSON results of manage.py benchmark_graphql.
+CRM_BENCHMARK_DIR = BASE_DIR / 'benchmarks'
+
+# Per-resolver timing and SQL capture for /graphql, aggregated at /metrics.
+# Off by default; when on, responses carry an ``extensions.tracing`` block
+# unless CRM_PROFILING_TRACE_RESPONSES is False. /metrics names operations
+# and resolver fields, so it is for staff users, or for a scraper sending
+# ``Authorization: Bearer <CRM_METRICS_TOKEN>``.
+CRM_PROFILING = False
+CRM_PROFILING_TRACE_RESPONSES = True
+CRM_METRICS_TOKEN = os.environ.get('CRM_METRICS_TOKEN') or None
+
+# Parsed and validated GraphQL documents kept per process (crm/documents.py).
+CRM_DOCUMENT_CACHE_SIZE = 500
+
+# Automatic persisted queries on /graphql (crm/persisted_queries.py). Any
+# client, signed in or not, can register documents: into the Django cache,
+# bounded by its eviction (per-process LocMem unless CACHES says otherwise),
+# or into the DatabaseStore's table, capped at CRM_PERSISTED_QUERY_MAX_STORED.
+# With the allowlist on, nothing is registered from requests and only
+# documents added by register_persisted_queries can run; that requires the
+# DatabaseStore, since the command runs in a process of its own.
+CRM_PERSISTED_QUERIES = True
+CRM_PERSISTED_QUERY_STORE = 'crm.persisted_queries.CacheStore'
+CRM_PERSISTED_QUERY_LRU_SIZE = 1000
+CRM_PERSISTED_QUERY_MAX_STORED = 10000
+CRM_PERSISTED_QUERY_ALLOWLIST = False
+
+# Static cost analysis before execution (crm/cost.py). Operations above the
+# cost or depth budget are rejected; CRM_QUERY_COST_RATE (points per minute
+# per client, None for no limit) throttles sustained load. The estimated
+# cost is reported in ``extensions.cost``.
+CRM_QUERY_COST_ANALYSIS = True
+CRM_QUERY_MAX_COST = 10000
+CRM_QUERY_MAX_DEPTH = 15
+CRM_QUERY_COST_WEIGHTS = {}
+CRM_QUERY_COST_RATE = None
+CRM_QUERY_COST_STATS_TTL = 300
+
+# Response cache for successful read-only queries, invalidated by per-model
+# version counters kept in the same cache. With several workers, point
+# CRM_RESPONSE_CACHE_ALIAS at a shared backend (e.g. Redis), or a write in
+# one worker will not reach the others.
+CRM_RESPONSE_CACHE = True
+CRM_RESPONSE_CACHE_ALIAS = 'default'
+CRM_RESPONSE_CACHE_TTL = 300
+
+# Async GraphQL endpoint (crm.views.AsyncCRMGraphQLView). asgi.py turns it
+# on, so /graphql is async under ASGI and sync under WSGI. Root fields of a
+# query resolve concurrently on a pool of CRM_ASYNC_GRAPHQL_WORKERS threads,
+# each holding its own DB connection.
+CRM_ASYNC_GRAPHQL = os.environ.get('CRM_ASYNC_GRAPHQL', '') == '1'
+CRM_ASYNC_GRAPHQL_WORKERS = 16
+
+# Streaming exports (/export/<model>, manage.py export_data): rows fetched
+# per database round trip, and the most ever held in memory at once.
+CRM_EXPORT_CHUNK_SIZE = 2000
+
+# Bulk order imports (bulkCreateOrders, manage.py import_orders): rows
+# validated and inserted per transaction.
+CRM_IMPORT_BATCH_SIZE = 5000
+
+# Trigram search (crm/search.py): matches read before ranking or filtering.
+# A search with more matches skips bm25, which would scan the whole index, and
+# a name/email filter with more stays a LIKE scan.
+CRM_SEARCH_CANDIDATES = 1000
+
 
 # Celery Configuration
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
@@ -14,13 +14,18 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
-from graphene_django.views import GraphQLView
 from django.views.decorators.csrf import csrf_exempt
+from crm.views import AsyncCRMGraphQLView, CRMGraphQLView, export_view, metrics_view
 from .schema import schema
 
+GraphQLEndpoint = AsyncCRMGraphQLView if settings.CRM_ASYNC_GRAPHQL else CRMGraphQLView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('graphql', csrf_exempt(GraphQLView.as_view(graphiql=True, schema=schema))),
+    path('graphql', csrf_exempt(GraphQLEndpoint.as_view(graphiql=True, schema=schema))),
+    path('metrics', metrics_view),
+    path('export/<str:name>', export_view),
 ]
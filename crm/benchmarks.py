@@ -0,0 +1,298 @@
+import asyncio
+import json
+import math
+import statistics
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.db import close_old_connections, connection, transaction
+from django.test import AsyncClient, Client, override_settings
+from django.urls import path
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+
+
+class BenchmarkError(Exception):
+    """A benchmark document failed to execute."""
+
+
+# ==========================
+# Documents
+# ==========================
+# The hot paths of the API. Variables are built per run because the seeded
+# order dates are relative to the day the fixture database was created.
+ORDERS_FILTERED = """
+query OrdersFiltered($since: DateTime!, $min: Decimal!) {
+  allOrders(first: 50, orderDate_Gte: $since, totalAmount_Gte: $min, orderBy: "-order_date") {
+    edges {
+      node {
+        id
+        orderDate
+        totalAmount
+        customer { name email }
+        products { edges { node { name price } } }
+      }
+    }
+    pageInfo { hasNextPage endCursor }
+  }
+}
+"""
+
+CUSTOMERS_SEARCH = """
+query CustomersSearch($name: String!) {
+  allCustomers(first: 50, name: $name, orderBy: "name") {
+    edges { node { id name email phone } }
+    pageInfo { hasNextPage endCursor }
+  }
+}
+"""
+
+PRODUCTS_PRICE_RANGE = """
+query ProductsPriceRange($low: Decimal!, $high: Decimal!) {
+  allProducts(first: 50, price_Gte: $low, price_Lte: $high, orderBy: "price") {
+    edges { node { id name price stock } }
+    pageInfo { hasNextPage endCursor }
+  }
+}
+"""
+
+RESTOCK = """
+mutation Restock {
+  updateLowStockProducts(threshold: 10, amount: 10) {
+    success
+    updatedProducts { id name stock }
+  }
+}
+"""
+
+REPORT = """
+query Report($start: Date!, $end: Date!) {
+  crmStats { customerCount orderCount revenue }
+  revenueBetween(start: $start, end: $end) { orderCount revenue }
+  productSales(start: $start, end: $end, first: 10) { product { name } units }
+}
+"""
+
+
+def default_benchmarks():
+    """``{name: (query, variables)}`` for every benchmarked document."""
+    today = timezone.localdate()
+    return {
+        "orders_filtered": (
+            ORDERS_FILTERED,
+            {"since": (timezone.now() - timedelta(days=90)).isoformat(), "min": "50"},
+        ),
+        "customers_search": (CUSTOMERS_SEARCH, {"name": "Customer 12"}),
+        "products_price_range": (PRODUCTS_PRICE_RANGE, {"low": "20", "high": "60"}),
+        "restock_mutation": (RESTOCK, {}),
+        "report": (REPORT, {"start": str(today - timedelta(days=365)), "end": str(today)}),
+    }
+
+
+# ==========================
+# Measurement
+# ==========================
+def percentile(samples, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    rank = max(1, math.ceil(pct / 100 * len(samples)))
+    return samples[rank - 1]
+
+
+class Runner:
+    """
+    Posts documents to the GraphQL endpoint through the full Django stack
+    (middleware, view, schema). Every request runs in a transaction that is
+    rolled back, so mutations measure the same starting data each time.
+    """
+
+    def __init__(self, path="/graphql"):
+        # ``localhost`` passes ALLOWED_HOSTS validation while DEBUG is on.
+        self.client = Client(HTTP_HOST="localhost")
+        self.path = path
+
+    def post(self, query, variables):
+        with transaction.atomic():
+            start = time.perf_counter()
+            response = self.client.post(
+                self.path, json.dumps({"query": query, "variables": variables}),
+                content_type="application/json",
+            )
+            elapsed = time.perf_counter() - start
+            transaction.set_rollback(True)
+        payload = response.json()
+        if response.status_code != 200 or payload.get("errors"):
+            raise BenchmarkError(payload.get("errors") or response.status_code)
+        return elapsed
+
+    def measure(self, query, variables, repeat=20, warmup=3):
+        """Latency percentiles (ms), SQL queries per request and peak Python memory (KiB)."""
+        for _ in range(warmup):
+            self.post(query, variables)
+        samples = sorted(self.post(query, variables) * 1000 for _ in range(repeat))
+
+        # Counted with an execute wrapper: the test client's request_started
+        # handling resets connection.queries mid-request.
+        statements = []
+
+        def record(execute, sql, params, many, context):
+            statements.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            self.post(query, variables)
+
+        # Separate run: tracemalloc slows allocation-heavy code down noticeably.
+        tracemalloc.start()
+        try:
+            self.post(query, variables)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        return {
+            "p50_ms": round(percentile(samples, 50), 3),
+            "p95_ms": round(percentile(samples, 95), 3),
+            "p99_ms": round(percentile(samples, 99), 3),
+            "mean_ms": round(statistics.fmean(samples), 3),
+            # Transaction bookkeeping (savepoints) is not the resolvers' doing.
+            "queries": sum(1 for sql in statements if "SAVEPOINT" not in sql),
+            "peak_kib": round(peak / 1024, 1),
+        }
+
+
+def run_suite(benchmarks=None, repeat=20, warmup=3, response_cache=False):
+    """
+    Measure every benchmark. The response cache is off unless asked for:
+    with it, every sample after the first is a cache hit and the resolvers
+    being benchmarked never run.
+    """
+    runner = Runner()
+    benchmarks = benchmarks or default_benchmarks()
+    with override_settings(CRM_RESPONSE_CACHE=response_cache):
+        return {
+            name: runner.measure(query, variables, repeat=repeat, warmup=warmup)
+            for name, (query, variables) in benchmarks.items()
+        }
+
+
+# ==========================
+# Concurrency
+# ==========================
+# Throughput of the sync view behind a threaded WSGI server against the
+# async view behind ASGI, with many clients at once. Both run in-process
+# through Django's test handlers; this URLconf pins each to its own path.
+class ConcurrencyURLConf:
+    def __init__(self):
+        from alx_backend_graphql_crm.schema import schema
+        from .views import AsyncCRMGraphQLView, CRMGraphQLView
+
+        self.urlpatterns = [
+            path("sync", csrf_exempt(CRMGraphQLView.as_view(schema=schema))),
+            path("async", csrf_exempt(AsyncCRMGraphQLView.as_view(schema=schema))),
+        ]
+
+
+def check(status_code, payload):
+    if status_code != 200 or payload.get("errors"):
+        raise BenchmarkError(payload.get("errors") or status_code)
+
+
+def summarize(samples, elapsed):
+    samples = sorted(samples)
+    return {
+        "requests": len(samples),
+        "rps": round(len(samples) / elapsed, 1),
+        "p50_ms": round(percentile(samples, 50), 3),
+        "p95_ms": round(percentile(samples, 95), 3),
+    }
+
+
+def wsgi_throughput(body, clients, requests, path="/sync"):
+    """``clients`` threads, as a threaded WSGI server would run them, each posting ``requests`` times."""
+    samples, lock = [], threading.Lock()
+
+    def client_loop():
+        client = Client(HTTP_HOST="localhost")
+        try:
+            for _ in range(requests):
+                start = time.perf_counter()
+                response = client.post(path, body, content_type="application/json")
+                elapsed = (time.perf_counter() - start) * 1000
+                check(response.status_code, response.json())
+                with lock:
+                    samples.append(elapsed)
+        finally:
+            close_old_connections()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        for future in [pool.submit(client_loop) for _ in range(clients)]:
+            future.result()
+    return summarize(samples, time.perf_counter() - start)
+
+
+def asgi_throughput(body, clients, requests, path="/async"):
+    """``clients`` concurrent tasks on one event loop, each posting ``requests`` times."""
+    samples = []
+
+    async def client_loop():
+        client = AsyncClient()
+        for _ in range(requests):
+            start = time.perf_counter()
+            response = await client.post(path, body, content_type="application/json")
+            samples.append((time.perf_counter() - start) * 1000)
+            check(response.status_code, response.json())
+
+    async def main():
+        await asyncio.gather(*(client_loop() for _ in range(clients)))
+
+    start = time.perf_counter()
+    asyncio.run(main())
+    return summarize(samples, time.perf_counter() - start)
+
+
+def run_throughput(benchmarks=None, clients=100, requests=5):
+    """``{name: {"wsgi": ..., "asgi": ...}}`` for every read-only benchmark."""
+    benchmarks = benchmarks or default_benchmarks()
+    results = {}
+    # The async test client always sends ``Host: testserver``.
+    hosts = ["localhost", "testserver"]
+    with override_settings(ROOT_URLCONF=ConcurrencyURLConf(), ALLOWED_HOSTS=hosts, CRM_RESPONSE_CACHE=False):
+        for name, (query, variables) in benchmarks.items():
+            if query.lstrip().startswith("mutation"):
+                continue  # Writes are serialized by the database either way.
+            body = json.dumps({"query": query, "variables": variables})
+            results[name] = {
+                "wsgi": wsgi_throughput(body, clients, requests),
+                "asgi_sync_view": asgi_throughput(body, clients, requests, path="/sync"),
+                "asgi": asgi_throughput(body, clients, requests),
+            }
+    return results
+
+
+# ==========================
+# Regression Gate
+# ==========================
+def compare(baseline, current, max_slowdown=0.2, max_memory_growth=0.2):
+    """
+    Regressions of ``current`` against ``baseline`` (both ``{scale: {name:
+    metrics}}``), as readable strings. Latency (p50) and memory may grow by the
+    given fraction; any extra SQL query is a regression.
+    """
+    regressions = []
+    for scale, results in current.items():
+        for name, metrics in results.items():
+            before = baseline.get(scale, {}).get(name)
+            if before is None:
+                continue
+            label = f"{scale}/{name}"
+            if metrics["queries"] > before["queries"]:
+                regressions.append(f"{label}: {before['queries']} -> {metrics['queries']} queries")
+            if metrics["p50_ms"] > before["p50_ms"] * (1 + max_slowdown):
+                regressions.append(f"{label}: p50 {before['p50_ms']:.2f} -> {metrics['p50_ms']:.2f} ms")
+            if metrics["peak_kib"] > before["peak_kib"] * (1 + max_memory_growth):
+                regressions.append(f"{label}: peak {before['peak_kib']:.0f} -> {metrics['peak_kib']:.0f} KiB")
+    return regressions
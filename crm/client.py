@@ -0,0 +1,180 @@
+import atexit
+import hashlib
+import os
+from pathlib import Path
+from types import SimpleNamespace
+
+from django.conf import settings
+from graphql import DocumentNode, build_schema, execute_sync, parse, validate
+
+from .documents import get_document_cache
+
+
+class LocalQueryError(Exception):
+    """A document executed in-process returned GraphQL errors."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("; ".join(error.message for error in errors))
+
+
+def as_document(request):
+    """Accept a query string, a parsed DocumentNode or a ``gql()`` request."""
+    if isinstance(request, str):
+        return parse(request)
+    if isinstance(request, DocumentNode):
+        return request
+    return request.document
+
+
+# ==========================
+# In-process Client
+# ==========================
+class LocalClient:
+    """
+    Executes GraphQL documents directly against the project schema.
+
+    Scheduled jobs run inside a Django process already, so going through
+    ``http://localhost:8000/graphql`` only added a network hop, a web worker
+    slot and a JSON round trip. ``execute()`` mirrors ``gql.Client.execute``:
+    it returns the ``data`` dict and raises when the result has errors.
+    """
+
+    def __init__(self, schema=None):
+        if schema is None:
+            from alx_backend_graphql_crm.schema import schema
+        self.schema = schema.graphql_schema
+
+    def execute(self, request, variable_values=None, operation_name=None):
+        if isinstance(request, str):
+            # Shares the web view's parsed-document cache.
+            document, errors = get_document_cache().lookup(self.schema, request)
+        else:
+            document = as_document(request)
+            errors = validate(self.schema, document)
+        if not errors:
+            # A fresh context per call keeps request-scoped loaders isolated.
+            result = execute_sync(
+                self.schema,
+                document,
+                context_value=SimpleNamespace(),
+                variable_values=variable_values,
+                operation_name=operation_name,
+            )
+            errors = result.errors
+        if errors:
+            raise LocalQueryError(errors)
+        return result.data
+
+
+# ==========================
+# Client Schema Artifact
+# ==========================
+# gql clients used to start every run with an introspection query
+# (fetch_schema_from_transport=True). The schema they need is the one in this
+# codebase, so it is written once as SDL with a hash header and loaded from
+# disk; the hash is compared on first use and the file rewritten if stale.
+_client_schema = None
+
+
+def schema_artifact_path():
+    default = Path(settings.BASE_DIR) / "schema.graphql"
+    return Path(getattr(settings, "CRM_CLIENT_SCHEMA_PATH", default))
+
+
+def write_schema_artifact(path=None):
+    """Write the project schema as SDL; returns ``(path, sha256)``."""
+    from alx_backend_graphql_crm.schema import schema
+
+    path = Path(path or schema_artifact_path())
+    sdl = str(schema)
+    digest = hashlib.sha256(sdl.encode()).hexdigest()
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(f"# sha256: {digest}\n{sdl}\n")
+    tmp.replace(path)
+    return path, digest
+
+
+def read_schema_artifact(path=None):
+    """Return ``(sha256, sdl)`` from the artifact, or ``(None, None)`` if missing."""
+    path = Path(path or schema_artifact_path())
+    try:
+        header, sdl = path.read_text().split("\n", 1)
+    except (FileNotFoundError, ValueError):
+        return None, None
+    return header.removeprefix("# sha256: "), sdl
+
+
+def client_schema():
+    """The GraphQLSchema shared by every internal gql client in this process."""
+    global _client_schema
+    if _client_schema is None:
+        from alx_backend_graphql_crm.schema import schema
+
+        digest, sdl = read_schema_artifact()
+        current = hashlib.sha256(str(schema).encode()).hexdigest()
+        if digest != current:
+            write_schema_artifact()
+            digest, sdl = read_schema_artifact()
+        _client_schema = build_schema(sdl)
+    return _client_schema
+
+
+# ==========================
+# HTTP Client (opt-in)
+# ==========================
+class HttpClient:
+    """
+    The same interface over a real HTTP round trip, for end-to-end health checks.
+
+    The client validates against the cached schema artifact instead of
+    introspecting, and keeps one connected session (and so one pooled
+    ``requests.Session``) for the life of the worker process.
+    """
+
+    def __init__(self, url=None):
+        from gql import Client
+        from gql.transport.requests import RequestsHTTPTransport
+
+        transport = RequestsHTTPTransport(
+            url=url or getattr(settings, "CRM_GRAPHQL_URL", "http://localhost:8000/graphql"),
+            verify=False,
+            retries=3,
+        )
+        self.client = Client(transport=transport, schema=client_schema())
+        self.session = self.client.connect_sync()
+        atexit.register(self.close)
+
+    def execute(self, request, variable_values=None, operation_name=None):
+        from gql import GraphQLRequest
+
+        request = GraphQLRequest(
+            as_document(request), variable_values=variable_values, operation_name=operation_name
+        )
+        return self.session.execute(request)
+
+    def close(self):
+        self.client.close_sync()
+
+
+_local_client = None
+_http_client = None
+_http_client_pid = None
+
+
+def get_client(http=False):
+    """
+    Client for internal jobs: in-process by default, over HTTP when ``http``
+    is true (e.g. the heartbeat with ``CRM_HEARTBEAT_OVER_HTTP = True``).
+    Both are created once per process and reused.
+    """
+    global _local_client, _http_client, _http_client_pid
+    if http:
+        # Sessions must not be shared across fork()ed worker processes.
+        if _http_client is None or _http_client_pid != os.getpid():
+            _http_client = HttpClient()
+            _http_client_pid = os.getpid()
+        return _http_client
+    if _local_client is None:
+        _local_client = LocalClient()
+    return _local_client
@@ -0,0 +1,295 @@
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist
+from graphene.utils.str_converters import to_snake_case
+from graphene_django import DjangoObjectType
+from graphene_django.settings import graphene_settings
+from graphql import (
+    FieldNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    GraphQLList,
+    GraphQLNonNull,
+    InlineFragmentNode,
+    get_named_type,
+    get_operation_ast,
+    is_composite_type,
+)
+from graphql.execution.values import get_argument_values, get_variable_values
+from graphql.language import FragmentDefinitionNode
+
+
+# ==========================
+# Settings
+# ==========================
+DEFAULT_WEIGHTS = {
+    # Whole-table aggregates cost more than fetching one row.
+    "Query.crmStats": 25,
+    "Mutation.updateLowStockProducts": 25,
+}
+DEFAULT_LIST_SIZE = 10
+
+
+def cost_settings():
+    return {
+        "enabled": getattr(settings, "CRM_QUERY_COST_ANALYSIS", True),
+        "max_cost": getattr(settings, "CRM_QUERY_MAX_COST", 10_000),
+        "max_depth": getattr(settings, "CRM_QUERY_MAX_DEPTH", 15),
+        "weights": {**DEFAULT_WEIGHTS, **getattr(settings, "CRM_QUERY_COST_WEIGHTS", {})},
+        "rate": getattr(settings, "CRM_QUERY_COST_RATE", None),
+    }
+
+
+class QueryCostError(Exception):
+    """An operation over the cost, depth or rate budget."""
+
+    def __init__(self, message, code, report=None):
+        super().__init__(message)
+        self.code = code
+        self.report = report
+
+    def as_graphql_error(self):
+        return GraphQLError(str(self), extensions={"code": self.code})
+
+
+# ==========================
+# Cardinality Estimates
+# ==========================
+# Row counts per table, refreshed every CRM_QUERY_COST_STATS_TTL seconds.
+# They only scale list sizes, so a few minutes of staleness is harmless.
+_row_counts = {}
+_row_counts_lock = threading.Lock()
+
+
+def row_count(model):
+    ttl = getattr(settings, "CRM_QUERY_COST_STATS_TTL", 300)
+    now = time.monotonic()
+    with _row_counts_lock:
+        cached = _row_counts.get(model)
+    if cached and now - cached[1] < ttl:
+        return cached[0]
+    count = model._default_manager.count()
+    with _row_counts_lock:
+        _row_counts[model] = (count, now)
+    return count
+
+
+def fanout(parent_model, field_name):
+    """Average number of related rows per ``parent_model`` row through ``field_name``."""
+    try:
+        field = parent_model._meta.get_field(field_name)
+    except FieldDoesNotExist:
+        return None
+    if field.many_to_many:
+        rows = row_count(getattr(field, "through", None) or field.remote_field.through)
+    elif field.one_to_many:
+        rows = row_count(field.related_model)
+    else:
+        return None
+    return rows / max(1, row_count(parent_model))
+
+
+def model_of(graphql_type):
+    graphene_type = getattr(get_named_type(graphql_type), "graphene_type", None)
+    meta = getattr(graphene_type, "_meta", None)
+    if meta is None:
+        return None
+    node = getattr(meta, "node", None)  # connection types
+    if node is not None:
+        meta = node._meta
+        graphene_type = node
+    if isinstance(graphene_type, type) and issubclass(graphene_type, DjangoObjectType):
+        return meta.model
+    return None
+
+
+def is_connection(graphql_type):
+    return get_named_type(graphql_type).name.endswith("Connection")
+
+
+def is_list(graphql_type):
+    if isinstance(graphql_type, GraphQLNonNull):
+        graphql_type = graphql_type.of_type
+    return isinstance(graphql_type, GraphQLList)
+
+
+# ==========================
+# Static Analysis
+# ==========================
+class CostAnalysis:
+    """
+    Estimated cost and depth of one operation, computed from the validated
+    document and its variables before anything executes.
+
+    Every composite field costs its weight (1 unless configured) for each
+    object it is expected to return. Lists and connections multiply the cost
+    of their selections by their estimated size: ``first`` (or the relay
+    page limit) capped by table row counts, or by the average fan-out of the
+    relation for nested connections. Scalars and introspection are free.
+    """
+
+    def __init__(self, schema, document, operation_name=None, variables=None, weights=None):
+        self.schema = schema
+        self.weights = weights if weights is not None else DEFAULT_WEIGHTS
+        self.fragments = {
+            definition.name.value: definition
+            for definition in document.definitions
+            if isinstance(definition, FragmentDefinitionNode)
+        }
+        self.operation = get_operation_ast(document, operation_name)
+        self.variables = {}
+        if self.operation is not None:
+            coerced = get_variable_values(schema, self.operation.variable_definitions or (), variables or {})
+            if isinstance(coerced, dict):
+                self.variables = coerced
+        self.cost = self.depth = 0
+        if self.operation is not None:
+            root = schema.get_root_type(self.operation.operation)
+            self.cost, self.depth = self.selection_cost(root, self.operation.selection_set, 1.0, set())
+            self.cost = math.ceil(self.cost)
+
+    def fields(self, parent_type, selection_set, visited):
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                yield parent_type, selection
+            elif isinstance(selection, InlineFragmentNode):
+                fragment_type = (
+                    self.schema.get_type(selection.type_condition.name.value)
+                    if selection.type_condition else parent_type
+                )
+                yield from self.fields(fragment_type, selection.selection_set, visited)
+            elif isinstance(selection, FragmentSpreadNode):
+                name = selection.name.value
+                fragment = self.fragments.get(name)
+                if fragment is None or name in visited:
+                    continue
+                fragment_type = self.schema.get_type(fragment.type_condition.name.value)
+                yield from self.fields(fragment_type, fragment.selection_set, visited | {name})
+
+    def selection_cost(self, parent_type, selection_set, multiplier, visited, wrapper=0):
+        """
+        ``(cost, depth)`` of a selection resolved ``multiplier`` times.
+        ``wrapper`` marks a connection (2) or its edge type (1): ``edges``,
+        ``node`` and ``pageInfo`` are free, the connection field already
+        carries the page size.
+        """
+        total, depth = 0.0, 0
+        parent_model = model_of(parent_type)
+        for owner, node in self.fields(parent_type, selection_set, visited):
+            name = node.name.value
+            if name.startswith("__"):
+                continue
+            field = getattr(owner, "fields", {}).get(name)
+            if field is None:
+                continue
+            weight = self.weights.get(f"{owner.name}.{name}")
+            composite = is_composite_type(get_named_type(field.type))
+            if weight is None:
+                weight = 1 if composite and not wrapper else 0
+            size, child_wrapper = 1, 0
+            if composite and node.selection_set:
+                if is_connection(field.type):
+                    size, child_wrapper = self.list_size(field, node, parent_model), 2
+                elif wrapper:
+                    child_wrapper = 1 if wrapper == 2 and name == "edges" else 0
+                else:
+                    size = self.list_size(field, node, parent_model)
+            # Charged per object fetched: a list of 50 costs 50 times its weight.
+            total += weight * multiplier * max(size, 1)
+            child_depth = 0
+            if composite and node.selection_set:
+                cost, child_depth = self.selection_cost(
+                    get_named_type(field.type), node.selection_set, multiplier * size, visited, child_wrapper
+                )
+                total += cost
+            depth = max(depth, child_depth + 1)
+        return total, depth
+
+    def list_size(self, field, node, parent_model):
+        """Expected items for one resolution of ``field``; 1 for single objects."""
+        connection, plain_list = is_connection(field.type), is_list(field.type)
+        if not (connection or plain_list):
+            return 1
+        try:
+            args = get_argument_values(field, node, self.variables)
+        except GraphQLError:
+            args = {}
+        first = args.get("first")
+        if connection and first is None:
+            first = graphene_settings.RELAY_CONNECTION_MAX_LIMIT
+        model = model_of(field.type)
+        estimate = None
+        if parent_model is not None:
+            estimate = fanout(parent_model, to_snake_case(node.name.value))
+        if estimate is None and model is not None:
+            estimate = row_count(model)
+        if first is None:
+            return estimate if estimate is not None else DEFAULT_LIST_SIZE
+        return min(first, estimate) if estimate is not None else first
+
+
+# ==========================
+# Budget
+# ==========================
+def client_key(request):
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    return f"ip:{request.META.get('REMOTE_ADDR', 'unknown')}"
+
+
+def spend(key, cost):
+    """Add ``cost`` to the one-minute window at ``key`` and return the window's total."""
+    cache.add(key, 0, 60)
+    try:
+        return cache.incr(key, cost)
+    except ValueError:
+        # The window expired (or was evicted) between add() and incr().
+        if cache.add(key, cost, 60):
+            return cost
+        return cache.incr(key, cost)
+
+
+def check_budget(request, schema, document, operation_name, variables):
+    """
+    Analyze an operation and enforce the budgets. Returns the report for
+    ``extensions.cost``; raises ``QueryCostError`` when over a limit.
+    """
+    config = cost_settings()
+    analysis = CostAnalysis(schema, document, operation_name, variables, config["weights"])
+    report = {
+        "requested": analysis.cost,
+        "maximum": config["max_cost"],
+        "depth": analysis.depth,
+        "maxDepth": config["max_depth"],
+    }
+    if analysis.depth > config["max_depth"]:
+        raise QueryCostError(
+            f"Query depth {analysis.depth} exceeds the maximum of {config['max_depth']}.", "QUERY_TOO_DEEP", report
+        )
+    if analysis.cost > config["max_cost"]:
+        raise QueryCostError(
+            f"Query cost {analysis.cost} exceeds the maximum of {config['max_cost']}.", "QUERY_TOO_COSTLY", report
+        )
+    if config["rate"]:
+        # Fixed one-minute window of cost points per client, shared via the cache.
+        window = int(time.time() // 60)
+        key = f"crm:cost:{client_key(request)}:{window}"
+        spent = spend(key, analysis.cost)
+        report["throttle"] = {
+            "limit": config["rate"],
+            "remaining": max(0, config["rate"] - spent),
+            "resetIn": 60 - int(time.time() % 60),
+        }
+        if spent > config["rate"]:
+            raise QueryCostError(
+                f"Cost budget of {config['rate']} per minute exhausted; retry in "
+                f"{report['throttle']['resetIn']}s.",
+                "COST_RATE_LIMITED",
+                report,
+            )
+    return report
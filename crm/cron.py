@@ -1,28 +1,24 @@
 from datetime import datetime
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
+
+from django.conf import settings
+
+from .client import get_client
 
 
 def log_crm_heartbeat():
     """Logs a heartbeat message and checks GraphQL endpoint responsiveness."""
     log_file = "/tmp/crm_heartbeat_log.txt"
 
-    # Define the GraphQL transport
-    transport = RequestsHTTPTransport(
-        url="http://localhost:8000/graphql/",  # Adjust if your GraphQL endpoint is different
-        verify=False,
-        retries=3,
-    )
-
-    # Create the GraphQL client
-    client = Client(transport=transport, fetch_schema_from_transport=True)
+    # Runs against the schema in-process; set CRM_HEARTBEAT_OVER_HTTP = True
+    # to check the web server end to end instead.
+    client = get_client(http=getattr(settings, "CRM_HEARTBEAT_OVER_HTTP", False))
 
     # Define a simple query (the hello field)
-    query = gql("""
+    query = """
     query {
         hello
     }
-    """)
+    """
 
     try:
         # Execute the query
@@ -41,18 +37,11 @@ def update_low_stock():
     """Executes a GraphQL mutation to update low-stock products and logs results."""
     log_file = "/tmp/low_stock_updates_log.txt"
 
-    # Define the GraphQL transport
-    transport = RequestsHTTPTransport(
-        url="http://localhost:8000/graphql/",  # Adjust if needed
-        verify=False,
-        retries=3,
-    )
-
-    # Create the GraphQL client
-    client = Client(transport=transport, fetch_schema_from_transport=True)
+    # Execute in-process against the project schema
+    client = get_client()
 
     # Define the mutation
-    mutation = gql("""
+    mutation = """
     mutation {
         updateLowStockProducts {
             success
@@ -64,7 +53,7 @@ def update_low_stock():
             }
         }
     }
-    """)
+    """
 
     try:
         # Execute the mutation
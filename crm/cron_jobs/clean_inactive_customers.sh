@@ -5,16 +5,10 @@ PROJECT_DIR="/home/alx-backend-graphql_crm"
 
 # source "$PROJECT_DIR/venv/bin/activate"
 
-# Get the count of deleted customers and log it
-deleted_count=$(python3 "$PROJECT_DIR/manage.py" shell -c "
-from django.utils import timezone
-from datetime import timedelta
-from crm.models import Customer
-one_year_ago = timezone.now() - timedelta(days=365)
-deleted, _ = Customer.objects.filter(orders__order_date__lt=one_year_ago).delete()
-print(deleted)
-")
+# Delete customers with no order in the last year, in chunks, and keep the
+# summary line ("Deleted N customers (M orders) in ...")
+summary=$(python3 "$PROJECT_DIR/manage.py" cleanup_inactive_customers --days 365 | tail -n 1)
 
 # Log the result with a timestamp
 timestamp=$(date '+%Y-%m-%d %H:%M:%S')
-echo \"[$timestamp] Deleted customers: $deleted_count\" >> /tmp/customer_cleanup_log.txt
+echo "[$timestamp] $summary" >> /tmp/customer_cleanup_log.txt
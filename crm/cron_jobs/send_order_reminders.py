@@ -1,35 +1,56 @@
 #!/usr/bin/env python3
 import datetime
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
+import os
+import sys
+
+# Run in-process against the project schema instead of over HTTP
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, PROJECT_DIR)
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "alx_backend_graphql_crm.settings")
+
+import django
+
+django.setup()
+
+from crm.client import get_client
 
-# GraphQL endpoint
-GRAPHQL_URL = "http://localhost:8000/graphql"
 
 def get_recent_orders():
-    """Fetch pending orders created within the last 7 days."""
-    transport = RequestsHTTPTransport(url=GRAPHQL_URL, verify=False)
-    client = Client(transport=transport, fetch_schema_from_transport=True)
+    """Fetch orders placed within the last 7 days."""
+    client = get_client()
 
     # Date 7 days ago
-    seven_days_ago = (datetime.datetime.now() - datetime.timedelta(days=7)).date().isoformat()
-
-    # GraphQL query
-    query = gql("""
-        query GetRecentOrders($startDate: Date!) {
-            orders(filter: { order_date_Gte: $startDate, status: "PENDING" }) {
-                id
-                customer {
-                    email
+    seven_days_ago = (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=7)).isoformat()
+
+    # GraphQL query (allOrders is keyset-paginated, so walk every page)
+    query = """
+        query GetRecentOrders($startDate: DateTime!, $after: String) {
+            allOrders(orderDate_Gte: $startDate, after: $after) {
+                edges {
+                    node {
+                        id
+                        customer {
+                            email
+                        }
+                        orderDate
+                    }
+                }
+                pageInfo {
+                    hasNextPage
+                    endCursor
                 }
-                order_date
             }
         }
-    """)
+    """
 
-    variables = {"startDate": seven_days_ago}
-    result = client.execute(query, variable_values=variables)
-    return result.get("orders", [])
+    orders, after = [], None
+    while True:
+        variables = {"startDate": seven_days_ago, "after": after}
+        page = client.execute(query, variable_values=variables)["allOrders"]
+        orders += [edge["node"] for edge in page["edges"]]
+        if not page["pageInfo"]["hasNextPage"]:
+            return orders
+        after = page["pageInfo"]["endCursor"]
 
 def log_reminders(orders):
     """Log each order reminder with timestamp."""
@@ -0,0 +1,79 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from graphql import GraphQLError, parse, validate
+
+
+# ==========================
+# Parsed Document Cache
+# ==========================
+class DocumentCache:
+    """
+    LRU of parsed and validated ``DocumentNode``s, keyed by the schema, the
+    validation rules and a SHA-256 of the query text.
+
+    Clients send the same few documents over and over; parsing and
+    validating them again on every request costs more than executing a small
+    query. Only documents that validated cleanly are stored, so a hit can go
+    straight to execution. Invalid documents are re-checked each time.
+    """
+
+    def __init__(self, maxsize=500):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.entries = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+
+    def lookup(self, schema, query, rules=None, max_errors=None):
+        """Return ``(document, errors)``; ``errors`` is None for a valid document."""
+        key = (id(schema), tuple(rules or ()), hashlib.sha256(query.encode()).digest())
+        with self.lock:
+            document = self.entries.get(key)
+            if document is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return document, None
+            self.misses += 1
+
+        try:
+            document = parse(query)
+        except GraphQLError as error:
+            return None, [error]
+        errors = validate(schema, document, rules, max_errors)
+        if errors:
+            return document, errors
+
+        if self.maxsize > 0:
+            with self.lock:
+                self.entries[key] = document
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.maxsize:
+                    self.entries.popitem(last=False)
+                    self.evictions += 1
+        return document, None
+
+    def stats(self):
+        with self.lock:
+            return {
+                "size": len(self.entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+_document_cache = None
+
+
+def get_document_cache():
+    """The process-wide cache, sized by ``CRM_DOCUMENT_CACHE_SIZE`` (0 disables storing)."""
+    global _document_cache
+    if _document_cache is None:
+        _document_cache = DocumentCache(getattr(settings, "CRM_DOCUMENT_CACHE_SIZE", 500))
+    return _document_cache
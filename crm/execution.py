@@ -0,0 +1,63 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from graphql import ExecutionContext
+
+from .loaders import Loaders, scoped_loaders
+
+
+# ==========================
+# Concurrent Root Fields
+# ==========================
+# Django's async ORM (``acount``, ``aiterator``, ...) hands every query to the
+# one thread-sensitive sync thread, so independent root fields awaiting it
+# would still run one after another. Each root field instead resolves its
+# whole subtree in a worker thread of its own, with its own DB connection.
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Worker pool for root fields, sized by ``CRM_ASYNC_GRAPHQL_WORKERS`` (bounds DB connections)."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "CRM_ASYNC_GRAPHQL_WORKERS", 16),
+                thread_name_prefix="crm-graphql",
+            )
+        return _executor
+
+
+def in_worker(func, *args):
+    """Awaitable running ``func(*args)`` in the pool with request loaders of its own."""
+
+    def call():
+        # Loaders are not thread-safe; siblings running at the same time
+        # must not share one. The token is dropped with the copied context.
+        scoped_loaders.set(Loaders())
+        close_old_connections()
+        try:
+            return func(*args)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(call, thread_sensitive=False, executor=get_executor())()
+
+
+class ConcurrentRootExecutionContext(ExecutionContext):
+    """
+    Execution context that resolves every root field, subtree included, in
+    a worker thread. Root fields of a query are awaited together, so a
+    document selecting ``crmStats``, ``revenueBetween`` and ``productSales``
+    takes as long as the slowest of them rather than their sum. Mutations
+    must not use it: their root fields run serially by definition.
+    """
+
+    def execute_field(self, parent_type, source, field_nodes, path):
+        if path.prev is not None:
+            return super().execute_field(parent_type, source, field_nodes, path)
+        return in_worker(super().execute_field, parent_type, source, field_nodes, path)
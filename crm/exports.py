@@ -0,0 +1,143 @@
+import csv
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .filters import CustomerFilter, OrderFilter, ProductFilter
+from .models import Customer, Order, Product
+
+
+class ExportError(Exception):
+    """An export that cannot run: unknown model, format or filter, or invalid filter values."""
+
+
+# ==========================
+# Exports
+# ==========================
+class Export:
+    """
+    Rows of one model, filtered by its FilterSet from ``crm/filters.py`` and
+    read with ``iterator(chunk_size=...)``: a server-side cursor where the
+    backend has one, ``fetchmany`` otherwise. Only one chunk is ever held in
+    memory, however many rows match.
+    """
+
+    def __init__(self, model, filterset_class, columns):
+        self.model = model
+        self.filterset_class = filterset_class
+        # ``values()`` lookups in output order, and the keys they appear under.
+        self.columns = columns
+        self.names = [column.replace("__", "_") for column in columns]
+
+    def queryset(self, params):
+        # A FilterSet ignores keys it does not declare, which would silently
+        # export every row for a typo or a camelCase GraphQL argument name.
+        unknown = sorted(set(params) - set(self.filterset_class.base_filters))
+        if unknown:
+            raise ExportError(
+                f"Unknown filter {', '.join(map(repr, unknown))}; "
+                f"choose from {', '.join(self.filterset_class.base_filters)}."
+            )
+        filterset = self.filterset_class(params, queryset=self.model.objects.all())
+        if not filterset.is_valid():
+            raise ExportError(
+                "; ".join(f"{field}: {' '.join(errors)}" for field, errors in filterset.errors.items())
+            )
+        return filterset.qs.order_by("pk").values_list(*self.columns)
+
+    def rows(self, params, chunk_size=None):
+        chunk_size = chunk_size or getattr(settings, "CRM_EXPORT_CHUNK_SIZE", 2000)
+        chunk = []
+        for values in self.queryset(params).iterator(chunk_size=chunk_size):
+            chunk.append(dict(zip(self.names, values)))
+            if len(chunk) >= chunk_size:
+                yield from self.complete(chunk)
+                chunk = []
+        if chunk:
+            yield from self.complete(chunk)
+
+    @property
+    def headers(self):
+        return self.names
+
+    def complete(self, chunk):
+        """Hook for columns that need one extra query per chunk."""
+        return chunk
+
+
+class OrderExport(Export):
+    """Orders with their product ids, fetched for a whole chunk at once."""
+
+    @property
+    def headers(self):
+        return [*self.names, "product_ids"]
+
+    def complete(self, chunk):
+        product_ids = defaultdict(list)
+        lines = (
+            Order.products.through.objects.filter(order_id__in=[row["id"] for row in chunk])
+            .order_by("order_id", "product_id")
+            .values_list("order_id", "product_id")
+        )
+        for order_id, product_id in lines:
+            product_ids[order_id].append(product_id)
+        for row in chunk:
+            row["product_ids"] = product_ids[row["id"]]
+        return chunk
+
+
+EXPORTS = {
+    "customers": Export(Customer, CustomerFilter, ["id", "name", "email", "phone", "created_at"]),
+    "products": Export(Product, ProductFilter, ["id", "name", "price", "stock"]),
+    "orders": OrderExport(
+        Order, OrderFilter, ["id", "customer_id", "customer__name", "order_date", "total_amount"]
+    ),
+}
+
+
+# ==========================
+# Formats
+# ==========================
+class Echo:
+    """File-like object whose ``write`` returns the line instead of buffering it."""
+
+    def write(self, value):
+        return value
+
+
+def ndjson_lines(export, rows):
+    encoder = DjangoJSONEncoder(separators=(",", ":"))
+    for row in rows:
+        yield encoder.encode(row) + "\n"
+
+
+def csv_lines(export, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(export.headers)
+    for row in rows:
+        yield writer.writerow(
+            [" ".join(map(str, value)) if isinstance(value, list) else value for value in row.values()]
+        )
+
+
+FORMATS = {
+    "ndjson": (ndjson_lines, "application/x-ndjson"),
+    "csv": (csv_lines, "text/csv"),
+}
+
+
+def export_lines(name, export_format, params, chunk_size=None):
+    """
+    ``(lines, content_type)`` for export ``name`` in ``export_format``.
+    Filters are validated here, before the first line is produced; rows are
+    only read as ``lines`` is consumed.
+    """
+    export = EXPORTS.get(name)
+    if export is None:
+        raise ExportError(f"Unknown export {name!r}; choose from {', '.join(EXPORTS)}.")
+    if export_format not in FORMATS:
+        raise ExportError(f"Unknown format {export_format!r}; choose from {', '.join(FORMATS)}.")
+    export.queryset(params)
+    render, content_type = FORMATS[export_format]
+    return render(export, export.rows(params, chunk_size)), content_type
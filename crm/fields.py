@@ -0,0 +1,181 @@
+import base64
+import datetime
+import json
+from decimal import Decimal
+
+import graphene
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import F, Q
+from graphene.utils.str_converters import to_snake_case
+from graphene_django.filter import DjangoFilterConnectionField
+from graphene_django.settings import graphene_settings
+from graphql import GraphQLError
+
+from .loaders import get_loaders
+
+
+PAGINATION_ARGS = ("first", "last", "before", "after", "offset")
+
+
+def has_filter_args(args):
+    """True when a connection was called with any non-pagination argument."""
+    return any(v is not None for k, v in args.items() if k not in PAGINATION_ARGS)
+
+
+def filter_args(args):
+    """The FilterSet data among a connection's arguments."""
+    return {k: v for k, v in args.items() if k not in PAGINATION_ARGS and v is not None}
+
+
+# ==========================
+# Loader-aware Connection Field
+# ==========================
+class BatchedFilterConnectionField(DjangoFilterConnectionField):
+    """
+    DjangoFilterConnectionField that accepts lists already fetched by a
+    DataLoader.
+
+    When a resolver returns a plain list the rows came out of a batched
+    loader, so they are paginated as-is instead of being re-filtered (which
+    would need a per-parent queryset and bring the N+1 back). With filter
+    arguments the loader has already applied the FilterSet to the batch
+    (see ``Loaders.filtered``).
+    """
+
+    @classmethod
+    def resolve_queryset(cls, connection, iterable, info, args, filtering_args, filterset_class):
+        if isinstance(iterable, list):
+            return iterable
+        return super().resolve_queryset(
+            connection, iterable, info, args, filtering_args, filterset_class
+        )
+
+
+# ==========================
+# Keyset (cursor) Pagination
+# ==========================
+class Keyset:
+    """
+    Ordering on ``(order_by field, pk)`` and the cursors that seek into it.
+
+    Cursors carry the last row's sort value and pk, so the next page is a
+    ``WHERE (field, pk) > (value, id)`` range scan on an index instead of an
+    OFFSET that walks every skipped row. Rows with a NULL sort value come
+    last in either direction.
+    """
+
+    def __init__(self, model, order_by=None):
+        order_by = to_snake_case(order_by or "id")
+        self.descending = order_by.startswith("-")
+        name = order_by.lstrip("-")
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            field = None
+        if field is None or not field.concrete or field.is_relation:
+            raise GraphQLError(f"Cannot order {model.__name__} by '{order_by}'.")
+        self.field = field
+        self.name = "pk" if field.primary_key else field.attname
+
+    @property
+    def ordering(self):
+        sign = "-" if self.descending else ""
+        if self.name == "pk":
+            return [f"{sign}pk"]
+        if self.field.null:
+            value = F(self.name)
+            return [value.desc(nulls_last=True) if self.descending else value.asc(nulls_last=True), f"{sign}pk"]
+        return [f"{sign}{self.name}", f"{sign}pk"]
+
+    def seek(self, cursor):
+        """Q object selecting the rows strictly after ``cursor``."""
+        try:
+            value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            value = self.field.to_python(value)
+        except (ValueError, TypeError, ValidationError):
+            raise GraphQLError(f"Invalid cursor '{cursor}'.")
+        op = "lt" if self.descending else "gt"
+        if self.name == "pk":
+            return Q(**{f"pk__{op}": value})
+        if value is None:
+            return Q(**{f"{self.name}__isnull": True, f"pk__{op}": pk})
+        after = Q(**{f"{self.name}__{op}": value}) | Q(**{self.name: value, f"pk__{op}": pk})
+        return after | Q(**{f"{self.name}__isnull": True}) if self.field.null else after
+
+    def cursor(self, row):
+        value = row.keyset_value
+        if isinstance(value, Decimal):
+            value = str(value)
+        elif isinstance(value, datetime.date):
+            value = value.isoformat()
+        payload = json.dumps([value, row.pk]).encode()
+        return base64.urlsafe_b64encode(payload).decode()
+
+
+class KeysetConnectionField(DjangoFilterConnectionField):
+    """
+    DjangoFilterConnectionField paginated by keyset instead of offset.
+
+    Filtering arguments come from the node type's ``filterset_class``, so
+    the FilterSet is the only filtering engine. The filtered queryset is
+    ordered by ``orderBy``, seeks past ``after`` and fetches ``first + 1``
+    rows to decide ``hasNextPage``. ``first`` defaults to, and may not
+    exceed, ``RELAY_CONNECTION_MAX_LIMIT``. ``last``/``before``/``offset``
+    are not offered: they cannot be served without scanning.
+    """
+
+    def __init__(self, type_, *args, **kwargs):
+        super().__init__(type_, *args, **kwargs)
+        for name in ("before", "last", "offset"):
+            self._base_args.pop(name, None)
+        self._base_args["order_by"] = graphene.Argument(graphene.String)
+
+    @classmethod
+    def connection_resolver(
+        cls,
+        resolver,
+        connection,
+        default_manager,
+        queryset_resolver,
+        max_limit,
+        enforce_first_or_last,
+        root,
+        info,
+        **args,
+    ):
+        first = args.get("first")
+        after = args.get("after")
+        if first is None:
+            first = max_limit
+        if first < 0:
+            raise GraphQLError("Argument 'first' must be a non-negative integer.")
+        if first > max_limit:
+            raise GraphQLError(
+                f"Requesting {first} records on the `{info.field_name}` connection "
+                f"exceeds the `first` limit of {max_limit} records."
+            )
+
+        iterable = resolver(root, info, **args)
+        if iterable is None:
+            iterable = default_manager
+        queryset = queryset_resolver(connection, iterable, info, args)
+
+        keyset = Keyset(queryset.model, args.get("order_by"))
+        queryset = queryset.annotate(keyset_value=F(keyset.name)).order_by(*keyset.ordering)
+        if after:
+            queryset = queryset.filter(keyset.seek(after))
+
+        rows = list(queryset[:first + 1])
+        has_next_page = len(rows) > first
+        rows = get_loaders(info).prime_rows(rows[:first])
+
+        edges = [connection.Edge(node=row, cursor=keyset.cursor(row)) for row in rows]
+        return connection(
+            edges=edges,
+            page_info=graphene.relay.PageInfo(
+                start_cursor=edges[0].cursor if edges else None,
+                end_cursor=edges[-1].cursor if edges else None,
+                has_previous_page=bool(after),
+                has_next_page=has_next_page,
+            ),
+        )
@@ -1,30 +1,67 @@
 import django_filters
+from django.db.models import Exists, OuterRef, Q
+from . import search
 from .models import Customer, Product, Order
 
 
+def filter_contains(queryset, name, value):
+    """``icontains`` on ``name``, served by the trigram search index where it exists."""
+    *path, column = name.split("__")
+    model = queryset.model
+    for step in path:
+        model = model._meta.get_field(step).related_model
+    prefix = "".join(f"{step}__" for step in path)
+    return queryset.filter(search.contains(model, column, value, prefix=prefix, using=queryset.db))
+
+
 # ==========================
 # Customer Filter
 # ==========================
 class CustomerFilter(django_filters.FilterSet):
-    name = django_filters.CharFilter(field_name="name", lookup_expr="icontains")
-    email = django_filters.CharFilter(field_name="email", lookup_expr="icontains")
+    name = django_filters.CharFilter(field_name="name", method=filter_contains)
+    email = django_filters.CharFilter(field_name="email", method=filter_contains)
     created_at__gte = django_filters.DateFilter(field_name="created_at", lookup_expr="gte")
     created_at__lte = django_filters.DateFilter(field_name="created_at", lookup_expr="lte")
     phone_pattern = django_filters.CharFilter(method="filter_phone_pattern")
+    # Denormalized order stats: these never touch the orders table.
+    order_count__gte = django_filters.NumberFilter(field_name="order_count", lookup_expr="gte")
+    order_count__lte = django_filters.NumberFilter(field_name="order_count", lookup_expr="lte")
+    lifetime_value__gte = django_filters.NumberFilter(field_name="lifetime_value", lookup_expr="gte")
+    lifetime_value__lte = django_filters.NumberFilter(field_name="lifetime_value", lookup_expr="lte")
+    last_order_at__gte = django_filters.DateTimeFilter(field_name="last_order_at", lookup_expr="gte")
+    last_order_at__lte = django_filters.DateTimeFilter(field_name="last_order_at", lookup_expr="lte")
+    no_order_since = django_filters.DateTimeFilter(method="filter_no_order_since")
 
     def filter_phone_pattern(self, queryset, name, value):
         return queryset.filter(phone__startswith=value)
 
+    def filter_no_order_since(self, queryset, name, value):
+        # Customers who never ordered count as inactive too.
+        return queryset.filter(Q(last_order_at__lt=value) | Q(last_order_at__isnull=True))
+
     class Meta:
         model = Customer
-        fields = ["name", "email", "created_at__gte", "created_at__lte", "phone_pattern"]
+        fields = [
+            "name",
+            "email",
+            "created_at__gte",
+            "created_at__lte",
+            "phone_pattern",
+            "order_count__gte",
+            "order_count__lte",
+            "lifetime_value__gte",
+            "lifetime_value__lte",
+            "last_order_at__gte",
+            "last_order_at__lte",
+            "no_order_since",
+        ]
 
 
 # ==========================
 # Product Filter
 # ==========================
 class ProductFilter(django_filters.FilterSet):
-    name = django_filters.CharFilter(field_name="name", lookup_expr="icontains")
+    name = django_filters.CharFilter(field_name="name", method=filter_contains)
     price__gte = django_filters.NumberFilter(field_name="price", lookup_expr="gte")
     price__lte = django_filters.NumberFilter(field_name="price", lookup_expr="lte")
     stock__gte = django_filters.NumberFilter(field_name="stock", lookup_expr="gte")
@@ -43,12 +80,25 @@ class OrderFilter(django_filters.FilterSet):
     total_amount__lte = django_filters.NumberFilter(field_name="total_amount", lookup_expr="lte")
     order_date__gte = django_filters.DateTimeFilter(field_name="order_date", lookup_expr="gte")
     order_date__lte = django_filters.DateTimeFilter(field_name="order_date", lookup_expr="lte")
-    customer_name = django_filters.CharFilter(field_name="customer__name", lookup_expr="icontains")
-    product_name = django_filters.CharFilter(field_name="products__name", lookup_expr="icontains")
+    customer_name = django_filters.CharFilter(field_name="customer__name", method=filter_contains)
+    product_name = django_filters.CharFilter(method="filter_by_product_name")
     product_id = django_filters.NumberFilter(method="filter_by_product_id")
 
+    # M2M filters are subqueries on the through table rather than joins: an
+    # order matches once no matter how many of its lines qualify, so no
+    # DISTINCT is needed and several product filters combine without
+    # multiplying rows.
+    def filter_by_product_name(self, queryset, name, value):
+        lines = Order.products.through.objects.filter(
+            search.contains(Product, "name", value, prefix="product__", using=queryset.db), order_id=OuterRef("pk")
+        )
+        return queryset.filter(Exists(lines))
+
     def filter_by_product_id(self, queryset, name, value):
-        return queryset.filter(products__id=value).distinct()
+        # A semi-join (IN) rather than a correlated EXISTS: it can be driven
+        # from the product_id index, so a rarely-ordered product stays cheap.
+        lines = Order.products.through.objects.filter(product_id=value)
+        return queryset.filter(pk__in=lines.values("order_id"))
 
     class Meta:
         model = Order
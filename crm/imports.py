@@ -0,0 +1,366 @@
+import csv
+import datetime
+import json
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import connection, transaction
+from django.db.models.functions import Lower
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import rollups
+from .models import Customer, Order, OrderLine, Product
+from .reports import to_cents
+from .response_cache import invalidate
+
+
+def insert_rows(model, fields, rows, returning=False):
+    """
+    Multi-row INSERT of pre-adapted value tuples via ``executemany``.
+
+    bulk_create spends ~30µs per row building model instances and preparing
+    each value; for the order and order-line tables that dominates a
+    million-row load, so those rows are written as plain tuples instead.
+    With ``returning``, rows go in multi-row ``VALUES`` batches instead and
+    the new primary keys are returned in row order, as bulk_create reads
+    them where the backend can.
+    """
+    qn, opts = connection.ops.quote_name, model._meta
+    columns = ", ".join(qn(opts.get_field(name).column) for name in fields)
+    placeholders = f"({', '.join(['%s'] * len(fields))})"
+    sql = f"INSERT INTO {qn(opts.db_table)} ({columns}) VALUES "
+    with connection.cursor() as cursor:
+        if not returning:
+            cursor.executemany(sql + placeholders, rows)
+            return None
+        if not connection.features.can_return_rows_from_bulk_insert:
+            ids = []
+            for row in rows:
+                cursor.execute(sql + placeholders, row)
+                ids.append(cursor.lastrowid)
+            return ids
+        rows = list(rows)
+        size = connection.ops.bulk_batch_size([opts.get_field(name) for name in fields], rows) or len(rows)
+        returning_sql = f" RETURNING {qn(opts.pk.column)}"
+        ids = []
+        for start in range(0, len(rows), size):
+            batch = rows[start:start + size]
+            cursor.execute(
+                sql + ", ".join([placeholders] * len(batch)) + returning_sql,
+                [value for row in batch for value in row],
+            )
+            ids.extend(row[0] for row in cursor.fetchall())
+        return ids
+
+
+class RowError(Exception):
+    """One input row that cannot be imported; the rest of the batch still is."""
+
+
+class ImportResult:
+    """Ids of the orders created, in input order, and ``(index, message)`` for every rejected row."""
+
+    def __init__(self):
+        self.order_ids = []
+        self.errors = []
+
+    @property
+    def created(self):
+        return len(self.order_ids)
+
+
+# ==========================
+# Input Formats
+# ==========================
+def ndjson_rows(lines):
+    """One decoded object per non-blank line; a malformed line becomes a ``RowError`` row."""
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as error:
+            yield RowError(f"Invalid JSON: {error}")
+
+
+def csv_rows(lines):
+    """One dict per CSV record, keyed by the header row; empty cells become ``None``."""
+    for record in csv.DictReader(lines):
+        yield {key: value or None for key, value in record.items()}
+
+
+INPUT_FORMATS = {"ndjson": ndjson_rows, "csv": csv_rows}
+
+
+# ==========================
+# Row Validation
+# ==========================
+def parse_order(row):
+    """
+    ``(email, order_date, {product_id: [quantity, unit_price]})`` for one
+    input row, checked for shape only; customers and products are looked up
+    for a whole chunk at once. A product listed twice has its quantities
+    added up.
+    """
+    if isinstance(row, RowError):
+        raise row  # rejected while decoding, e.g. a malformed NDJSON line
+    if not isinstance(row, dict):
+        raise RowError("Expected an object.")
+    email = row.get("customer_email")
+    if not isinstance(email, str) or not email.strip():
+        raise RowError("customer_email is required.")
+
+    order_date = row.get("order_date")
+    if order_date is None:
+        order_date = timezone.now()
+    elif not isinstance(order_date, datetime.datetime):
+        try:
+            order_date = parse_datetime(str(order_date))
+        except ValueError:
+            order_date = None
+        if order_date is None:
+            raise RowError(f"order_date {row['order_date']!r} is not an ISO 8601 datetime.")
+    if timezone.is_naive(order_date):
+        order_date = timezone.make_aware(order_date)
+
+    lines = row.get("lines")
+    if not isinstance(lines, list) or not lines:
+        raise RowError("An order needs at least one line.")
+    items = {}
+    for line in lines:
+        if not isinstance(line, dict):
+            raise RowError("Each line must be an object.")
+        product_id = line.get("product_id")
+        if isinstance(product_id, bool) or not str(product_id).isdigit():
+            raise RowError(f"{product_id!r} is not a product id.")
+        quantity = line.get("quantity", 1)
+        if isinstance(quantity, bool) or not isinstance(quantity, int) or quantity < 1:
+            raise RowError(f"Quantity for product {product_id} must be a whole number of at least 1.")
+        unit_price = line.get("unit_price")
+        if unit_price is not None:
+            try:
+                price = Decimal(str(unit_price))
+            except InvalidOperation:
+                price = None
+            if price is None or not price.is_finite() or price < 0:
+                raise RowError(f"unit_price {unit_price!r} for product {product_id} is not a non-negative number.")
+            unit_price = to_cents(price)
+        item = items.setdefault(int(product_id), [0, unit_price])
+        if item[1] != unit_price:
+            raise RowError(f"Product {product_id} is listed twice with different prices.")
+        item[0] += quantity
+    return normalize_email(email), order_date, items
+
+
+# ==========================
+# Bulk Import
+# ==========================
+def import_orders(rows, batch_size=None):
+    """
+    Create orders and their lines from ``rows``, an iterable of dicts::
+
+        {"customer_email": "...", "order_date": "2024-05-01T10:00:00Z",
+         "lines": [{"product_id": 7, "quantity": 2, "unit_price": "9.99"}]}
+
+    ``order_date`` defaults to now and ``unit_price`` to the product's
+    current price. Rows are read ``batch_size`` at a time; each chunk costs
+    one customer lookup, one product lookup, a multi-row insert of orders
+    (ids read back with ``RETURNING``), one of lines and a few rollup
+    upserts, in a single transaction. Invalid rows are reported by index and
+    skipped; the rest of the chunk is still written. Imported orders record sales that already
+    happened, so stock is left alone (``Order.objects.place`` reserves it).
+    """
+    batch_size = batch_size or getattr(settings, "CRM_IMPORT_BATCH_SIZE", 5000)
+    result = ImportResult()
+    chunk = []
+    for index, row in enumerate(rows):
+        chunk.append((index, row))
+        if len(chunk) >= batch_size:
+            import_chunk(chunk, result)
+            chunk = []
+    if chunk:
+        import_chunk(chunk, result)
+    return result
+
+
+def import_chunk(chunk, result):
+    parsed, errors = [], []
+    for index, row in chunk:
+        try:
+            parsed.append((index, *parse_order(row)))
+        except RowError as error:
+            errors.append((index, str(error)))
+
+    customers = {email: pk for email, (_, pk) in customers_by_email({email for _, email, _, _ in parsed}).items()}
+    prices = dict(
+        Product.objects.filter(pk__in={pk for *_, items in parsed for pk in items}).values_list("pk", "price")
+    )
+
+    total_field = Order._meta.get_field("total_amount")
+    max_total = Decimal(10) ** (total_field.max_digits - total_field.decimal_places)
+    orders, baskets = [], []
+    for index, email, order_date, items in parsed:
+        if email not in customers:
+            errors.append((index, f"No customer with email {email!r}."))
+            continue
+        missing = sorted(pk for pk in items if pk not in prices)
+        if missing:
+            errors.append((index, f"Unknown product ids: {', '.join(map(str, missing))}."))
+            continue
+        basket = [(pk, quantity, prices[pk] if price is None else price) for pk, (quantity, price) in items.items()]
+        total = to_cents(sum(price * quantity for _, quantity, price in basket))
+        if total >= max_total:
+            errors.append((index, f"Order total {total} is too large."))
+            continue
+        orders.append((customers[email], order_date, total))
+        baskets.append(basket)
+    result.errors.extend(sorted(errors))
+    if not orders:
+        return
+
+    adapt_datetime, adapt_decimal = connection.ops.adapt_datetimefield_value, connection.ops.adapt_decimalfield_value
+    with transaction.atomic():
+        order_ids = insert_rows(
+            Order,
+            ("customer", "order_date", "total_amount"),
+            [(customer_id, adapt_datetime(order_date), adapt_decimal(total)) for customer_id, order_date, total in orders],
+            returning=True,
+        )
+        insert_rows(
+            OrderLine,
+            ("order", "product", "quantity", "unit_price"),
+            [
+                (order_id, pk, quantity, adapt_decimal(price))
+                for order_id, basket in zip(order_ids, baskets)
+                for pk, quantity, price in basket
+            ],
+        )
+        # Raw inserts skip the model signals.
+        days = [rollups.order_day(order_date) for _, order_date, _ in orders]
+        rollups.apply_batch(
+            ((day, customer_id, total) for day, (customer_id, _, total) in zip(days, orders)),
+            ((day, pk, quantity) for day, basket in zip(days, baskets) for pk, quantity, _ in basket),
+        )
+        rollups.apply_customer_batch(orders)
+        invalidate(Order)
+    result.order_ids.extend(order_ids)
+
+
+# ==========================
+# Customer Upserts
+# ==========================
+class UpsertResult:
+    """
+    Customers created, updated and rejected, with ``(index, message)`` for
+    the first ``max_errors`` rejected rows (all of them when ``None``).
+    """
+
+    def __init__(self, max_errors=None):
+        self.created = 0
+        self.updated = 0
+        self.rejected = 0
+        self.errors = []
+        self.max_errors = max_errors
+
+    def reject(self, index, message):
+        self.rejected += 1
+        if self.max_errors is None or len(self.errors) < self.max_errors:
+            self.errors.append((index, message))
+
+
+def normalize_email(value):
+    email = str(value or "").strip().lower()
+    try:
+        validate_email(email)
+    except ValidationError:
+        raise RowError(f"{value!r} is not a valid email address.")
+    return email
+
+
+def customers_by_email(emails):
+    """
+    ``{email: (stored email, pk)}`` for the customers matching ``emails``
+    (normalized) in any case: rows written before emails were normalized,
+    or outside the importers, may keep their original case.
+    """
+    found = {}
+    rows = Customer.objects.annotate(email_lower=Lower("email")).filter(email_lower__in=emails)
+    for lower, email, pk in rows.values_list("email_lower", "email", "pk"):
+        if lower not in found or email == lower:
+            found[lower] = (email, pk)
+    return found
+
+
+def normalize_phone(value):
+    """Digits with an optional leading ``+``, e.g. ``"(555) 010-9999"`` -> ``"5550109999"``."""
+    phone = str(value or "").strip()
+    if not phone:
+        return None
+    digits = re.sub(r"[\s().\-/]", "", phone)
+    if not re.fullmatch(r"\+?\d{3,19}", digits):
+        raise RowError(f"{value!r} is not a phone number.")
+    return digits
+
+
+def parse_customer(row):
+    if isinstance(row, RowError):
+        raise row
+    if not isinstance(row, dict):
+        raise RowError("Expected an object.")
+    name = str(row.get("name") or "").strip()
+    if not name:
+        raise RowError("name is required.")
+    if len(name) > Customer._meta.get_field("name").max_length:
+        raise RowError("name is too long.")
+    return Customer(name=name, email=normalize_email(row.get("email")), phone=normalize_phone(row.get("phone")))
+
+
+def upsert_customers(rows, batch_size=None, max_errors=None):
+    """
+    Create or update customers from ``rows`` (dicts with ``name``, ``email``
+    and ``phone``), keyed on the unique email. Emails are lowercased and
+    phones reduced to digits; the input is the source of truth for name and
+    phone, while ``created_at`` and the stored email (which may differ in
+    case) are kept for existing customers.
+
+    ``rows`` is consumed lazily, ``batch_size`` at a time, so memory stays
+    flat however large the input (pass ``max_errors`` to bound the error
+    list too). Each batch is one existence query and one
+    ``INSERT ... ON CONFLICT (email) DO UPDATE``; within a batch, the last
+    row for an email wins.
+    """
+    batch_size = batch_size or getattr(settings, "CRM_IMPORT_BATCH_SIZE", 5000)
+    result = UpsertResult(max_errors)
+    batch = {}
+    for index, row in enumerate(rows):
+        try:
+            customer = parse_customer(row)
+        except RowError as error:
+            result.reject(index, str(error))
+            continue
+        batch[customer.email] = customer
+        if len(batch) >= batch_size:
+            upsert_batch(batch, result)
+            batch = {}
+    if batch:
+        upsert_batch(batch, result)
+    return result
+
+
+def upsert_batch(batch, result):
+    with transaction.atomic():
+        existing = customers_by_email(batch)
+        # ON CONFLICT compares emails exactly: upsert onto them as stored.
+        for email, (stored, _) in existing.items():
+            batch[email].email = stored
+        Customer.objects.bulk_create(
+            batch.values(), update_conflicts=True, unique_fields=["email"], update_fields=["name", "phone"]
+        )
+        # bulk_create skips the model signals.
+        invalidate(Customer)
+    result.updated += len(existing)
+    result.created += len(batch) - len(existing)
@@ -0,0 +1,232 @@
+from collections import defaultdict
+from contextvars import ContextVar
+from functools import partial
+
+from django.core.exceptions import ValidationError
+from django.db.models import F
+
+from .models import Customer, Order, OrderLine, Product
+
+
+# ==========================
+# Batching DataLoader
+# ==========================
+class DataLoader:
+    """
+    Synchronous, per-request batching loader.
+
+    graphql-core's sync executor resolves list items one after another, so
+    there is no event-loop tick to collect keys on. Instead, resolvers that
+    return a list of parents *prime* the loader with every child key they
+    may ask for; the first ``load()`` miss then fetches all queued keys in a
+    single ``batch_load_fn`` call and every sibling is served from cache.
+    """
+
+    def __init__(self, batch_load_fn):
+        self.batch_load_fn = batch_load_fn
+        self._cache = {}
+        self._queue = {}
+
+    def prime(self, keys):
+        """Queue keys to be fetched with the next batch."""
+        for key in keys:
+            if key not in self._cache:
+                self._queue[key] = None
+
+    def load(self, key):
+        if key not in self._cache:
+            self._queue[key] = None
+            self.dispatch()
+        return self._cache[key]
+
+    def load_many(self, keys):
+        keys = list(keys)
+        self.prime(keys)
+        return [self.load(key) for key in keys]
+
+    def dispatch(self):
+        keys = [key for key in self._queue if key not in self._cache]
+        self._queue.clear()
+        if keys:
+            self._cache.update(zip(keys, self.batch_load_fn(keys)))
+
+
+# ==========================
+# Request-scoped Loaders
+# ==========================
+# Filterable nested connections: (parent model, child model, lookup from the
+# child to the parent's pk).
+RELATIONS = {
+    "orders_by_customer": (Customer, Order, "customer_id"),
+    "orders_by_product": (Product, Order, "lines__product_id"),
+    "products_by_order": (Order, Product, "order_lines__order_id"),
+}
+
+
+class Loaders:
+    """The set of relation loaders shared by one GraphQL request."""
+
+    def __init__(self):
+        self.customer_by_id = DataLoader(self._load_customers)
+        self.products_by_order = DataLoader(self._load_products_by_order)
+        self.orders_by_customer = DataLoader(self._load_orders_by_customer)
+        self.orders_by_product = DataLoader(self._load_orders_by_product)
+        self.lines_by_order = DataLoader(self._load_lines_by_order)
+        # Every parent handed out so far, per model, in order: filtered
+        # loaders are created lazily, after their parents were primed.
+        self.parents = {Customer: [], Product: [], Order: []}
+        self._parent_keys = {model: set() for model in self.parents}
+        self._filtered = {}
+
+    def remember(self, model, keys):
+        seen, parents = self._parent_keys[model], self.parents[model]
+        for key in keys:
+            if key not in seen:
+                seen.add(key)
+                parents.append(key)
+
+    # --- priming helpers, called with every list of parents we hand out ---
+    def prime_customers(self, customers):
+        keys = [c.pk for c in customers]
+        self.orders_by_customer.prime(keys)
+        self.remember(Customer, keys)
+        return customers
+
+    def prime_products(self, products):
+        keys = [p.pk for p in products]
+        self.orders_by_product.prime(keys)
+        self.remember(Product, keys)
+        return products
+
+    def prime_orders(self, orders):
+        self.customer_by_id.prime(o.customer_id for o in orders)
+        self.products_by_order.prime(o.pk for o in orders)
+        self.lines_by_order.prime(o.pk for o in orders)
+        self.remember(Order, (o.pk for o in orders))
+        return orders
+
+    def filtered(self, relation, filterset_class, filters, request=None):
+        """
+        Loader for ``relation`` (a key of ``RELATIONS``) narrowed by a
+        FilterSet: one per distinct set of filter arguments, each batch one
+        ``IN (...)`` query over every parent seen so far with the FilterSet
+        applied once, instead of a filtered query per parent.
+        """
+        key = (relation, filterset_class, tuple(sorted(filters.items())))
+        entry = self._filtered.get(key)
+        if entry is None:
+            loader = DataLoader(partial(self._load_filtered, relation, filterset_class, filters, request))
+            entry = self._filtered[key] = [loader, 0]
+        loader, primed = entry
+        parents = self.parents[RELATIONS[relation][0]]
+        if primed < len(parents):
+            loader.prime(parents[primed:])
+            entry[1] = len(parents)
+        return loader
+
+    def prime_rows(self, rows):
+        """Prime the child loaders for a list of rows of any CRM model."""
+        primers = {
+            Customer: self.prime_customers,
+            Product: self.prime_products,
+            Order: self.prime_orders,
+        }
+        if rows:
+            primers[type(rows[0])](rows)
+        return rows
+
+    # --- batch functions: one IN (...) query per call ---
+    def _load_filtered(self, relation, filterset_class, filters, request, parent_ids):
+        _, model, parent = RELATIONS[relation]
+        queryset = (
+            model.objects.filter(**{f"{parent}__in": parent_ids})
+            .annotate(crm_parent=F(parent))
+            .order_by("crm_parent", "pk")
+        )
+        filterset = filterset_class(data=filters, queryset=queryset, request=request)
+        if not filterset.is_valid():
+            raise ValidationError(filterset.form.errors.as_json())
+        grouped = defaultdict(list)
+        for row in filterset.qs:
+            grouped[row.crm_parent].append(row)
+        self.prime_rows([row for rows in grouped.values() for row in rows])
+        return [grouped[pk] for pk in parent_ids]
+
+    def _load_customers(self, ids):
+        customers = Customer.objects.in_bulk(ids)
+        self.prime_customers(customers.values())
+        return [customers.get(pk) for pk in ids]
+
+    def _load_products_by_order(self, order_ids):
+        grouped = defaultdict(list)
+        rows = (
+            OrderLine.objects.filter(order_id__in=order_ids)
+            .select_related("product")
+            .order_by("order_id", "product_id")
+        )
+        for row in rows:
+            grouped[row.order_id].append(row.product)
+        for products in grouped.values():
+            self.prime_products(products)
+        return [grouped[pk] for pk in order_ids]
+
+    def _load_lines_by_order(self, order_ids):
+        grouped = defaultdict(list)
+        rows = (
+            OrderLine.objects.filter(order_id__in=order_ids)
+            .select_related("product")
+            .order_by("order_id", "product_id")
+        )
+        for line in rows:
+            grouped[line.order_id].append(line)
+        self.prime_products(line.product for lines in grouped.values() for line in lines)
+        return [grouped[pk] for pk in order_ids]
+
+    def _load_orders_by_customer(self, customer_ids):
+        grouped = defaultdict(list)
+        for order in Order.objects.filter(customer_id__in=customer_ids).order_by("pk"):
+            grouped[order.customer_id].append(order)
+        for orders in grouped.values():
+            self.prime_orders(orders)
+        return [grouped[pk] for pk in customer_ids]
+
+    def _load_orders_by_product(self, product_ids):
+        grouped = defaultdict(list)
+        rows = (
+            OrderLine.objects.filter(product_id__in=product_ids)
+            .select_related("order")
+            .order_by("product_id", "order_id")
+        )
+        for row in rows:
+            grouped[row.product_id].append(row.order)
+        for orders in grouped.values():
+            self.prime_orders(orders)
+        return [grouped[pk] for pk in product_ids]
+
+
+# Set while a root field resolves in a worker thread (see crm.execution).
+scoped_loaders = ContextVar("crm_loaders", default=None)
+
+
+def get_loaders(info):
+    """
+    Return the loaders bound to the current request.
+
+    Loaders live on ``info.context`` (the Django request under GraphQLView)
+    so their caches never leak between requests. Without a context there is
+    nothing to scope them to, so a throwaway set is returned. Root fields
+    running concurrently get a set each through ``scoped_loaders``.
+    """
+    loaders = scoped_loaders.get()
+    if loaders is not None:
+        return loaders
+    context = info.context
+    if context is None:
+        return Loaders()
+    if isinstance(context, dict):
+        return context.setdefault("crm_loaders", Loaders())
+    loaders = getattr(context, "crm_loaders", None)
+    if loaders is None:
+        loaders = Loaders()
+        setattr(context, "crm_loaders", loaders)
+    return loaders
@@ -0,0 +1,166 @@
+import json
+import platform
+import subprocess
+from contextlib import contextmanager
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from crm.benchmarks import BenchmarkError, compare, default_benchmarks, run_suite, run_throughput
+from crm.models import Order
+
+
+def parse_scale(value):
+    """``10k`` -> 10000, ``1m`` -> 1000000; plain integers pass through."""
+    multipliers = {"k": 1_000, "m": 1_000_000}
+    value = value.strip().lower()
+    if value[-1:] in multipliers:
+        return int(float(value[:-1]) * multipliers[value[-1]])
+    return int(value)
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@contextmanager
+def fixture_database(path):
+    """Point the default connection at another SQLite file for the duration."""
+    original = connection.settings_dict["NAME"]
+    connection.close()
+    connection.settings_dict["NAME"] = str(path)
+    try:
+        yield
+    finally:
+        connection.close()
+        connection.settings_dict["NAME"] = original
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the GraphQL hot paths (filtered orders with nested customer/"
+        "products, customer search, product price ranges, the low-stock mutation "
+        "and the report queries) against seeded fixture databases of each "
+        "--scales size. Writes latency percentiles, SQL query counts and peak "
+        "memory as JSON; with --baseline, exits non-zero on regressions. "
+        "--clients N also compares sync WSGI and async ASGI throughput with N "
+        "concurrent clients."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scales", default="10k", help="Comma-separated order counts, e.g. 10k,100k,1m.")
+        parser.add_argument("--only", help="Comma-separated benchmark names to run.")
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--warmup", type=int, default=3)
+        parser.add_argument("--clients", type=int, default=0, help="Concurrent clients for the throughput run.")
+        parser.add_argument("--requests-per-client", type=int, default=5)
+        parser.add_argument("--response-cache", action="store_true", help="Measure with the response cache on.")
+        parser.add_argument("--rebuild", action="store_true", help="Re-seed fixture databases even if present.")
+        parser.add_argument("--output", help="Results file (default: CRM_BENCHMARK_DIR/results.json).")
+        parser.add_argument("--baseline", help="Earlier results file to compare against.")
+        parser.add_argument("--max-slowdown", type=float, default=0.2, help="Allowed p50 growth, as a fraction.")
+        parser.add_argument("--max-memory-growth", type=float, default=0.2, help="Allowed peak memory growth.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("Fixture databases are SQLite files; run with a SQLite default database.")
+        directory = Path(getattr(settings, "CRM_BENCHMARK_DIR", Path(settings.BASE_DIR) / "benchmarks"))
+        directory.mkdir(parents=True, exist_ok=True)
+
+        benchmarks = default_benchmarks()
+        if options["only"]:
+            names = options["only"].split(",")
+            unknown = set(names) - set(benchmarks)
+            if unknown:
+                raise CommandError(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+            benchmarks = {name: benchmarks[name] for name in names}
+
+        results, throughput = {}, {}
+        for label in options["scales"].split(","):
+            label = label.strip()
+            with fixture_database(directory / f"crm-{label}.sqlite3"):
+                self.prepare(parse_scale(label), options["rebuild"])
+                try:
+                    results[label] = run_suite(
+                        benchmarks, repeat=options["repeat"], warmup=options["warmup"],
+                        response_cache=options["response_cache"],
+                    )
+                    if options["clients"]:
+                        throughput[label] = run_throughput(
+                            benchmarks, clients=options["clients"], requests=options["requests_per_client"]
+                        )
+                except BenchmarkError as exc:
+                    raise CommandError(f"Benchmark failed at scale {label}: {exc}")
+            self.report(label, results[label])
+            if label in throughput:
+                self.report_throughput(throughput[label])
+
+        output = Path(options["output"] or directory / "results.json")
+        output.write_text(json.dumps({
+            "meta": {
+                "revision": git_revision(),
+                "created": timezone.now().isoformat(),
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "repeat": options["repeat"],
+                "clients": options["clients"],
+            },
+            "results": results,
+            **({"throughput": throughput} if throughput else {}),
+        }, indent=2) + "\n")
+        self.stdout.write(f"Results written to {output}")
+
+        if options["baseline"]:
+            baseline = json.loads(Path(options["baseline"]).read_text())["results"]
+            regressions = compare(
+                baseline, results, options["max_slowdown"], options["max_memory_growth"]
+            )
+            if regressions:
+                raise CommandError("Regressions against baseline:\n  " + "\n  ".join(regressions))
+            self.stdout.write(self.style.SUCCESS("No regressions against baseline."))
+
+    def prepare(self, orders, rebuild):
+        """Migrate the fixture database and seed it unless it already holds ``orders`` orders."""
+        call_command("migrate", verbosity=0)
+        if not rebuild and Order.objects.count() == orders:
+            return
+        self.stdout.write(f"Seeding {orders} orders ...")
+        call_command("flush", interactive=False, verbosity=0)
+        call_command(
+            "seed_data",
+            orders=orders,
+            customers=max(100, orders // 10),
+            products=max(500, orders // 200),
+            seed=42,
+            stdout=self.stdout,
+        )
+
+    def report(self, label, results):
+        self.stdout.write(f"\nscale {label}")
+        self.stdout.write(
+            f"{'benchmark':<22} {'p50':>8} {'p95':>8} {'p99':>8} {'queries':>8} {'peak KiB':>9}"
+        )
+        for name, m in results.items():
+            self.stdout.write(
+                f"{name:<22} {m['p50_ms']:>8.2f} {m['p95_ms']:>8.2f} {m['p99_ms']:>8.2f} "
+                f"{m['queries']:>8} {m['peak_kib']:>9.0f}"
+            )
+
+    def report_throughput(self, results):
+        self.stdout.write(f"{'throughput':<22} {'server':<15} {'req/s':>8} {'p50':>8} {'p95':>8}")
+        for name, servers in results.items():
+            for server, m in servers.items():
+                self.stdout.write(
+                    f"{name:<22} {server:<15} {m['rps']:>8.1f} {m['p50_ms']:>8.2f} {m['p95_ms']:>8.2f}"
+                )
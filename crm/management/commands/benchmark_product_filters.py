@@ -0,0 +1,73 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from crm.filters import OrderFilter
+from crm.models import Customer, Product, Order
+
+
+class Rollback(Exception):
+    """Raised to discard the benchmark fixtures."""
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the product_id/product_name order filters (subqueries) against the "
+        "old join + DISTINCT as the number of products per order grows. "
+        "Fixtures are created inside a transaction and rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=2000)
+        parser.add_argument("--sizes", default="1,5,10,25,50", help="Products per order.")
+        parser.add_argument("--repeat", type=int, default=7)
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options["sizes"].split(",")]
+        self.stdout.write(
+            f"{'per order':>9}  {'join id':>9}  {'subq id':>9}  {'join name':>9}  {'subq name':>11}  (ms, median)"
+        )
+        for size in sizes:
+            try:
+                with transaction.atomic():
+                    timings = self.run_size(size, options["orders"], options["repeat"])
+                    raise Rollback
+            except Rollback:
+                pass
+            self.stdout.write(
+                f"{size:>9}  {timings[0]:>9.2f}  {timings[1]:>9.2f}  {timings[2]:>9.2f}  {timings[3]:>11.2f}"
+            )
+
+    def run_size(self, size, order_count, repeat):
+        products = Product.objects.bulk_create(
+            Product(name=f"Bench {i}", price=1, stock=0) for i in range(max(size, 50))
+        )
+        customer = Customer.objects.create(name="Bench", email="bench-filters@example.com")
+        orders = Order.objects.bulk_create(Order(customer=customer) for _ in range(order_count))
+        through = Order.products.through
+        through.objects.bulk_create(
+            through(order_id=order.pk, product_id=product.pk)
+            for order in orders
+            for product in products[:size]
+        )
+
+        target = products[0].pk
+        base = Order.objects.all()
+        queries = [
+            lambda: base.filter(products__id=target).distinct(),
+            lambda: OrderFilter(data={"product_id": target}, queryset=base).qs,
+            lambda: base.filter(products__name__icontains="bench").distinct(),
+            lambda: OrderFilter(data={"product_name": "bench"}, queryset=base).qs,
+        ]
+        return [self.time(query, repeat) for query in queries]
+
+    @staticmethod
+    def time(make_queryset, repeat):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            list(make_queryset().values_list("pk", flat=True))
+            samples.append((time.perf_counter() - start) * 1000)
+        return statistics.median(samples)
@@ -0,0 +1,109 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connections, router, transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from crm import response_cache, rollups
+from crm.models import Customer, Order, OrderLine, Product
+
+
+def inactive_customers(cutoff):
+    """
+    Customers who have ordered, but not since ``cutoff`` (their latest order
+    is older): a range scan on the indexed ``last_order_at``, with no orders
+    read. Customers who never ordered have no ``last_order_at`` and are kept.
+    """
+    return Customer.objects.filter(last_order_at__lt=cutoff)
+
+
+def delete_in(model, column, values):
+    """
+    ``DELETE FROM <model's table> WHERE <column> IN (...)`` for a list of
+    values or a single-column queryset; returns the number of rows deleted.
+    """
+    connection = connections[router.db_for_write(model)]
+    qn = connection.ops.quote_name
+    if isinstance(values, QuerySet):
+        subquery, params = values.query.sql_with_params()
+    else:
+        subquery, params = ", ".join(["%s"] * len(values)), list(values)
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {qn(model._meta.db_table)} WHERE {qn(column)} IN ({subquery})", params)
+        return cursor.rowcount
+
+
+def delete_chunk(customer_ids, cutoff):
+    """
+    Delete customers with their orders and order lines, children first.
+    ``customer_ids`` were selected outside this transaction, so inactivity is
+    checked again with the rows locked: a customer who ordered since is kept,
+    together with the new order.
+    """
+    with transaction.atomic():
+        customer_ids = list(
+            inactive_customers(cutoff).filter(pk__in=customer_ids).select_for_update().values_list("pk", flat=True)
+        )
+        if not customer_ids:
+            return 0, 0
+        orders = Order.objects.filter(customer_id__in=customer_ids)
+        # Plain DELETEs, children first, instead of the collector, which
+        # would load every order and send its delete signals one by one.
+        # Skipping them is safe: those signals only update the rollups and
+        # invalidate cached responses, both done here in bulk, and nothing
+        # else references customers, orders or order lines.
+        rollups.unroll_orders(orders)
+        delete_in(OrderLine, "order_id", orders.values("pk"))
+        deleted_orders = delete_in(Order, "customer_id", customer_ids)
+        deleted_customers = delete_in(Customer, "id", customer_ids)
+        response_cache.invalidate(Customer, Order, Product)
+    return deleted_customers, deleted_orders
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete customers whose latest order is older than --days, in bounded "
+        "chunks with one short transaction each. Use --dry-run to only count."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=365)
+        parser.add_argument("--chunk-size", type=int, default=500)
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        candidates = inactive_customers(cutoff).order_by("pk").values_list("pk", flat=True)
+        chunk_size = options["chunk_size"]
+        start = time.perf_counter()
+
+        if options["dry_run"]:
+            customers = candidates.count()
+            orders = Order.objects.filter(customer_id__in=candidates).count()
+            self.stdout.write(
+                f"Dry run: would delete {customers} customers ({orders} orders) "
+                f"inactive since {cutoff:%Y-%m-%d}."
+            )
+            return
+
+        customers = orders = 0
+        last_pk = 0
+        while True:
+            ids = list(candidates.filter(pk__gt=last_pk)[:chunk_size])
+            if not ids:
+                break
+            last_pk = ids[-1]
+            chunk_customers, chunk_orders = delete_chunk(ids, cutoff)
+            customers += chunk_customers
+            orders += chunk_orders
+            if options["verbosity"] > 1:
+                rate = customers / (time.perf_counter() - start)
+                self.stdout.write(f"  ... {customers} customers, {orders} orders ({rate:.0f} customers/s)")
+
+        elapsed = time.perf_counter() - start
+        rate = customers / elapsed if elapsed else 0
+        self.stdout.write(
+            f"Deleted {customers} customers ({orders} orders) in {elapsed:.2f}s ({rate:.0f} customers/s)"
+        )
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from crm.client import write_schema_artifact
+
+
+class Command(BaseCommand):
+    help = (
+        "Write the GraphQL schema as SDL (with a sha256 header) for the internal gql "
+        "clients, so they never need an introspection round trip. Run at build/deploy time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--out", help="Defaults to settings.CRM_CLIENT_SCHEMA_PATH.")
+
+    def handle(self, *args, **options):
+        path, digest = write_schema_artifact(options["out"])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {path} (sha256 {digest[:12]})"))
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.exports import EXPORTS, FORMATS, ExportError, export_lines
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream customers, products or orders as NDJSON or CSV to a file or "
+        "stdout, filtered like the GraphQL API (--filter field=value, repeatable, "
+        "using the crm/filters.py FilterSet fields). Memory stays flat however "
+        "many rows are exported."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("model", choices=sorted(EXPORTS))
+        parser.add_argument("--format", choices=sorted(FORMATS), default="ndjson")
+        parser.add_argument("--filter", action="append", default=[], metavar="FIELD=VALUE")
+        parser.add_argument("--chunk-size", type=int, help="Rows per fetch (default: CRM_EXPORT_CHUNK_SIZE).")
+        parser.add_argument("--output", "-o", help="File to write (default: stdout).")
+
+    def handle(self, *args, **options):
+        params = {}
+        for item in options["filter"]:
+            field, sep, value = item.partition("=")
+            if not sep:
+                raise CommandError(f"Filters are FIELD=VALUE, got {item!r}.")
+            params[field] = value
+        try:
+            lines, _ = export_lines(options["model"], options["format"], params, options["chunk_size"])
+        except ExportError as exc:
+            raise CommandError(exc)
+
+        if options["output"]:
+            with open(options["output"], "w", newline="") as output:
+                count = self.write_lines(lines, output.write)
+        else:
+            count = self.write_lines(lines, lambda line: self.stdout.write(line, ending=""))
+        if options["format"] == "csv":
+            count -= 1  # header
+        self.stderr.write(f"Exported {count} {options['model']}.")
+
+    def write_lines(self, lines, write):
+        count = 0
+        for line in lines:
+            write(line)
+            count += 1
+        return count
@@ -0,0 +1,58 @@
+import sys
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.imports import INPUT_FORMATS, upsert_customers
+
+
+class Command(BaseCommand):
+    help = (
+        "Create or update customers from a CSV (name,email,phone header) or NDJSON "
+        "file, or stdin, keyed on email. The input is streamed and upserted in "
+        "batches (INSERT ... ON CONFLICT (email) DO UPDATE), so memory stays flat "
+        "for multi-GB files. Emails are lowercased and phones reduced to digits; "
+        "invalid rows are reported and skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("input", nargs="?", default="-", help="File to read (default: stdin).")
+        parser.add_argument(
+            "--format", choices=sorted(INPUT_FORMATS),
+            help="Input format (default: from the file extension, NDJSON for stdin).",
+        )
+        parser.add_argument("--batch-size", type=int, help="Rows per upsert (default: CRM_IMPORT_BATCH_SIZE).")
+        parser.add_argument("--max-errors", type=int, default=20, help="Rejected rows to list (default: 20).")
+
+    def handle(self, *args, **options):
+        path = options["input"]
+        format = options["format"] or ("csv" if path.lower().endswith(".csv") else "ndjson")
+        start = time.perf_counter()
+        if path == "-":
+            result = self.upsert(sys.stdin, format, options)
+        else:
+            try:
+                source = Path(path).open(newline="", encoding="utf-8-sig")
+            except OSError as exc:
+                raise CommandError(exc)
+            with source:
+                result = self.upsert(source, format, options)
+        elapsed = time.perf_counter() - start
+
+        for index, message in result.errors:
+            self.stderr.write(f"Row {index + 1}: {message}")
+        if result.rejected > len(result.errors):
+            self.stderr.write(f"... and {result.rejected - len(result.errors)} more rejected rows.")
+        processed = result.created + result.updated
+        style = self.style.WARNING if result.rejected else self.style.SUCCESS
+        self.stdout.write(
+            style(
+                f"Upserted {processed} customers ({result.created} created, {result.updated} updated), "
+                f"rejected {result.rejected} in {elapsed:.2f}s ({processed / elapsed:.0f} rows/s)."
+            )
+        )
+
+    def upsert(self, lines, format, options):
+        rows = INPUT_FORMATS[format](lines)
+        return upsert_customers(rows, options["batch_size"], max_errors=options["max_errors"])
@@ -0,0 +1,43 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from crm.imports import import_orders, ndjson_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Import orders from NDJSON (a file or stdin), one object per line: "
+        '{"customer_email": ..., "order_date": ..., "lines": [{"product_id": ..., '
+        '"quantity": ..., "unit_price": ...}]}. Rows are validated and written '
+        "in chunks (one customer lookup, one product lookup and bulk inserts per "
+        "chunk); invalid rows are reported and skipped without aborting the import."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("input", nargs="?", default="-", help="NDJSON file (default: stdin).")
+        parser.add_argument("--batch-size", type=int, help="Rows per chunk (default: CRM_IMPORT_BATCH_SIZE).")
+        parser.add_argument("--max-errors", type=int, default=20, help="Rejected rows to list (default: 20).")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        if options["input"] == "-":
+            result = import_orders(ndjson_rows(sys.stdin), options["batch_size"])
+        else:
+            with open(options["input"]) as source:
+                result = import_orders(ndjson_rows(source), options["batch_size"])
+        elapsed = time.perf_counter() - start
+
+        for index, message in result.errors[: options["max_errors"]]:
+            self.stderr.write(f"Row {index + 1}: {message}")
+        if len(result.errors) > options["max_errors"]:
+            self.stderr.write(f"... and {len(result.errors) - options['max_errors']} more rejected rows.")
+        style = self.style.WARNING if result.errors else self.style.SUCCESS
+        self.stdout.write(
+            style(
+                f"Imported {result.created} orders, rejected {len(result.errors)} in {elapsed:.2f}s "
+                f"({result.created / elapsed:.0f} orders/s)."
+            )
+        )
+
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from crm import rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Check every customer's order_count, lifetime_value and last_order_at "
+        "against their orders in chunks and rewrite the ones that drifted. Run "
+        "after writes that bypass model signals. Use --dry-run to only count."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        checked, drifted = rollups.reconcile_customers(options["chunk_size"], dry_run=options["dry_run"])
+        elapsed = time.perf_counter() - start
+        verb = "would repair" if options["dry_run"] else "repaired"
+        self.stdout.write(
+            self.style.SUCCESS(f"Checked {checked} customers, {verb} {drifted} in {elapsed:.2f}s.")
+        )
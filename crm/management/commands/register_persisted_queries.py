@@ -0,0 +1,55 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from graphql import GraphQLError, parse, validate
+
+from alx_backend_graphql_crm.schema import schema
+from crm.persisted_queries import get_persisted_queries
+
+
+class Command(BaseCommand):
+    help = (
+        "Register .graphql documents (files or directories) as persisted queries, "
+        "e.g. the allowlist for CRM_PERSISTED_QUERY_ALLOWLIST. Every document is "
+        "validated against the schema first; nothing is registered if one fails."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+")
+        parser.add_argument("--check", action="store_true", help="Only validate; register nothing.")
+
+    def handle(self, *args, **options):
+        files = []
+        for path in map(Path, options["paths"]):
+            files.extend(sorted(path.rglob("*.graphql")) if path.is_dir() else [path])
+
+        documents, failures = [], []
+        for path in files:
+            query = path.read_text()
+            try:
+                errors = validate(schema.graphql_schema, parse(query))
+            except GraphQLError as error:
+                errors = [error]
+            if errors:
+                failures.append(f"{path}: " + "; ".join(error.message for error in errors))
+            documents.append((path, query))
+        if failures:
+            raise CommandError("Invalid documents:\n  " + "\n  ".join(failures))
+        if options["check"]:
+            self.stdout.write(f"{len(documents)} documents are valid.")
+            return
+
+        queries = get_persisted_queries()
+        if not queries.store.durable:
+            # A local-memory cache lives and dies with this command's process.
+            raise CommandError(
+                f"{type(queries.store).__name__} does not outlive this process; set "
+                "CRM_PERSISTED_QUERY_STORE to crm.persisted_queries.DatabaseStore or "
+                "point the cache store at a shared backend."
+            )
+        for path, query in documents:
+            sha256 = queries.register(query)
+            if queries.store.get(sha256) is None:
+                raise CommandError(f"{path}: the persisted query store is full (CRM_PERSISTED_QUERY_MAX_STORED).")
+            self.stdout.write(f"{sha256}  {path}")
+        self.stdout.write(self.style.SUCCESS(f"Registered {len(documents)} persisted queries."))
@@ -0,0 +1,188 @@
+import datetime
+import itertools
+import math
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from crm import response_cache, rollups
+from crm.imports import insert_rows
+from crm.models import Customer, Product, Order, OrderLine
+
+
+# ==========================
+# Distributions
+# ==========================
+def power_law_weights(n, exponent):
+    """Cumulative weights for rank ``1..n`` proportional to ``1 / rank**exponent``."""
+    return list(itertools.accumulate(1 / rank ** exponent for rank in range(1, n + 1)))
+
+
+def seasonal_day_weights(start, days):
+    """
+    Cumulative weights per day: a November/December peak, a summer dip and
+    busier weekdays, so date-range queries see realistic skew.
+    """
+    weights = []
+    for offset in range(days):
+        day = start + datetime.timedelta(days=offset)
+        season = 1 + 0.6 * math.cos(2 * math.pi * (day.timetuple().tm_yday - 340) / 365)
+        weekday = 1.2 if day.weekday() < 5 else 0.7
+        weights.append(season * weekday)
+    return list(itertools.accumulate(weights))
+
+
+def cents(amount):
+    """Integer cents as a decimal string, e.g. ``1999`` -> ``"19.99"``."""
+    return f"{amount // 100}.{amount % 100:02d}"
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate synthetic customers, products and orders for load testing: "
+        "power-law orders per customer, Zipf product popularity and seasonal "
+        "order dates. Output is deterministic for a given --seed. Rows are "
+        "written in batches (bulk_create for customers/products, executemany "
+        "for orders and order lines), each committed on its own and bypassing "
+        "per-row signals; the daily rollups and per-customer order stats are "
+        "rebuilt at the end. Do not run it alongside other writers: ids are "
+        "assigned here, after the highest existing one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--customers", type=int, default=10_000)
+        parser.add_argument("--products", type=int, default=1_000)
+        parser.add_argument("--orders", type=int, default=100_000)
+        parser.add_argument("--days", type=int, default=730, help="Span of order dates, ending today.")
+        parser.add_argument("--max-lines", type=int, default=5, help="Most products in one order.")
+        parser.add_argument("--customer-skew", type=float, default=1.1, help="Power-law exponent.")
+        parser.add_argument("--product-skew", type=float, default=1.0, help="Zipf exponent.")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--batch-size", type=int, default=10_000)
+        parser.add_argument("--skip-rollups", action="store_true", help="Do not rebuild the daily rollups.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        batch_size = options["batch_size"]
+        start = time.perf_counter()
+
+        if connection.vendor == "sqlite" and not connection.in_atomic_block:
+            # Bulk-load speedups for this connection; they cannot change mid-transaction.
+            with connection.cursor() as cursor:
+                cursor.execute("PRAGMA cache_size = -200000")
+                cursor.execute("PRAGMA temp_store = MEMORY")
+
+        try:
+            customer_ids = self.create_customers(options["customers"], batch_size)
+            product_ids, prices = self.create_products(rng, options["products"], batch_size)
+            orders, lines = self.create_orders(rng, customer_ids, product_ids, prices, options)
+        finally:
+            # Also after a failure: the batches committed so far are kept.
+            self.reset_sequences(Customer, Product, Order, OrderLine)
+            response_cache.invalidate(Customer, Product, Order)
+
+        rollups.reconcile_customers(chunk_size=batch_size)
+
+        if not options["skip_rollups"]:
+            rollups.rebuild()
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Seeded {len(customer_ids)} customers, {len(product_ids)} products, "
+                f"{orders} orders ({lines} lines) in {elapsed:.1f}s ({orders / elapsed:.0f} orders/s)"
+            )
+        )
+
+    @staticmethod
+    def next_id(model):
+        return (model.objects.aggregate(m=Max("pk"))["m"] or 0) + 1
+
+    @staticmethod
+    def reset_sequences(*models):
+        """
+        Move the backend's id sequences past the explicit ids written here
+        (PostgreSQL and Oracle; SQLite and MySQL need nothing), or the next
+        ordinary ``create()`` would reuse a seeded id.
+        """
+        statements = connection.ops.sequence_reset_sql(no_style(), models)
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+
+    def create_customers(self, count, batch_size):
+        first = self.next_id(Customer)
+        ids = range(first, first + count)
+        for offset in range(0, count, batch_size):
+            with transaction.atomic():
+                Customer.objects.bulk_create(
+                    Customer(id=pk, name=f"Customer {pk}", email=f"customer{pk}@seed.example.com",
+                             phone=f"+1555{pk:07d}")
+                    for pk in ids[offset:offset + batch_size]
+                )
+        return list(ids)
+
+    def create_products(self, rng, count, batch_size):
+        first = self.next_id(Product)
+        ids = list(range(first, first + count))
+        # Price in cents, log-normal around ~$40.
+        prices = [max(99, int(rng.lognormvariate(8.3, 1.0))) for _ in ids]
+        products = [
+            Product(id=pk, name=f"Product {pk}", price=Decimal(cents).scaleb(-2), stock=rng.randrange(0, 200))
+            for pk, cents in zip(ids, prices)
+        ]
+        for offset in range(0, count, batch_size):
+            with transaction.atomic():
+                Product.objects.bulk_create(products[offset:offset + batch_size])
+        return ids, prices
+
+    def create_orders(self, rng, customer_ids, product_ids, prices, options):
+        count, batch_size = options["orders"], options["batch_size"]
+        customer_weights = power_law_weights(len(customer_ids), options["customer_skew"])
+        product_weights = power_law_weights(len(product_ids), options["product_skew"])
+        # Shuffle so the heavy customers/products are not simply the lowest ids.
+        customers = rng.sample(customer_ids, len(customer_ids))
+        ranked = rng.sample(range(len(product_ids)), len(product_ids))
+        first_day = timezone.localdate() - datetime.timedelta(days=options["days"] - 1)
+        day_weights = seasonal_day_weights(first_day, options["days"])
+        midnight = timezone.make_aware(datetime.datetime.combine(first_day, datetime.time()))
+        line_counts = range(1, options["max_lines"] + 1)
+        line_weights = list(itertools.accumulate(1 / n ** 2 for n in line_counts))
+
+        adapt_datetime = connection.ops.adapt_datetimefield_value
+        next_order = self.next_id(Order)
+        created = lines_created = 0
+        while created < count:
+            size = min(batch_size, count - created)
+            buyers = rng.choices(customers, cum_weights=customer_weights, k=size)
+            days = rng.choices(range(options["days"]), cum_weights=day_weights, k=size)
+            sizes = rng.choices(line_counts, cum_weights=line_weights, k=size)
+            picks = iter(rng.choices(ranked, cum_weights=product_weights, k=sum(sizes)))
+            seconds = [rng.randrange(86_400) for _ in range(size)]
+
+            orders, lines = [], []
+            for pk, customer_id, day, n, second in zip(
+                range(next_order, next_order + size), buyers, days, sizes, seconds
+            ):
+                basket = {next(picks) for _ in range(n)}
+                order_date = midnight + datetime.timedelta(days=day, seconds=second)
+                total = sum(prices[i] for i in basket)
+                orders.append((pk, customer_id, adapt_datetime(order_date), cents(total)))
+                lines.extend((pk, product_ids[i], 1, cents(prices[i])) for i in basket)
+
+            with transaction.atomic():
+                insert_rows(Order, ("id", "customer", "order_date", "total_amount"), orders)
+                insert_rows(OrderLine, ("order", "product", "quantity", "unit_price"), lines)
+            next_order += size
+            created += size
+            lines_created += len(lines)
+            if options["verbosity"] > 1:
+                self.stdout.write(f"  ... {created} orders")
+        return created, lines_created
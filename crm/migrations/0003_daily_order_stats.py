@@ -0,0 +1,93 @@
+# Generated by Django 5.2.7 on 2026-10-17 10:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_stats(apps, schema_editor):
+    # rollups.rebuild() against the historical models: order lines have no
+    # quantity yet, so each order/product link is one unit.
+    alias = schema_editor.connection.alias
+    Order = apps.get_model('crm', 'Order')
+    DailyOrderStats = apps.get_model('crm', 'DailyOrderStats')
+    DailyCustomerActivity = apps.get_model('crm', 'DailyCustomerActivity')
+    DailyProductStats = apps.get_model('crm', 'DailyProductStats')
+    orders = Order.objects.using(alias).annotate(day=TruncDate('order_date'))
+    links = Order.products.through.objects.using(alias).annotate(day=TruncDate('order__order_date'))
+    DailyOrderStats.objects.using(alias).bulk_create(
+        (
+            DailyOrderStats(
+                date=row['day'],
+                order_count=row['order_count'],
+                revenue=row['revenue'],
+                customer_count=row['customer_count'],
+            )
+            for row in orders.values('day').annotate(
+                order_count=Count('pk'),
+                revenue=Sum('total_amount'),
+                customer_count=Count('customer_id', distinct=True),
+            ).order_by()
+        ),
+        batch_size=1000,
+    )
+    DailyCustomerActivity.objects.using(alias).bulk_create(
+        (
+            DailyCustomerActivity(date=row['day'], customer_id=row['customer_id'], order_count=row['n'])
+            for row in orders.values('day', 'customer_id').annotate(n=Count('pk')).order_by()
+        ),
+        batch_size=1000,
+    )
+    DailyProductStats.objects.using(alias).bulk_create(
+        (
+            DailyProductStats(date=row['day'], product_id=row['product_id'], units=row['units'])
+            for row in links.values('day', 'product_id').annotate(units=Count('pk')).order_by()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0002_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyOrderStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('customer_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyCustomerActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('customer_id', models.BigIntegerField()),
+                ('order_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'customer_id'), name='daily_customer_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyProductStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='crm.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'product'), name='daily_product_unique')],
+            },
+        ),
+        migrations.RunPython(backfill_daily_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.7 on 2026-10-17 07:46
+
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_customer_stats(apps, schema_editor):
+    # One UPDATE with correlated subqueries on the (customer, order_date) index.
+    Customer = apps.get_model('crm', 'Customer')
+    Order = apps.get_model('crm', 'Order')
+    orders = Order.objects.filter(customer_id=OuterRef('pk')).order_by().values('customer_id')
+    Customer.objects.using(schema_editor.connection.alias).update(
+        order_count=Coalesce(Subquery(orders.annotate(n=Count('pk')).values('n')), Value(0)),
+        lifetime_value=Coalesce(
+            Subquery(orders.annotate(total=Sum('total_amount')).values('total')),
+            Value(0),
+            output_field=models.DecimalField(max_digits=14, decimal_places=2),
+        ),
+        last_order_at=Subquery(orders.annotate(last=Max('order_date')).values('last')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0005_order_lines'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='last_order_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='lifetime_value',
+            field=models.DecimalField(db_default=0, decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='order_count',
+            field=models.PositiveIntegerField(db_default=0, default=0),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['last_order_at'], name='customer_last_order_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['lifetime_value'], name='customer_lifetime_value_idx'),
+        ),
+        migrations.RunPython(backfill_customer_stats, migrations.RunPython.noop),
+    ]
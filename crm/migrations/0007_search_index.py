@@ -0,0 +1,73 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+
+# External-content FTS5 tables over crm_customer(name, email, phone) and
+# crm_product(name), kept in sync by triggers; written out in full so this
+# migration does not change with the models.
+CREATE_SQL = [
+    'CREATE VIRTUAL TABLE "crm_customer_fts" USING fts5('
+    '"name", "email", "phone", content="crm_customer", content_rowid="id", tokenize=\'trigram\')',
+    'CREATE TRIGGER "crm_customer_fts_insert" AFTER INSERT ON "crm_customer" BEGIN '
+    'INSERT INTO "crm_customer_fts"(rowid, "name", "email", "phone") '
+    'VALUES (new."id", new."name", new."email", new."phone"); END',
+    'CREATE TRIGGER "crm_customer_fts_delete" AFTER DELETE ON "crm_customer" BEGIN '
+    'INSERT INTO "crm_customer_fts"("crm_customer_fts", rowid, "name", "email", "phone") '
+    'VALUES (\'delete\', old."id", old."name", old."email", old."phone"); END',
+    'CREATE TRIGGER "crm_customer_fts_update" AFTER UPDATE OF "name", "email", "phone" ON "crm_customer" BEGIN '
+    'INSERT INTO "crm_customer_fts"("crm_customer_fts", rowid, "name", "email", "phone") '
+    'VALUES (\'delete\', old."id", old."name", old."email", old."phone"); '
+    'INSERT INTO "crm_customer_fts"(rowid, "name", "email", "phone") '
+    'VALUES (new."id", new."name", new."email", new."phone"); END',
+    'INSERT INTO "crm_customer_fts"("crm_customer_fts") VALUES (\'rebuild\')',
+    'CREATE VIRTUAL TABLE "crm_product_fts" USING fts5('
+    '"name", content="crm_product", content_rowid="id", tokenize=\'trigram\')',
+    'CREATE TRIGGER "crm_product_fts_insert" AFTER INSERT ON "crm_product" BEGIN '
+    'INSERT INTO "crm_product_fts"(rowid, "name") VALUES (new."id", new."name"); END',
+    'CREATE TRIGGER "crm_product_fts_delete" AFTER DELETE ON "crm_product" BEGIN '
+    'INSERT INTO "crm_product_fts"("crm_product_fts", rowid, "name") VALUES (\'delete\', old."id", old."name"); END',
+    'CREATE TRIGGER "crm_product_fts_update" AFTER UPDATE OF "name" ON "crm_product" BEGIN '
+    'INSERT INTO "crm_product_fts"("crm_product_fts", rowid, "name") VALUES (\'delete\', old."id", old."name"); '
+    'INSERT INTO "crm_product_fts"(rowid, "name") VALUES (new."id", new."name"); END',
+    'INSERT INTO "crm_product_fts"("crm_product_fts") VALUES (\'rebuild\')',
+]
+
+DROP_SQL = [
+    *(
+        f'DROP TRIGGER IF EXISTS "{table}_fts{suffix}"'
+        for table in ("crm_customer", "crm_product")
+        for suffix in ("_insert", "_delete", "_update")
+    ),
+    'DROP TABLE IF EXISTS "crm_customer_fts"',
+    'DROP TABLE IF EXISTS "crm_product_fts"',
+]
+
+
+def create_search_index(apps, schema_editor):
+    # SQLite only, and only where it was built with FTS5 and the trigram
+    # tokenizer (3.34+); elsewhere search falls back to icontains.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        for statement in CREATE_SQL:
+            schema_editor.execute(statement)
+    except OperationalError:
+        drop_search_index(apps, schema_editor)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in DROP_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0006_customer_order_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -1,31 +1,255 @@
-from django.db import models
+from collections import Counter
+
+from django.db import connections, models, transaction
+from django.db.models import Case, F, Sum, Value, When
+from django.db.models.functions import Lower
 from django.utils import timezone
 
+from .response_cache import invalidate
+
 # Create your models here.
 
+
+def supports_update_returning(connection):
+    """Whether the backend accepts ``UPDATE ... RETURNING``."""
+    if connection.vendor == "postgresql":
+        return True
+    if connection.vendor == "sqlite":
+        return connection.Database.sqlite_version_info >= (3, 35)
+    return False
+
 class Customer(models.Model):
     name = models.CharField(max_length=100)
     email = models.EmailField(unique=True)
     phone = models.CharField(max_length=20, blank=True, null=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    # Denormalized from the customer's orders and kept current on every
+    # order write (see crm/rollups.py); ``reconcile_customer_stats`` repairs drift.
+    order_count = models.PositiveIntegerField(default=0, db_default=0)
+    lifetime_value = models.DecimalField(max_digits=14, decimal_places=2, default=0, db_default=0)
+    last_order_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at"], name="customer_created_at_idx"),
+            models.Index(fields=["last_order_at"], name="customer_last_order_at_idx"),
+            models.Index(fields=["lifetime_value"], name="customer_lifetime_value_idx"),
+            # Case-insensitive email lookups by the importers (crm/imports.py).
+            models.Index(Lower("email"), name="customer_email_lower_idx"),
+        ]
 
     def __str__(self):
         return self.name
 
 
+class ProductQuerySet(models.QuerySet):
+    def restock(self, threshold, amount):
+        """
+        Add ``amount`` to the stock of every product below ``threshold``.
+
+        Runs as one set-based ``UPDATE ... SET stock = stock + amount`` inside
+        a transaction and returns the restocked products. Where the backend
+        supports it the changed ids come back through ``RETURNING``; otherwise
+        they are locked and read first.
+        """
+        connection = connections[self.db]
+        with transaction.atomic(using=self.db):
+            if supports_update_returning(connection):
+                qn, opts = connection.ops.quote_name, self.model._meta
+                table, pk = qn(opts.db_table), qn(opts.pk.column)
+                stock = qn(opts.get_field("stock").column)
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"UPDATE {table} SET {stock} = {stock} + %s "
+                        f"WHERE {stock} < %s RETURNING {pk}",
+                        [amount, threshold],
+                    )
+                    ids = [row[0] for row in cursor.fetchall()]
+            else:
+                ids = list(
+                    self.select_for_update().filter(stock__lt=threshold).values_list("pk", flat=True)
+                )
+                self.filter(pk__in=ids).update(stock=F("stock") + amount)
+            if ids:
+                # The UPDATE bypasses model signals; bust cached responses here.
+                invalidate(self.model)
+            return list(self.model._default_manager.using(self.db).filter(pk__in=ids).order_by("pk"))
+
+
 class Product(models.Model):
     name = models.CharField(max_length=100)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField(default=0)
 
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["price"], name="product_price_idx"),
+            models.Index(fields=["stock"], name="product_stock_idx"),
+        ]
+
     def __str__(self):
         return self.name
 
 
+class OrderError(Exception):
+    """An order that cannot be placed; nothing was written."""
+
+
+class InsufficientStock(OrderError):
+    def __init__(self, product_id):
+        super().__init__(f"Insufficient stock for product {product_id}.")
+        self.product_id = product_id
+
+
+class OrderQuerySet(models.QuerySet):
+    def place(self, customer, items, order_date=None):
+        """
+        Create an order for ``items`` (``(product_id, quantity)`` pairs) with
+        its lines, and take their quantities out of stock, in one transaction.
+
+        Each product is reserved with a single conditional ``UPDATE ... SET
+        stock = stock - qty WHERE stock >= qty``; no stock is read first, so
+        concurrent checkouts cannot oversell. A product that cannot cover its
+        quantity matches no row and the whole order rolls back. Products are
+        reserved in primary-key order, so checkouts sharing products take
+        their row locks in the same order and never deadlock. The total is
+        summed in SQL from the reserved products' prices.
+        """
+        from . import rollups
+        from .reports import to_cents
+
+        quantities = Counter()
+        for product_id, quantity in items:
+            if isinstance(quantity, bool) or not isinstance(quantity, int) or quantity < 1:
+                raise OrderError(f"Quantity for product {product_id} must be a whole number of at least 1.")
+            quantities[int(product_id)] += quantity
+        if not quantities:
+            raise OrderError("An order needs at least one line.")
+
+        products = Product.objects.using(self.db)
+        with transaction.atomic(using=self.db):
+            # Writing first also makes SQLite take its write lock up front
+            # (waiting out the busy timeout) instead of failing an upgrade.
+            for product_id in sorted(quantities):
+                quantity = quantities[product_id]
+                if not products.filter(pk=product_id, stock__gte=quantity).update(stock=F("stock") - quantity):
+                    if not products.filter(pk=product_id).exists():
+                        raise OrderError(f"Product {product_id} does not exist.")
+                    raise InsufficientStock(product_id)
+
+            reserved = products.filter(pk__in=quantities)
+            units = Case(*(When(pk=pk, then=Value(n)) for pk, n in quantities.items()))
+            total = reserved.aggregate(total=Sum(F("price") * units, output_field=models.DecimalField()))["total"]
+            prices = dict(reserved.values_list("pk", "price"))
+
+            order = self.create(
+                customer=customer, total_amount=to_cents(total), **({"order_date": order_date} if order_date else {})
+            )
+            OrderLine.objects.using(self.db).bulk_create(
+                OrderLine(order=order, product_id=pk, quantity=n, unit_price=prices[pk])
+                for pk, n in sorted(quantities.items())
+            )
+            # bulk_create and the stock UPDATEs skip the model signals.
+            rollups.apply_lines(((order.pk, pk, n) for pk, n in quantities.items()), 1)
+            invalidate(Product)
+        return order
+
+
 class Order(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='orders')
-    products = models.ManyToManyField(Product, related_name='orders')
+    products = models.ManyToManyField(Product, through="OrderLine", related_name='orders')
     order_date = models.DateTimeField(default=timezone.now)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["order_date"], name="order_date_idx"),
+            models.Index(fields=["total_amount"], name="order_total_amount_idx"),
+            models.Index(fields=["customer", "order_date"], name="order_customer_date_idx"),
+        ]
+
+    objects = OrderQuerySet.as_manager()
+
     def __str__(self):
         return f"Order #{self.id} - {self.customer.name}"
+
+
+class OrderLine(models.Model):
+    """One product on an order, with its quantity and the unit price it was sold at."""
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="lines")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="order_lines")
+    # The database default also covers raw inserts and pre-existing rows.
+    quantity = models.PositiveIntegerField(default=1, db_default=1)
+    # Null for lines linked with ``order.products.add()`` rather than placed.
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+
+    class Meta:
+        # Formerly the auto-created table of ``Order.products``.
+        db_table = "crm_order_products"
+        unique_together = [("order", "product")]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} on order {self.order_id}"
+
+
+# ==========================
+# Daily Revenue Rollups
+# ==========================
+class DailyOrderStats(models.Model):
+    """Per-day order count, revenue and distinct customers (see crm/rollups.py)."""
+
+    date = models.DateField(unique=True)
+    order_count = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    customer_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.date}: {self.order_count} orders, {self.revenue} revenue"
+
+
+class DailyCustomerActivity(models.Model):
+    """
+    Orders per (day, customer), used to keep DailyOrderStats.customer_count
+    exact as orders come and go. ``customer_id`` is a plain column rather
+    than a foreign key so deleting a customer never cascades into rows the
+    order delete handlers still have to decrement.
+    """
+
+    date = models.DateField()
+    customer_id = models.BigIntegerField()
+    order_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["date", "customer_id"], name="daily_customer_unique"),
+        ]
+
+
+class DailyProductStats(models.Model):
+    """Units of each product ordered per day."""
+
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="daily_stats")
+    units = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["date", "product"], name="daily_product_unique"),
+        ]
+
+
+# ==========================
+# Persisted Queries
+# ==========================
+class PersistedQuery(models.Model):
+    """A GraphQL document registered under the SHA-256 of its text (see crm/persisted_queries.py)."""
+
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    query = models.TextField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return self.sha256
@@ -0,0 +1,211 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from graphql import GraphQLError
+
+from .documents import get_document_cache
+from .models import PersistedQuery
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+class PersistedQueryError(Exception):
+    """An APQ request that cannot be served; reported to the client as a GraphQL error."""
+
+    def __init__(self, message, code):
+        super().__init__(message)
+        self.code = code
+
+    def as_graphql_error(self):
+        return GraphQLError(str(self), extensions={"code": self.code})
+
+
+# ==========================
+# Stores
+# ==========================
+class DatabaseStore:
+    """
+    Documents in the PersistedQuery table: durable and enumerable, so it can
+    back an allowlist. Holds at most ``max_entries`` documents
+    (CRM_PERSISTED_QUERY_MAX_STORED); once full, new documents still run
+    but are not stored.
+    """
+
+    durable = True
+
+    def __init__(self, max_entries=None):
+        if max_entries is None:
+            max_entries = getattr(settings, "CRM_PERSISTED_QUERY_MAX_STORED", 10000)
+        self.max_entries = max_entries
+
+    def get(self, sha256):
+        return PersistedQuery.objects.filter(pk=sha256).values_list("query", flat=True).first()
+
+    def set(self, sha256, query):
+        if PersistedQuery.objects.filter(pk=sha256).exists():
+            return
+        if self.max_entries is not None and PersistedQuery.objects.count() >= self.max_entries:
+            return
+        PersistedQuery.objects.get_or_create(sha256=sha256, defaults={"query": query})
+
+    def all(self):
+        return PersistedQuery.objects.values_list("sha256", "query").iterator()
+
+
+class CacheStore:
+    """
+    Documents in a Django cache shared by all workers (e.g. Redis). Entries
+    may be evicted; clients then simply resend the full text, and the
+    cache's own size limit bounds what clients can register.
+    """
+
+    def __init__(self, alias="default", timeout=None):
+        self.cache = caches[alias]
+        self.timeout = timeout
+
+    @property
+    def durable(self):
+        """Whether entries outlive this process: not for the local-memory or dummy backends."""
+        return not isinstance(self.cache, (LocMemCache, DummyCache))
+
+    def get(self, sha256):
+        return self.cache.get(f"crm:apq:{sha256}")
+
+    def set(self, sha256, query):
+        self.cache.set(f"crm:apq:{sha256}", query, self.timeout)
+
+    def all(self):
+        return iter(())
+
+
+# ==========================
+# Automatic Persisted Queries
+# ==========================
+class PersistedQueries:
+    """
+    Apollo-style APQ over a pluggable store, fronted by an in-process LRU.
+
+    A request may carry ``extensions.persistedQuery = {version: 1,
+    sha256Hash}`` instead of its query text. Known hashes are served from
+    the LRU or the store; unknown ones answer ``PersistedQueryNotFound`` and
+    the client retries with text and hash, which registers the document.
+    In allowlist mode nothing is registered from requests: only documents
+    added with ``manage.py register_persisted_queries`` may run, with or
+    without their text.
+    """
+
+    def __init__(self, store, maxsize=1000, allowlist=False):
+        self.store = store
+        self.maxsize = maxsize
+        self.allowlist = allowlist
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """Forget the in-process entries (the store is untouched)."""
+        self.entries = OrderedDict()
+        self.warmed = False
+
+    def get(self, sha256):
+        with self.lock:
+            query = self.entries.get(sha256)
+            if query is not None:
+                self.entries.move_to_end(sha256)
+                return query
+        query = self.store.get(sha256)
+        if query is not None:
+            self.remember(sha256, query)
+        return query
+
+    def remember(self, sha256, query):
+        with self.lock:
+            self.entries[sha256] = query
+            self.entries.move_to_end(sha256)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def register(self, query):
+        sha256 = query_hash(query)
+        self.store.set(sha256, query)
+        self.remember(sha256, query)
+        return sha256
+
+    def resolve(self, query, persisted):
+        """The query text to execute for a request's ``query`` and ``persistedQuery`` extension."""
+        if not persisted:
+            if self.allowlist and query and self.get(query_hash(query)) is None:
+                raise PersistedQueryError("Query is not in the allowlist.", "PERSISTED_QUERY_NOT_ALLOWED")
+            return query
+
+        if persisted.get("version") != 1:
+            raise PersistedQueryError("Unsupported persisted query version.", "PERSISTED_QUERY_NOT_SUPPORTED")
+        sha256 = persisted.get("sha256Hash")
+        if not query:
+            query = self.get(sha256) if sha256 else None
+            if query is None:
+                raise PersistedQueryError("PersistedQueryNotFound", "PERSISTED_QUERY_NOT_FOUND")
+            return query
+        if query_hash(query) != sha256:
+            raise PersistedQueryError("provided sha does not match query", "PERSISTED_QUERY_HASH_MISMATCH")
+        if self.allowlist:
+            if self.get(sha256) is None:
+                raise PersistedQueryError("Query is not in the allowlist.", "PERSISTED_QUERY_NOT_ALLOWED")
+        else:
+            self.register(query)
+        return query
+
+    def warm(self, schema):
+        """Load every stored document and pre-parse/validate it into the document cache."""
+        with self.lock:
+            if self.warmed:
+                return
+            self.warmed = True
+        documents = get_document_cache()
+        for sha256, query in self.store.all():
+            self.remember(sha256, query)
+            documents.lookup(schema, query)
+
+
+_persisted_queries = None
+
+
+def persisted_queries_enabled():
+    return getattr(settings, "CRM_PERSISTED_QUERIES", False)
+
+
+def get_persisted_queries():
+    global _persisted_queries
+    if _persisted_queries is None:
+        store = import_string(getattr(settings, "CRM_PERSISTED_QUERY_STORE", "crm.persisted_queries.CacheStore"))()
+        allowlist = getattr(settings, "CRM_PERSISTED_QUERY_ALLOWLIST", False)
+        # The allowlist is written by a management command in another process
+        # and enumerated at startup: only the database store can hold it.
+        if allowlist and not isinstance(store, DatabaseStore):
+            raise ImproperlyConfigured(
+                "CRM_PERSISTED_QUERY_ALLOWLIST requires "
+                "CRM_PERSISTED_QUERY_STORE = 'crm.persisted_queries.DatabaseStore'."
+            )
+        _persisted_queries = PersistedQueries(
+            store,
+            maxsize=getattr(settings, "CRM_PERSISTED_QUERY_LRU_SIZE", 1000),
+            allowlist=allowlist,
+        )
+    return _persisted_queries
+
+
+@receiver(setting_changed)
+def reset_persisted_queries(setting, **kwargs):
+    global _persisted_queries
+    if setting.startswith("CRM_PERSISTED_QUERY"):
+        _persisted_queries = None
@@ -0,0 +1,125 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from graphene.utils.str_converters import to_snake_case
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode
+
+from .fields import PAGINATION_ARGS
+
+
+# ==========================
+# Selection-set Walking
+# ==========================
+class Selection:
+    """A requested field: its (snake_case) children and whether it was filtered."""
+
+    def __init__(self):
+        self.children = {}
+        self.filtered = False
+
+    def merge(self, node, info):
+        if any(arg.name.value not in PAGINATION_ARGS for arg in node.arguments or ()):
+            self.filtered = True
+        if node.selection_set:
+            collect(node.selection_set.selections, info, self.children)
+
+
+def collect(selections, info, into):
+    """Flatten fields, fragment spreads and inline fragments into ``into``."""
+    for selection in selections:
+        if isinstance(selection, FieldNode):
+            name = to_snake_case(selection.name.value)
+            into.setdefault(name, Selection()).merge(selection, info)
+        elif isinstance(selection, FragmentSpreadNode):
+            fragment = info.fragments[selection.name.value]
+            collect(fragment.selection_set.selections, info, into)
+        elif isinstance(selection, InlineFragmentNode):
+            collect(selection.selection_set.selections, info, into)
+    return into
+
+
+def node_fields(selection):
+    """Fields requested on the rows of a plain list or a Relay connection."""
+    edges = selection.children.get("edges")
+    if edges is None:
+        return selection.children
+    node = edges.children.get("node")
+    return node.children if node else {}
+
+
+def selected_fields(info):
+    """Fields requested under the field currently being resolved."""
+    root = Selection()
+    for node in info.field_nodes:
+        root.merge(node, info)
+    return node_fields(root)
+
+
+# ==========================
+# Query Planning
+# ==========================
+def plan(model, fields, prefix=""):
+    """
+    Turn a selection tree into ``only()``, ``select_related()`` and
+    ``prefetch_related()`` arguments for ``model``.
+
+    Primary and foreign key columns are always kept so relation resolvers
+    and batched loaders never trigger a deferred-field query per row.
+    """
+    only, select, prefetch = [], [], []
+    for field in model._meta.concrete_fields:
+        if field.primary_key or field.is_relation:
+            only.append(prefix + field.attname)
+
+    for name, selection in fields.items():
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        if field.many_to_one or field.one_to_one:
+            select.append(prefix + name)
+            r_only, r_select, r_prefetch = plan(
+                field.related_model, selection.children, f"{prefix}{name}__"
+            )
+            only += r_only
+            select += r_select
+            prefetch += r_prefetch
+        elif field.many_to_many or field.one_to_many:
+            # Filtered nested connections are loaded by Loaders.filtered.
+            if selection.filtered:
+                continue
+            related = field.related_model
+            queryset = optimize(related._default_manager.order_by("pk"), node_fields(selection))
+            prefetch.append(Prefetch(prefix + name, queryset=queryset))
+        elif field.concrete:
+            only.append(prefix + field.attname)
+    return only, select, prefetch
+
+
+def optimize(queryset, fields):
+    """Restrict ``queryset`` to the columns and relations in ``fields``."""
+    only, select, prefetch = plan(queryset.model, fields)
+    queryset = queryset.only(*dict.fromkeys(only))
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
+
+
+def optimize_for(queryset, info):
+    """Plan ``queryset`` against the selection set of the field being resolved."""
+    return optimize(queryset, selected_fields(info))
+
+
+def covers(instance, info):
+    """True if ``instance`` has every column the current field selects loaded."""
+    deferred = instance.get_deferred_fields()
+    return not deferred or not deferred.intersection(selected_fields(info))
+
+
+def prefetched(instance, name):
+    """Return rows ``prefetch_related`` already attached to ``instance``, if any."""
+    cache = getattr(instance, "_prefetched_objects_cache", {})
+    if name in cache:
+        return list(cache[name])
+    return None
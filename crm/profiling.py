@@ -0,0 +1,247 @@
+import bisect
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connections
+
+
+def profiling_enabled():
+    return getattr(settings, "CRM_PROFILING", False)
+
+
+# ==========================
+# SQL Fingerprints
+# ==========================
+_IN_LIST = re.compile(r"\bIN \((?:%s|\?)(?:, (?:%s|\?))*\)", re.IGNORECASE)
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def fingerprint(sql):
+    """
+    Statement shape with literal values removed, so the same query issued for
+    different rows (the N+1 pattern) maps to one fingerprint. Parameters are
+    already placeholders; only literals and variable-length IN lists differ.
+    """
+    return _LITERAL.sub("?", _IN_LIST.sub("IN (...)", sql))
+
+
+# ==========================
+# Per-operation Trace
+# ==========================
+class Trace:
+    """
+    Timing and SQL for one GraphQL operation. Resolver entries follow the
+    Apollo tracing layout (offsets and durations in nanoseconds); each also
+    counts the statements run while it was the innermost active resolver.
+    """
+
+    def __init__(self, operation_name=None):
+        self.operation_name = operation_name
+        self.started_at = datetime.now(dt_timezone.utc)
+        self.start = time.perf_counter_ns()
+        self.end = None
+        self.resolvers = []
+        self.statements = []  # (fingerprint, duration ns, resolver path)
+        self._stack = []
+
+    def finish(self):
+        self.end = time.perf_counter_ns()
+
+    @property
+    def duration(self):
+        return (self.end or time.perf_counter_ns()) - self.start
+
+    @contextmanager
+    def recording(self):
+        """Send every statement on every database connection through this trace."""
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self.execute_wrapper))
+            try:
+                yield self
+            finally:
+                self.finish()
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter_ns()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            entry = self._stack[-1] if self._stack else None
+            if entry is not None:
+                entry["sqlCount"] += 1
+            self.statements.append(
+                (fingerprint(sql), time.perf_counter_ns() - start, entry["path"] if entry else None)
+            )
+
+    def enter(self, info):
+        if self.operation_name is None:
+            self.operation_name = info.operation.name.value if info.operation.name else "anonymous"
+        entry = {
+            "path": list(info.path.as_list()),
+            "parentType": info.parent_type.name,
+            "fieldName": info.field_name,
+            "returnType": str(info.return_type),
+            "startOffset": time.perf_counter_ns() - self.start,
+            "duration": 0,
+            "sqlCount": 0,
+        }
+        self.resolvers.append(entry)
+        self._stack.append(entry)
+        return entry
+
+    def leave(self, entry):
+        entry["duration"] = time.perf_counter_ns() - self.start - entry["startOffset"]
+        self._stack.pop()
+
+    def duplicates(self):
+        """Fingerprints run more than once, with the resolvers that ran them."""
+        counts = Counter(fp for fp, _, _ in self.statements)
+        fields = defaultdict(set)
+        for fp, _, path in self.statements:
+            if counts[fp] > 1 and path:
+                fields[fp].add(".".join(str(part) for part in path if not isinstance(part, int)))
+        return [
+            {"fingerprint": fp, "count": count, "fields": sorted(fields[fp])}
+            for fp, count in counts.most_common()
+            if count > 1
+        ]
+
+    def as_extension(self):
+        return {
+            "version": 1,
+            "startTime": self.started_at.isoformat(),
+            "endTime": datetime.now(dt_timezone.utc).isoformat(),
+            "duration": self.duration,
+            "execution": {"resolvers": self.resolvers},
+            "sql": {
+                "count": len(self.statements),
+                "duration": sum(duration for _, duration, _ in self.statements),
+                "duplicates": self.duplicates(),
+            },
+        }
+
+
+class ProfilingMiddleware:
+    """
+    Graphene middleware timing each resolver into the request's ``Trace``.
+    Only installed for requests that are being profiled (see
+    ``crm.views.CRMGraphQLView``), so unprofiled requests pay nothing.
+    """
+
+    def __init__(self, trace):
+        self.trace = trace
+
+    def resolve(self, next, root, info, **args):
+        entry = self.trace.enter(info)
+        try:
+            return next(root, info, **args)
+        finally:
+            self.trace.leave(entry)
+
+
+# ==========================
+# Aggregated Metrics
+# ==========================
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250)
+MAX_OPERATIONS = 200  # distinct operation names kept before folding into "other"
+
+
+def label(value):
+    """A Prometheus label value, escaped so it cannot end the label or the line."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip((*self.buckets, "+Inf"), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f"{name}_sum{{{labels}}} {self.sum}"
+        yield f"{name}_count{{{labels}}} {self.count}"
+
+
+class Metrics:
+    """Process-wide counters and histograms, rendered in Prometheus text format."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.operations = Counter()
+        self.statements = Counter()
+        self.duplicates = Counter()
+        self.durations = {}
+        self.query_counts = {}
+        self.resolver_seconds = Counter()
+        self.resolver_calls = Counter()
+        self.resolver_statements = Counter()
+
+    def record(self, trace):
+        with self.lock:
+            # Set from the executed operation's AST; requests that never got
+            # that far (unparsable, invalid, no such operation) share a label.
+            operation = trace.operation_name or "unknown"
+            if operation not in self.operations and len(self.operations) >= MAX_OPERATIONS:
+                operation = "other"
+            self.operations[operation] += 1
+            self.statements[operation] += len(trace.statements)
+            self.duplicates[operation] += sum(d["count"] - 1 for d in trace.duplicates())
+            self.durations.setdefault(operation, Histogram(DURATION_BUCKETS)).observe(trace.duration / 1e9)
+            self.query_counts.setdefault(operation, Histogram(QUERY_BUCKETS)).observe(len(trace.statements))
+            for entry in trace.resolvers:
+                field = f"{entry['parentType']}.{entry['fieldName']}"
+                self.resolver_calls[field] += 1
+                self.resolver_seconds[field] += entry["duration"] / 1e9
+                self.resolver_statements[field] += entry["sqlCount"]
+
+    def render(self):
+        with self.lock:
+            lines = [
+                "# TYPE crm_graphql_operations_total counter",
+                *(f'crm_graphql_operations_total{{operation="{label(op)}"}} {n}' for op, n in self.operations.items()),
+                "# TYPE crm_graphql_sql_statements_total counter",
+                *(f'crm_graphql_sql_statements_total{{operation="{label(op)}"}} {n}'
+                  for op, n in self.statements.items()),
+                "# TYPE crm_graphql_duplicate_sql_statements_total counter",
+                *(f'crm_graphql_duplicate_sql_statements_total{{operation="{label(op)}"}} {n}'
+                  for op, n in self.duplicates.items()),
+                "# TYPE crm_graphql_operation_duration_seconds histogram",
+            ]
+            for op, histogram in self.durations.items():
+                lines.extend(histogram.lines("crm_graphql_operation_duration_seconds", f'operation="{label(op)}"'))
+            lines.append("# TYPE crm_graphql_sql_statements_per_operation histogram")
+            for op, histogram in self.query_counts.items():
+                lines.extend(histogram.lines("crm_graphql_sql_statements_per_operation", f'operation="{label(op)}"'))
+            lines.append("# TYPE crm_graphql_resolver_seconds_total counter")
+            lines.extend(f'crm_graphql_resolver_seconds_total{{field="{label(f)}"}} {s:.6f}'
+                         for f, s in self.resolver_seconds.items())
+            lines.append("# TYPE crm_graphql_resolver_calls_total counter")
+            lines.extend(f'crm_graphql_resolver_calls_total{{field="{label(f)}"}} {n}'
+                         for f, n in self.resolver_calls.items())
+            lines.append("# TYPE crm_graphql_resolver_sql_statements_total counter")
+            lines.extend(f'crm_graphql_resolver_sql_statements_total{{field="{label(f)}"}} {n}'
+                         for f, n in self.resolver_statements.items())
+            return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
@@ -0,0 +1,26 @@
+from decimal import Decimal
+
+from django.db.models import Count, Sum
+
+from .models import Customer, Order
+
+
+def to_cents(value):
+    """Quantize an aggregated amount to the scale of ``Order.total_amount``."""
+    places = Order._meta.get_field("total_amount").decimal_places
+    return Decimal(value or 0).quantize(Decimal(1).scaleb(-places))
+
+
+def crm_stats():
+    """
+    Customer count, order count and total revenue, aggregated in the database.
+
+    Revenue is an exact ``Decimal`` (``0.00`` when there are no orders), and
+    the cost is two aggregate queries however many rows there are.
+    """
+    totals = Order.objects.aggregate(order_count=Count("pk"), revenue=Sum("total_amount"))
+    return {
+        "customer_count": Customer.objects.count(),
+        "order_count": totals["order_count"],
+        "revenue": to_cents(totals["revenue"]),
+    }
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from graphql import OperationType, TypeInfo, TypeInfoVisitor, Visitor, get_operation_ast, print_ast, visit
+
+
+# ==========================
+# Model Versions
+# ==========================
+# Every cached response is keyed on the current version of each model it
+# read. A write bumps that model's version, so older entries can no longer
+# be reached and simply expire. Versions live in the same cache backend as
+# the responses, so every worker sharing the backend sees a bump at once.
+
+# Rollup tables are written only by the Order signal handlers, and order
+# lines only together with their order. Customer rows also carry order
+# stats (order_count, lifetime_value, last_order_at) kept by those handlers.
+MODEL_SOURCES = {
+    "crm.customer": ("crm.customer", "crm.order"),
+    "crm.orderline": ("crm.order",),
+    "crm.dailyorderstats": ("crm.order",),
+    "crm.dailycustomeractivity": ("crm.order",),
+    "crm.dailyproductstats": ("crm.order",),
+}
+
+# Fields whose result type is not a model but which read model tables.
+FIELD_DEPENDENCIES = {
+    "Query.crmStats": ("crm.customer", "crm.order"),
+    "Query.revenueBetween": ("crm.order",),
+    "Query.productSales": ("crm.order", "crm.product"),
+}
+
+
+def response_cache():
+    return caches[getattr(settings, "CRM_RESPONSE_CACHE_ALIAS", "default")]
+
+
+def version_key(label):
+    return f"crm:rc:version:{label}"
+
+
+def current_versions(labels):
+    cache = response_cache()
+    keys = [version_key(label) for label in labels]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    for key in missing:
+        # Start from a fresh value rather than 0: an evicted version must
+        # never come back equal to one that older entries were stored under.
+        cache.add(key, time.time_ns())
+    if missing:
+        versions.update(cache.get_many(missing))
+    return [versions.get(key) for key in keys]
+
+
+def bump(label):
+    cache = response_cache()
+    try:
+        cache.incr(version_key(label))
+    except ValueError:
+        cache.add(version_key(label), time.time_ns())
+
+
+def invalidate(*models):
+    """
+    Bust cached responses that read any of ``models``. Runs now and again on
+    commit, so a reader cannot re-cache the old rows between the write and
+    its commit. Model signals call this; bulk writes that skip signals must
+    call it themselves.
+    """
+    labels = [model._meta.label_lower for model in models]
+    for label in labels:
+        bump(label)
+    transaction.on_commit(lambda: [bump(label) for label in labels])
+
+
+# ==========================
+# Response Cache
+# ==========================
+class Plan:
+    """What a query text needs for caching: its normalized digest and the models it reads."""
+
+    def __init__(self, digest, labels, cacheable):
+        self.digest = digest
+        self.labels = labels
+        self.cacheable = cacheable
+
+
+def read_models(schema, document):
+    """Model labels read by any field selected anywhere in ``document``."""
+    from .cost import model_of
+
+    labels = set()
+    type_info = TypeInfo(schema)
+
+    class Collect(Visitor):
+        def enter_field(self, node, *args):
+            parent, field = type_info.get_parent_type(), type_info.get_field_def()
+            if parent is None or field is None:
+                return
+            model = model_of(field.type)
+            if model is not None:
+                labels.update(MODEL_SOURCES.get(model._meta.label_lower, (model._meta.label_lower,)))
+            labels.update(FIELD_DEPENDENCIES.get(f"{parent.name}.{node.name.value}", ()))
+
+    visit(document, TypeInfoVisitor(type_info, Collect()))
+    return sorted(labels)
+
+
+class ResponseCache:
+    """
+    Cached ``data`` of successful query operations, keyed on the normalized
+    document, operation name, variables and the versions of the models the
+    document reads. Mutations and subscriptions are never cached. Responses
+    must not depend on the requesting user; this schema has no per-user data.
+    """
+
+    def __init__(self, plans=1000):
+        self.lock = threading.Lock()
+        self.plans = OrderedDict()
+        self.max_plans = plans
+        self.hits = self.misses = 0
+
+    def plan(self, schema, document, query, operation_name):
+        """Normalize and analyze each distinct query text once per process."""
+        raw = (query, operation_name)
+        with self.lock:
+            plan = self.plans.get(raw)
+            if plan is not None:
+                self.plans.move_to_end(raw)
+                return plan
+        operation = get_operation_ast(document, operation_name)
+        plan = Plan(
+            hashlib.sha256(print_ast(document).encode()).hexdigest(),
+            read_models(schema, document),
+            operation is not None and operation.operation == OperationType.QUERY,
+        )
+        with self.lock:
+            self.plans[raw] = plan
+            while len(self.plans) > self.max_plans:
+                self.plans.popitem(last=False)
+        return plan
+
+    def key(self, plan, operation_name, variables):
+        versions = current_versions(plan.labels)
+        payload = json.dumps([plan.digest, operation_name, variables or {}, versions], sort_keys=True, default=str)
+        return "crm:rc:" + hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key):
+        data = response_cache().get(key)
+        with self.lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return data
+
+    def set(self, key, data):
+        response_cache().set(key, data, getattr(settings, "CRM_RESPONSE_CACHE_TTL", 300))
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+_response_cache = ResponseCache()
+
+
+def get_response_cache():
+    return _response_cache
+
+
+def response_cache_enabled():
+    return getattr(settings, "CRM_RESPONSE_CACHE", True)
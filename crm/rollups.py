@@ -0,0 +1,346 @@
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, transaction
+from django.db.models import (
+    Case, Count, DateTimeField, DecimalField, F, Max, OuterRef, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Coalesce, Greatest, TruncDate
+from django.utils import timezone
+
+from .models import (
+    Customer, DailyCustomerActivity, DailyOrderStats, DailyProductStats, Order, OrderLine, supports_update_returning,
+)
+from .response_cache import invalidate
+
+
+# ==========================
+# Incremental Maintenance
+# ==========================
+# Every change is applied as an atomic F() delta, so concurrent writers
+# never overwrite each other's counts. Bulk operations that skip model
+# signals (bulk_create, QuerySet.update, raw SQL) are not tracked unless
+# they call ``apply_batch``/``apply_customer_batch``; run ``manage.py
+# rebuild_order_stats`` and ``reconcile_customer_stats`` after them.
+# Product units count line quantities, not lines.
+
+def order_day(order_date):
+    return timezone.localdate(order_date) if timezone.is_aware(order_date) else order_date.date()
+
+
+def bump(model, keys, **deltas):
+    """Add ``deltas`` to the row identified by ``keys``, creating it on first use."""
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+    if model.objects.filter(**keys).update(**changes):
+        return
+    if any(delta < 0 for delta in deltas.values()):
+        return  # nothing to take away from
+    try:
+        with transaction.atomic():
+            model.objects.create(**keys, **deltas)
+    except IntegrityError:
+        # Another writer created the row first.
+        model.objects.filter(**keys).update(**changes)
+
+
+def apply_order(day, customer_id, total_amount, sign):
+    """Add (``sign=1``) or remove (``sign=-1``) one order from ``day``."""
+    total_amount = Decimal(str(total_amount))
+    with transaction.atomic():
+        bump(DailyOrderStats, {"date": day}, order_count=sign, revenue=sign * total_amount)
+        keys = {"date": day, "customer_id": customer_id}
+        bump(DailyCustomerActivity, keys, order_count=sign)
+        remaining = (
+            DailyCustomerActivity.objects.filter(**keys).values_list("order_count", flat=True).first()
+        )
+        if sign > 0 and remaining == 1:
+            bump(DailyOrderStats, {"date": day}, customer_count=1)
+        elif sign < 0 and not remaining:
+            DailyCustomerActivity.objects.filter(**keys).delete()
+            bump(DailyOrderStats, {"date": day}, customer_count=-1)
+        if sign < 0:
+            DailyOrderStats.objects.filter(date=day, order_count=0).delete()
+
+
+def apply_units(day, units, sign):
+    """Add or remove ``units`` (``{product_id: units}``) ordered on ``day``."""
+    with transaction.atomic():
+        for product_id, count in units.items():
+            bump(DailyProductStats, {"date": day, "product_id": product_id}, units=sign * count)
+        if sign < 0:
+            DailyProductStats.objects.filter(date=day, units=0).delete()
+
+
+def order_units(order_id):
+    """``{product_id: quantity}`` for the lines of one order."""
+    return dict(OrderLine.objects.filter(order_id=order_id).values_list("product_id", "quantity"))
+
+
+def apply_lines(lines, sign):
+    """Apply ``(order_id, product_id, quantity)`` line changes, grouping orders by their day."""
+    lines = list(lines)
+    days = dict(Order.objects.filter(pk__in={line[0] for line in lines}).values_list("pk", "order_date"))
+    by_day = defaultdict(Counter)
+    for order_id, product_id, quantity in lines:
+        if order_id in days:
+            by_day[order_day(days[order_id])][product_id] += quantity
+    for day, units in by_day.items():
+        apply_units(day, units, sign)
+
+
+def bump_many(model, key_fields, rows, returning=False):
+    """
+    ``bump()`` for many rows at once: ``rows`` maps key tuples to dicts of
+    deltas. Each batch is one ``INSERT ... ON CONFLICT DO UPDATE SET f = f +
+    excluded.f`` (still an atomic delta per row) where the backend supports
+    it, one ``bump()`` per row otherwise. With ``returning``, returns
+    ``{key: {field: value}}`` with the values after the update.
+    """
+    if not rows:
+        return {}
+    delta_fields = list(next(iter(rows.values())))
+    connection = connections[DEFAULT_DB_ALIAS]
+    opts, qn = model._meta, connection.ops.quote_name
+    keys = [opts.get_field(name) for name in key_fields]
+    deltas = [opts.get_field(name) for name in delta_fields]
+    after = {}
+    if not supports_update_returning(connection):
+        for key, values in rows.items():
+            lookup = dict(zip(key_fields, key))
+            bump(model, lookup, **values)
+            if returning:
+                after[key] = model.objects.filter(**lookup).values(*delta_fields).first()
+        return after
+
+    table, columns = qn(opts.db_table), [qn(field.column) for field in keys + deltas]
+    updates = ", ".join(f"{c} = {table}.{c} + excluded.{c}" for c in columns[len(keys):])
+    row_sql = f"({', '.join(['%s'] * len(columns))})"
+    returning_sql = f" RETURNING {', '.join(columns)}" if returning else ""
+    # Key values repeat across rows (a day per order); adapt each one once.
+    adapted = [{} for _ in keys]
+    params = []
+    for key, values in rows.items():
+        db_key = tuple(
+            cache[value] if value in cache else cache.setdefault(value, field.get_db_prep_save(value, connection))
+            for field, cache, value in zip(keys, adapted, key)
+        )
+        params.append((*db_key, *(field.get_db_prep_save(values[field.name], connection) for field in deltas)))
+
+    size = connection.ops.bulk_batch_size(keys + deltas, params)
+    with connection.cursor() as cursor:
+        for start in range(0, len(params), size):
+            batch = params[start:start + size]
+            cursor.execute(
+                f"INSERT INTO {table} ({', '.join(columns)}) "
+                f"VALUES {', '.join([row_sql] * len(batch))} "
+                f"ON CONFLICT ({', '.join(columns[:len(keys)])}) DO UPDATE SET {updates}{returning_sql}",
+                [value for row in batch for value in row],
+            )
+            if returning:
+                for row in cursor.fetchall():
+                    key = tuple(field.to_python(value) for field, value in zip(keys, row))
+                    after[key] = dict(zip(delta_fields, row[len(keys):]))
+    return after
+
+
+def apply_batch(orders, lines):
+    """
+    Add freshly inserted orders to the rollups in a few statements.
+
+    ``orders`` are ``(day, customer_id, total_amount)`` triples and
+    ``lines`` ``(day, product_id, quantity)``; this is what bulk inserts
+    call instead of ``apply_order``/``apply_units`` per row.
+    """
+    daily = defaultdict(lambda: {"order_count": 0, "revenue": Decimal(0), "customer_count": 0})
+    activity = defaultdict(lambda: {"order_count": 0})
+    for day, customer_id, total_amount in orders:
+        daily[day]["order_count"] += 1
+        daily[day]["revenue"] += total_amount
+        activity[(day, customer_id)]["order_count"] += 1
+    units = defaultdict(lambda: {"units": 0})
+    for day, product_id, quantity in lines:
+        units[(day, product_id)]["units"] += quantity
+
+    with transaction.atomic():
+        after = bump_many(DailyCustomerActivity, ("date", "customer_id"), activity, returning=True)
+        for key, values in after.items():
+            # Only customers with no earlier order that day are new to its count.
+            if values["order_count"] == activity[key]["order_count"]:
+                daily[key[0]]["customer_count"] += 1
+        bump_many(DailyOrderStats, ("date",), {(day,): values for day, values in daily.items()})
+        bump_many(DailyProductStats, ("date", "product"), units)
+
+
+def unroll_orders(orders):
+    """
+    Subtract every order in ``orders`` (and its lines) from the rollups in a
+    few grouped queries. Call it right before deleting them in bulk, which
+    bypasses the per-order delete signals.
+    """
+    by_day = orders.annotate(day=TruncDate("order_date"))
+    lines = OrderLine.objects.filter(order__in=orders).annotate(
+        day=TruncDate("order__order_date")
+    )
+    with transaction.atomic():
+        for row in by_day.values("day").annotate(n=Count("pk"), revenue=Sum("total_amount")).order_by():
+            bump(DailyOrderStats, {"date": row["day"]}, order_count=-row["n"], revenue=-row["revenue"])
+        for row in by_day.values("day", "customer_id").annotate(n=Count("pk")).order_by():
+            keys = {"date": row["day"], "customer_id": row["customer_id"]}
+            bump(DailyCustomerActivity, keys, order_count=-row["n"])
+            if DailyCustomerActivity.objects.filter(**keys, order_count=0).delete()[0]:
+                bump(DailyOrderStats, {"date": row["day"]}, customer_count=-1)
+        for row in lines.values("day", "product_id").annotate(units=Sum("quantity")).order_by():
+            bump(DailyProductStats, {"date": row["day"], "product_id": row["product_id"]}, units=-row["units"])
+        DailyOrderStats.objects.filter(order_count=0).delete()
+        DailyProductStats.objects.filter(units=0).delete()
+
+
+# ==========================
+# Per-customer Order Stats
+# ==========================
+# Customer.order_count and lifetime_value move by F() deltas like the
+# rollups above. last_order_at only moves forward on a write; when a
+# customer's latest order goes away it is re-read from the (customer,
+# order_date) index within the same UPDATE. Counts are floored at zero so
+# drift from untracked writes cannot fail the CHECK constraint mid-delete.
+
+def latest_order_date():
+    orders = Order.objects.filter(customer_id=OuterRef("pk")).order_by("-order_date")
+    return Subquery(orders.values("order_date")[:1])
+
+
+def apply_customer_order(customer_id, order_date, total_amount, sign):
+    """Add (``sign=1``) or remove (``sign=-1``) one order from its customer's stats."""
+    if sign > 0:
+        last_order_at = Case(
+            When(last_order_at__gte=order_date, then=F("last_order_at")),
+            default=Value(order_date),
+            output_field=DateTimeField(),
+        )
+    else:
+        last_order_at = Case(
+            When(last_order_at=order_date, then=latest_order_date()),
+            default=F("last_order_at"),
+        )
+    Customer.objects.filter(pk=customer_id).update(
+        order_count=Greatest(F("order_count") + sign, Value(0)),
+        lifetime_value=F("lifetime_value") + sign * Decimal(str(total_amount)),
+        last_order_at=last_order_at,
+    )
+
+
+def apply_customer_batch(orders):
+    """
+    Add many ``(customer_id, order_date, total_amount)`` orders to their
+    customers' stats: the same delta UPDATE as ``apply_customer_order``,
+    prepared once and run per customer through ``executemany`` (building a
+    queryset per customer costs more than the UPDATE itself). Customers are
+    updated in pk order, so concurrent batches lock rows in the same order.
+    """
+    stats = {}
+    for customer_id, order_date, total_amount in orders:
+        count, value, last = stats.get(customer_id, (0, 0, order_date))
+        stats[customer_id] = (count + 1, value + total_amount, max(last, order_date))
+    connection = connections[DEFAULT_DB_ALIAS]
+    qn, opts = connection.ops.quote_name, Customer._meta
+    count, value, last = (qn(opts.get_field(name).column) for name in ("order_count", "lifetime_value", "last_order_at"))
+    adapt_datetime, adapt_decimal = connection.ops.adapt_datetimefield_value, connection.ops.adapt_decimalfield_value
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"UPDATE {qn(opts.db_table)} SET {count} = {count} + %s, {value} = {value} + %s, "
+            f"{last} = CASE WHEN {last} >= %s THEN {last} ELSE %s END WHERE {qn(opts.pk.column)} = %s",
+            [
+                (n, adapt_decimal(total), adapt_datetime(latest), adapt_datetime(latest), pk)
+                for pk, (n, total, latest) in sorted(stats.items())
+            ],
+        )
+
+
+def reconcile_customers(chunk_size=1000, dry_run=False):
+    """
+    Compare every customer's stored stats with its orders, ``chunk_size``
+    customers per grouped query, and rewrite the drifted ones from their
+    orders in one UPDATE per chunk. Returns ``(checked, drifted)``.
+    """
+    orders = Order.objects.filter(customer_id=OuterRef("pk")).order_by().values("customer_id")
+    actual = {
+        "order_count": Coalesce(Subquery(orders.annotate(n=Count("pk")).values("n")), Value(0)),
+        "lifetime_value": Coalesce(
+            Subquery(orders.annotate(total=Sum("total_amount")).values("total")),
+            Value(0),
+            output_field=DecimalField(max_digits=14, decimal_places=2),
+        ),
+        "last_order_at": latest_order_date(),
+    }
+    checked = drifted = 0
+    last_pk = 0
+    while True:
+        stored = list(
+            Customer.objects.filter(pk__gt=last_pk)
+            .order_by("pk")
+            .values_list("pk", "order_count", "lifetime_value", "last_order_at")[:chunk_size]
+        )
+        if not stored:
+            break
+        first_pk, last_pk = stored[0][0], stored[-1][0]
+        expected = {
+            row[0]: row[1:]
+            for row in Order.objects.filter(customer_id__gte=first_pk, customer_id__lte=last_pk)
+            .values("customer_id")
+            .annotate(n=Count("pk"), total=Sum("total_amount"), last=Max("order_date"))
+            .values_list("customer_id", "n", "total", "last")
+            .order_by()
+        }
+        ids = [pk for pk, *values in stored if tuple(values) != expected.get(pk, (0, 0, None))]
+        if ids and not dry_run:
+            Customer.objects.filter(pk__in=ids).update(**actual)
+        checked += len(stored)
+        drifted += len(ids)
+    if drifted and not dry_run:
+        invalidate(Customer)
+    return checked, drifted
+
+
+# ==========================
+# Full Rebuild
+# ==========================
+def rebuild(batch_size=1000):
+    """Recompute every rollup from the Order and order-line tables."""
+    orders = Order.objects.annotate(day=TruncDate("order_date"))
+    lines = OrderLine.objects.annotate(day=TruncDate("order__order_date"))
+    with transaction.atomic():
+        for model in (DailyOrderStats, DailyCustomerActivity, DailyProductStats):
+            model.objects.all().delete()
+        DailyOrderStats.objects.bulk_create(
+            (
+                DailyOrderStats(
+                    date=row["day"],
+                    order_count=row["order_count"],
+                    revenue=row["revenue"],
+                    customer_count=row["customer_count"],
+                )
+                for row in orders.values("day").annotate(
+                    order_count=Count("pk"),
+                    revenue=Sum("total_amount"),
+                    customer_count=Count("customer_id", distinct=True),
+                ).order_by()
+            ),
+            batch_size=batch_size,
+        )
+        DailyCustomerActivity.objects.bulk_create(
+            (
+                DailyCustomerActivity(date=row["day"], customer_id=row["customer_id"], order_count=row["n"])
+                for row in orders.values("day", "customer_id").annotate(n=Count("pk")).order_by()
+            ),
+            batch_size=batch_size,
+        )
+        DailyProductStats.objects.bulk_create(
+            (
+                DailyProductStats(date=row["day"], product_id=row["product_id"], units=row["units"])
+                for row in lines.values("day", "product_id").annotate(units=Sum("quantity")).order_by()
+            ),
+            batch_size=batch_size,
+        )
+        # Cached report responses are keyed on the Order version.
+        invalidate(Order)
+    return DailyOrderStats.objects.count()
@@ -1,105 +1,231 @@
 import graphene
+from django.db.models import Sum
+from graphql_relay import from_global_id
 from graphene_django import DjangoObjectType
 from graphene_django.filter import DjangoFilterConnectionField
+from graphene_django.settings import graphene_settings
+from graphql import GraphQLError
 from crm.models import Product
-from .models import Customer, Product, Order
+from . import search
+from .models import Customer, Product, Order, OrderError, OrderLine, DailyOrderStats, DailyProductStats
 from .filters import CustomerFilter, ProductFilter, OrderFilter
+from .fields import BatchedFilterConnectionField, KeysetConnectionField, filter_args, has_filter_args
+from .imports import import_orders
+from .loaders import get_loaders
+from .planner import covers, optimize_for, prefetched
+from .reports import crm_stats, to_cents
 
 
 # ==========================
 # GraphQL Object Types
 # ==========================
 class CustomerType(DjangoObjectType):
+    orders = BatchedFilterConnectionField("crm.schema.OrderType", required=True)
+
     class Meta:
         model = Customer
         interfaces = (graphene.relay.Node,)
         filterset_class = CustomerFilter
 
+    def resolve_orders(root, info, **kwargs):
+        if has_filter_args(kwargs):
+            return get_loaders(info).filtered(
+                "orders_by_customer", OrderFilter, filter_args(kwargs), info.context
+            ).load(root.pk)
+        orders = prefetched(root, "orders")
+        if orders is not None:
+            return get_loaders(info).prime_orders(orders)
+        return get_loaders(info).orders_by_customer.load(root.pk)
+
 
 class ProductType(DjangoObjectType):
+    orders = BatchedFilterConnectionField("crm.schema.OrderType", required=True)
+
     class Meta:
         model = Product
         interfaces = (graphene.relay.Node,)
         filterset_class = ProductFilter
+        exclude = ("order_lines",)
+
+    def resolve_orders(root, info, **kwargs):
+        if has_filter_args(kwargs):
+            return get_loaders(info).filtered(
+                "orders_by_product", OrderFilter, filter_args(kwargs), info.context
+            ).load(root.pk)
+        orders = prefetched(root, "orders")
+        if orders is not None:
+            return get_loaders(info).prime_orders(orders)
+        return get_loaders(info).orders_by_product.load(root.pk)
+
+
+class OrderLineType(DjangoObjectType):
+    class Meta:
+        model = OrderLine
+        fields = ("product", "quantity", "unit_price")
 
 
 class OrderType(DjangoObjectType):
+    products = BatchedFilterConnectionField(ProductType, required=True)
+    lines = graphene.List(graphene.NonNull(OrderLineType), required=True)
+
     class Meta:
         model = Order
         interfaces = (graphene.relay.Node,)
         filterset_class = OrderFilter
 
+    def resolve_customer(root, info):
+        if Order.customer.is_cached(root) and covers(root.customer, info):
+            return root.customer
+        return get_loaders(info).customer_by_id.load(root.customer_id)
+
+    def resolve_products(root, info, **kwargs):
+        if has_filter_args(kwargs):
+            return get_loaders(info).filtered(
+                "products_by_order", ProductFilter, filter_args(kwargs), info.context
+            ).load(root.pk)
+        products = prefetched(root, "products")
+        if products is not None:
+            return get_loaders(info).prime_products(products)
+        return get_loaders(info).products_by_order.load(root.pk)
+
+    def resolve_lines(root, info):
+        lines = prefetched(root, "lines")
+        if lines is not None:
+            return lines
+        return get_loaders(info).lines_by_order.load(root.pk)
+
+
+class DailyOrderStatsType(DjangoObjectType):
+    class Meta:
+        model = DailyOrderStats
+        fields = ("date", "order_count", "revenue", "customer_count")
+
+
+class RevenueTotalsType(graphene.ObjectType):
+    order_count = graphene.Int(required=True)
+    revenue = graphene.Decimal(required=True)
+
+
+class ProductSalesType(graphene.ObjectType):
+    product = graphene.Field(ProductType, required=True)
+    units = graphene.Int(required=True)
+
+
+class CrmStatsType(graphene.ObjectType):
+    customer_count = graphene.Int(required=True)
+    order_count = graphene.Int(required=True)
+    revenue = graphene.Decimal(required=True)
+
 
 # ==========================
-# Query with Filtering and Sorting
+# Query with Filtering, Sorting and Keyset Pagination
 # ==========================
 class Query(graphene.ObjectType):
-    all_customers = graphene.Field(
-        graphene.List(CustomerType),
-        order_by=graphene.String(),
-        name_Icontains=graphene.String(),
-        email_Icontains=graphene.String(),
+    hello = graphene.String(default_value="Hello, GraphQL!", description="Liveness check for the heartbeat job")
+    all_customers = KeysetConnectionField(CustomerType, required=True)
+    all_products = KeysetConnectionField(ProductType, required=True)
+    all_orders = KeysetConnectionField(OrderType, required=True)
+    crm_stats = graphene.Field(
+        CrmStatsType, required=True, description="Customer/order counts and revenue, aggregated in SQL"
     )
-    all_products = graphene.Field(
-        graphene.List(ProductType),
-        order_by=graphene.String(),
-        price_Gte=graphene.Float(),
-        price_Lte=graphene.Float(),
+
+    # Date-range dashboards read the daily rollups, never the Order table.
+    daily_order_stats = graphene.List(
+        graphene.NonNull(DailyOrderStatsType),
+        required=True,
+        start=graphene.Date(required=True),
+        end=graphene.Date(required=True),
     )
-    all_orders = graphene.Field(
-        graphene.List(OrderType),
-        order_by=graphene.String(),
-        total_amount_Gte=graphene.Float(),
-        total_amount_Lte=graphene.Float(),
+    revenue_between = graphene.Field(
+        RevenueTotalsType,
+        required=True,
+        start=graphene.Date(required=True),
+        end=graphene.Date(required=True),
     )
+    product_sales = graphene.List(
+        graphene.NonNull(ProductSalesType),
+        required=True,
+        start=graphene.Date(required=True),
+        end=graphene.Date(required=True),
+        first=graphene.Int(default_value=10),
+    )
+
+    # Search-box lookups, best match first; on SQLite they read the FTS5
+    # trigram index rather than scanning the table (see crm/search.py).
+    search_customers = graphene.List(
+        graphene.NonNull(CustomerType),
+        required=True,
+        query=graphene.String(required=True, description="Words to find in name, email or phone"),
+        first=graphene.Int(default_value=20),
+    )
+    search_products = graphene.List(
+        graphene.NonNull(ProductType),
+        required=True,
+        query=graphene.String(required=True, description="Words to find in the product name"),
+        first=graphene.Int(default_value=20),
+    )
+
+    # Filtering is done by the FilterSets in crm/filters.py; the resolvers
+    # only narrow the columns and relations to what the query selects.
+    def resolve_all_customers(self, info, **kwargs):
+        return optimize_for(Customer.objects.all(), info)
+
+    def resolve_all_products(self, info, **kwargs):
+        return optimize_for(Product.objects.all(), info)
+
+    def resolve_all_orders(self, info, **kwargs):
+        return optimize_for(Order.objects.all(), info)
+
+    def resolve_crm_stats(self, info):
+        return CrmStatsType(**crm_stats())
+
+    def resolve_daily_order_stats(self, info, start, end):
+        return DailyOrderStats.objects.filter(date__range=(start, end)).order_by("date")
+
+    def resolve_revenue_between(self, info, start, end):
+        totals = DailyOrderStats.objects.filter(date__range=(start, end)).aggregate(
+            order_count=Sum("order_count"), revenue=Sum("revenue")
+        )
+        return RevenueTotalsType(
+            order_count=totals["order_count"] or 0,
+            revenue=to_cents(totals["revenue"]),
+        )
+
+    def resolve_product_sales(self, info, start, end, first=10):
+        check_first(first)
+        rows = (
+            DailyProductStats.objects.filter(date__range=(start, end))
+            .values("product_id")
+            .annotate(units=Sum("units"))
+            .order_by("-units", "product_id")[:first]
+        )
+        products = Product.objects.in_bulk([row["product_id"] for row in rows])
+        # Rollup rows can outlive a product deleted without its cascade.
+        return [
+            ProductSalesType(product=products[row["product_id"]], units=row["units"])
+            for row in rows
+            if row["product_id"] in products
+        ]
+
+    def resolve_search_customers(self, info, query, first=20):
+        return search_results(Customer, query, first, info)
 
-    # ==========================
-    # CUSTOMERS
-    # ==========================
-    def resolve_all_customers(self, info, order_by=None, **filters):
-        qs = Customer.objects.all()
-        name = filters.get("name_Icontains")
-        email = filters.get("email_Icontains")
-
-        if name:
-            qs = qs.filter(name__icontains=name)
-        if email:
-            qs = qs.filter(email__icontains=email)
-        if order_by:
-            qs = qs.order_by(order_by)
-        return qs
-
-    # ==========================
-    # PRODUCTS
-    # ==========================
-    def resolve_all_products(self, info, order_by=None, **filters):
-        qs = Product.objects.all()
-        price_gte = filters.get("price_Gte")
-        price_lte = filters.get("price_Lte")
-
-        if price_gte:
-            qs = qs.filter(price__gte=price_gte)
-        if price_lte:
-            qs = qs.filter(price__lte=price_lte)
-        if order_by:
-            qs = qs.order_by(order_by)
-        return qs
-
-    # ==========================
-    # ORDERS
-    # ==========================
-    def resolve_all_orders(self, info, order_by=None, **filters):
-        qs = Order.objects.all()
-        amount_gte = filters.get("total_amount_Gte")
-        amount_lte = filters.get("total_amount_Lte")
-
-        if amount_gte:
-            qs = qs.filter(total_amount__gte=amount_gte)
-        if amount_lte:
-            qs = qs.filter(total_amount__lte=amount_lte)
-        if order_by:
-            qs = qs.order_by(order_by)
-        return qs
+    def resolve_search_products(self, info, query, first=20):
+        return search_results(Product, query, first, info)
+
+
+def check_first(first):
+    max_limit = graphene_settings.RELAY_CONNECTION_MAX_LIMIT
+    if not 0 <= first <= max_limit:
+        raise GraphQLError(f"Argument 'first' must be between 0 and {max_limit}.")
+
+
+def search_results(model, query, first, info):
+    check_first(first)
+    queryset = model.objects.all()
+    ids = search.search(model, query, first, using=queryset.db)
+    rows = optimize_for(queryset.filter(pk__in=ids), info).in_bulk()
+    return get_loaders(info).prime_rows([rows[pk] for pk in ids if pk in rows])
 
 
 # ==========================
@@ -107,22 +233,19 @@ class Query(graphene.ObjectType):
 # ==========================
 class UpdateLowStockProducts(graphene.Mutation):
     class Arguments:
-        # No arguments needed for this mutation
-        pass
+        threshold = graphene.Int(default_value=10, description="Restock products with stock below this")
+        amount = graphene.Int(default_value=10, description="Units to add to each low-stock product")
 
     success = graphene.Boolean()
     message = graphene.String()
     updated_products = graphene.List(ProductType)
 
-    def mutate(self, info):
-        # Find products with stock < 10
-        low_stock_products = Product.objects.filter(stock__lt=10)
-        updated = []
+    def mutate(self, info, threshold=10, amount=10):
+        if amount <= 0:
+            return UpdateLowStockProducts(success=False, message="Amount must be positive.", updated_products=[])
 
-        for product in low_stock_products:
-            product.stock += 10  # simulate restocking
-            product.save()
-            updated.append(product)
+        # One set-based UPDATE in a transaction instead of a save() per row
+        updated = Product.objects.restock(threshold=threshold, amount=amount)
 
         if updated:
             message = f"{len(updated)} products restocked successfully."
@@ -137,10 +260,113 @@ class UpdateLowStockProducts(graphene.Mutation):
 
 
 # ==========================
-# Root Mutation Placeholder
+# Mutation for Placing Orders
+# ==========================
+class OrderLineInput(graphene.InputObjectType):
+    product_id = graphene.ID(required=True, description="ProductType global id or primary key")
+    quantity = graphene.Int(required=True, default_value=1)
+
+
+def to_pk(value, type_name):
+    """Primary key from a Relay global id of ``type_name`` or a plain primary key."""
+    if str(value).isdigit():
+        return int(value)
+    kind, pk = from_global_id(value)
+    if kind != type_name or not pk.isdigit():
+        raise OrderError(f"{value!r} is not a {type_name} id.")
+    return int(pk)
+
+
+class PlaceOrder(graphene.Mutation):
+    """Create an order and reserve stock for every line, all or nothing (see ``OrderQuerySet.place``)."""
+
+    class Arguments:
+        customer_id = graphene.ID(required=True, description="CustomerType global id or primary key")
+        lines = graphene.List(graphene.NonNull(OrderLineInput), required=True)
+
+    success = graphene.Boolean()
+    message = graphene.String()
+    order = graphene.Field(OrderType)
+
+    def mutate(self, info, customer_id, lines):
+        try:
+            customer = Customer.objects.filter(pk=to_pk(customer_id, "CustomerType")).first()
+            if customer is None:
+                raise OrderError(f"Customer {customer_id} does not exist.")
+            order = Order.objects.place(
+                customer, [(to_pk(line.product_id, "ProductType"), line.quantity) for line in lines]
+            )
+        except OrderError as error:
+            return PlaceOrder(success=False, message=str(error), order=None)
+        return PlaceOrder(success=True, message=f"Order {order.pk} placed.", order=order)
+
+
+# ==========================
+# Mutation for Bulk Order Ingestion
+# ==========================
+class BulkOrderLineInput(OrderLineInput):
+    unit_price = graphene.Decimal(description="Price per unit; defaults to the product's current price")
+
+
+class BulkOrderInput(graphene.InputObjectType):
+    customer_email = graphene.String(required=True)
+    order_date = graphene.DateTime(description="Defaults to now")
+    lines = graphene.List(graphene.NonNull(BulkOrderLineInput), required=True)
+
+
+class BulkOrderError(graphene.ObjectType):
+    index = graphene.Int(required=True, description="Position of the rejected order in the input list")
+    message = graphene.String(required=True)
+
+
+class BulkCreateOrders(graphene.Mutation):
+    """Import a batch of orders in bulk; invalid rows are reported and skipped (see ``crm.imports``)."""
+
+    class Arguments:
+        orders = graphene.List(graphene.NonNull(BulkOrderInput), required=True)
+
+    success = graphene.Boolean(description="Whether every order was created")
+    created = graphene.Int()
+    order_ids = graphene.List(graphene.NonNull(graphene.ID), description="Primary keys of the created orders")
+    errors = graphene.List(graphene.NonNull(BulkOrderError))
+
+    def mutate(self, info, orders):
+        rows = [
+            {
+                "customer_email": order.customer_email,
+                "order_date": order.order_date,
+                "lines": [
+                    {"product_id": bulk_product_pk(line.product_id), "quantity": line.quantity, "unit_price": line.unit_price}
+                    for line in order.lines
+                ],
+            }
+            for order in orders
+        ]
+        result = import_orders(rows)
+        return BulkCreateOrders(
+            success=not result.errors,
+            created=result.created,
+            order_ids=result.order_ids,
+            errors=[BulkOrderError(index=index, message=message) for index, message in result.errors],
+        )
+
+
+def bulk_product_pk(value):
+    """Like ``to_pk``, but leaves a bad id for the importer to reject with its row."""
+    try:
+        return to_pk(value, "ProductType")
+    except OrderError:
+        return value
+
+
+# ==========================
+# Root Mutation
 # ==========================
 class Mutation(graphene.ObjectType):
     dummy = graphene.String(description="Placeholder field for schema validation")
+    update_low_stock_products = UpdateLowStockProducts.Field()
+    place_order = PlaceOrder.Field()
+    bulk_create_orders = BulkCreateOrders.Field()
 
     def resolve_dummy(root, info):
         return "Mutation root active"
@@ -0,0 +1,220 @@
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from .models import Customer, Product
+
+
+# ==========================
+# Trigram Search Indexes
+# ==========================
+# Each index is an FTS5 table with the trigram tokenizer, holding no text of
+# its own (``content=`` points at the model table) and kept in sync by
+# SQLite triggers, so bulk_create, upserts and raw SQL are covered as well
+# as save()/delete(). Trigrams answer case-insensitive substring matches,
+# i.e. ``icontains``, from the index for inputs of three or more characters.
+# Django rebuilds a SQLite table to alter it, which drops its triggers; the
+# post_migrate handler puts them back and reindexes, and until then the index
+# counts as unavailable so filters fall back to LIKE rather than go stale.
+MIN_LENGTH = 3
+TRIGGERS = ("_insert", "_delete", "_update")
+
+
+class SearchIndex:
+    def __init__(self, model, columns, weights):
+        self.model = model
+        self.columns = columns
+        # bm25() column weights: a hit in the first column ranks highest.
+        self.weights = weights
+        self.table = f"{model._meta.db_table}_fts"
+
+    def ddl(self, connection):
+        qn = connection.ops.quote_name
+        table, fts = qn(self.model._meta.db_table), qn(self.table)
+        pk = qn(self.model._meta.pk.column)
+        names = [qn(self.model._meta.get_field(column).column) for column in self.columns]
+        cols = ", ".join(names)
+        new = ", ".join(f"new.{name}" for name in names)
+        old = ", ".join(f"old.{name}" for name in names)
+        add = f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.{pk}, {new});"
+        remove = f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.{pk}, {old});"
+        return [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+            f"{cols}, content={table}, content_rowid={pk}, tokenize='trigram')",
+            f"CREATE TRIGGER IF NOT EXISTS {qn(self.table + '_insert')} AFTER INSERT ON {table} BEGIN {add} END",
+            f"CREATE TRIGGER IF NOT EXISTS {qn(self.table + '_delete')} AFTER DELETE ON {table} BEGIN {remove} END",
+            # Only the indexed columns: order-stat updates must not touch the index.
+            f"CREATE TRIGGER IF NOT EXISTS {qn(self.table + '_update')} AFTER UPDATE OF {cols} ON {table} "
+            f"BEGIN {remove} {add} END",
+            f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+        ]
+
+    def drop_ddl(self, connection):
+        qn = connection.ops.quote_name
+        return [
+            *(f"DROP TRIGGER IF EXISTS {qn(self.table + suffix)}" for suffix in TRIGGERS),
+            f"DROP TABLE IF EXISTS {qn(self.table)}",
+        ]
+
+    def usable(self, text, using=DEFAULT_DB_ALIAS):
+        return len(text) >= MIN_LENGTH and available(self.table, using)
+
+    def missing(self, connection):
+        """Which of the FTS table and its triggers are absent from ``connection``'s schema."""
+        names = [self.table] + [self.table + suffix for suffix in TRIGGERS]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT name FROM sqlite_master WHERE name IN ({', '.join(['%s'] * len(names))})", names
+            )
+            found = {row[0] for row in cursor.fetchall()}
+        return [name for name in names if name not in found]
+
+    def matches(self, text, column, limit, using=DEFAULT_DB_ALIAS):
+        """Up to ``limit`` primary keys of rows whose ``column`` contains ``text``."""
+        fts = f'"{self.table}"'
+        with connections[using].cursor() as cursor:
+            cursor.execute(f"SELECT rowid FROM {fts} WHERE {fts} MATCH %s LIMIT %s", [f"{column} : {phrase(text)}", limit])
+            return [row[0] for row in cursor.fetchall()]
+
+
+INDEXES = {
+    Customer: SearchIndex(Customer, ("name", "email", "phone"), (10.0, 5.0, 1.0)),
+    Product: SearchIndex(Product, ("name",), (1.0,)),
+}
+
+def available(table, using=DEFAULT_DB_ALIAS):
+    """
+    Whether ``table`` and its sync triggers exist: only on SQLite with FTS5,
+    once the migration has run, and not while a table rebuild has left the
+    index unsynced. Checked on every call (one sqlite_master lookup), so a
+    migration run by another process is noticed at once.
+    """
+    connection = connections[using]
+    if connection.vendor != "sqlite":
+        return False
+    index = next(index for index in INDEXES.values() if index.table == table)
+    return not index.missing(connection)
+
+
+def phrase(text):
+    """``text`` as one FTS5 phrase: no query syntax, just a substring to find."""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def install(connection):
+    """Create the FTS tables and triggers and index every existing row; idempotent."""
+    if connection.vendor != "sqlite":
+        return False
+    with connection.cursor() as cursor:
+        for index in INDEXES.values():
+            for statement in index.ddl(connection):
+                cursor.execute(statement)
+    return True
+
+
+def repair(connection):
+    """
+    Recreate triggers a table rebuild dropped and reindex that table, which
+    may have changed meanwhile; a no-op where the index is absent or intact.
+    """
+    if connection.vendor != "sqlite":
+        return []
+    repaired = []
+    with connection.cursor() as cursor:
+        for index in INDEXES.values():
+            missing = index.missing(connection)
+            if missing and index.table not in missing:
+                for statement in index.ddl(connection):
+                    cursor.execute(statement)
+                repaired.append(index.table)
+    return repaired
+
+
+def uninstall(connection):
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for index in INDEXES.values():
+            for statement in index.drop_ddl(connection):
+                cursor.execute(statement)
+
+
+# ==========================
+# Queries
+# ==========================
+def contains(model, column, value, prefix="", using=DEFAULT_DB_ALIAS):
+    """
+    Q for ``{prefix}{column}__icontains=value``, answered from ``model``'s
+    trigram index on database ``using`` where there is one. ``prefix``
+    reaches ``model`` through a relation, e.g. ``"customer__"`` from Order.
+
+    The matching keys are read up front, at most CRM_SEARCH_CANDIDATES of
+    them: a selective value becomes ``pk IN (...)`` on the primary key,
+    while one matching more rows than that stays a LIKE scan, which finds
+    a page of broad matches sooner than the index can list them all.
+    """
+    index = INDEXES.get(model)
+    if index is not None and column in index.columns and index.usable(value, using):
+        candidates = getattr(settings, "CRM_SEARCH_CANDIDATES", 1000)
+        pks = index.matches(value, column, candidates + 1, using)
+        if len(pks) <= candidates:
+            return Q(**{f"{prefix}pk__in": pks})
+    return Q(**{f"{prefix}{column}__icontains": value})
+
+
+def search(model, text, limit, using=DEFAULT_DB_ALIAS):
+    """
+    Up to ``limit`` primary keys of ``model`` rows on database ``using``
+    matching every word of ``text`` in any indexed column, best first: rows
+    whose first column starts with ``text``, then by bm25 rank. Words
+    shorter than three characters cannot be served by trigrams; such input,
+    and other backends, fall back to ``icontains`` with the same ordering by
+    prefix, then by the first column.
+    """
+    index = INDEXES[model]
+    words = text.split()
+    if not words:
+        return []
+    if all(index.usable(word, using) for word in words):
+        return ranked(index, text, words, limit, using)
+
+    first = index.columns[0]
+    match = Q()
+    for word in words:
+        match &= reduce(or_, (Q(**{f"{column}__icontains": word}) for column in index.columns))
+    starts = Case(When(**{f"{first}__istartswith": text}, then=Value(0)), default=Value(1), output_field=IntegerField())
+    return list(
+        model.objects.using(using).filter(match).annotate(starts=starts).order_by("starts", first, "pk").values_list("pk", flat=True)[:limit]
+    )
+
+
+def ranked(index, text, words, limit, using):
+    # bm25() needs each phrase's document frequency, which FTS5 counts over
+    # the whole doclist whatever the LIMIT: fine for a selective query, a
+    # full index scan for one matching most rows ("gmail.com"). So read at
+    # most CRM_SEARCH_CANDIDATES matches first, and rank broad queries by
+    # where they hit instead: first-column prefix, then first column, then id.
+    candidates = getattr(settings, "CRM_SEARCH_CANDIDATES", 1000)
+    fts, first = f'"{index.table}"', f'"{index.columns[0]}"'
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    match = " ".join(phrase(word) for word in words)
+    hits = f"{first} LIKE %s ESCAPE '\\'"
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, {hits}, {hits} FROM {fts} WHERE {fts} MATCH %s LIMIT %s",
+            [escaped + "%", "%" + escaped + "%", match, candidates + 1],
+        )
+        rows = cursor.fetchall()
+        if len(rows) > candidates:
+            rows.sort(key=lambda row: (-row[1], -row[2], row[0]))
+            return [row[0] for row in rows[:limit]]
+        weights = ", ".join(str(weight) for weight in index.weights)
+        cursor.execute(
+            f"SELECT rowid FROM {fts} WHERE {fts} MATCH %s "
+            f"ORDER BY {hits} DESC, bm25({fts}, {weights}), rowid LIMIT %s",
+            [match, escaped + "%", limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
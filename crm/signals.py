@@ -0,0 +1,103 @@
+from decimal import Decimal
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import rollups, search
+from .models import Customer, Order, OrderLine, Product
+from .response_cache import invalidate
+
+
+# ==========================
+# Daily Rollup Maintenance
+# ==========================
+@receiver(pre_save, sender=Order)
+def remember_previous_order(sender, instance, raw=False, **kwargs):
+    instance._rollup_previous = None
+    if instance.pk and not raw:
+        instance._rollup_previous = (
+            Order.objects.filter(pk=instance.pk)
+            .values_list("order_date", "customer_id", "total_amount")
+            .first()
+        )
+
+
+@receiver(post_save, sender=Order)
+def roll_up_saved_order(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, "_rollup_previous", None)
+    current = (instance.order_date, instance.customer_id, Decimal(str(instance.total_amount)))
+    if previous == current:
+        return
+    day = rollups.order_day(instance.order_date)
+    if previous is not None:
+        old_day = rollups.order_day(previous[0])
+        rollups.apply_order(old_day, previous[1], previous[2], -1)
+        rollups.apply_customer_order(previous[1], previous[0], previous[2], -1)
+        if old_day != day:
+            units = rollups.order_units(instance.pk)
+            rollups.apply_units(old_day, units, -1)
+            rollups.apply_units(day, units, 1)
+    rollups.apply_order(day, instance.customer_id, instance.total_amount, 1)
+    rollups.apply_customer_order(instance.customer_id, instance.order_date, instance.total_amount, 1)
+
+
+@receiver(pre_delete, sender=Order)
+def remember_deleted_lines(sender, instance, **kwargs):
+    # Line rows are removed by the cascade without m2m_changed, so read them now.
+    instance._rollup_units = rollups.order_units(instance.pk)
+
+
+@receiver(post_delete, sender=Order)
+def roll_up_deleted_order(sender, instance, **kwargs):
+    day = rollups.order_day(instance.order_date)
+    rollups.apply_order(day, instance.customer_id, instance.total_amount, -1)
+    rollups.apply_units(day, getattr(instance, "_rollup_units", {}), -1)
+    rollups.apply_customer_order(instance.customer_id, instance.order_date, instance.total_amount, -1)
+
+
+@receiver(m2m_changed, sender=OrderLine)
+def roll_up_order_lines(sender, instance, action, reverse, pk_set, **kwargs):
+    # product.orders.add(...) has one product and many orders; order.products the reverse.
+    lines = OrderLine.objects.filter(**{"product_id" if reverse else "order_id": instance.pk})
+    if pk_set is not None:
+        lines = lines.filter(**{"order_id__in" if reverse else "product_id__in": pk_set})
+    if action in ("pre_clear", "pre_remove"):
+        # Remember what is actually linked; remove() reports every pk asked for.
+        instance._rollup_unlinked = list(lines.values_list("order_id", "product_id", "quantity"))
+        return
+    if action in ("post_clear", "post_remove"):
+        rollups.apply_lines(getattr(instance, "_rollup_unlinked", []), -1)
+    elif action == "post_add":
+        rollups.apply_lines(lines.values_list("order_id", "product_id", "quantity"), 1)
+
+
+# ==========================
+# Response Cache Invalidation
+# ==========================
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Order)
+def invalidate_cached_responses(sender, **kwargs):
+    invalidate(sender)
+
+
+@receiver(m2m_changed, sender=OrderLine)
+def invalidate_cached_order_lines(sender, action, **kwargs):
+    if action.startswith("post_"):
+        invalidate(Order, Product)
+
+
+# ==========================
+# Search Index Triggers
+# ==========================
+@receiver(post_migrate)
+def repair_search_index(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    # SQLite alters a table by rebuilding it, which drops its triggers.
+    if sender.name == "crm":
+        search.repair(connections[using])
@@ -1,3 +1,1689 @@
-from django.test import TestCase
+import datetime
+import json
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from types import SimpleNamespace
 
-# Create your tests here.
+from unittest import mock, skipUnless
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import OperationalError, close_old_connections, connection
+from django.db.models import Sum
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from graphql import GraphQLError, parse
+from graphql_relay import to_global_id
+
+from alx_backend_graphql_crm.schema import schema
+from . import client as client_module, execution, rollups, search
+from .benchmarks import compare, run_suite, run_throughput
+from .management.commands.cleanup_inactive_customers import delete_chunk
+from .client import LocalClient, LocalQueryError, get_client
+from .cost import CostAnalysis, spend
+from .documents import DocumentCache, get_document_cache
+from .exports import export_lines
+from .imports import import_orders, insert_rows, upsert_customers
+from .persisted_queries import get_persisted_queries, query_hash
+from .filters import CustomerFilter, OrderFilter, ProductFilter
+from .loaders import Loaders
+from .profiling import fingerprint, label, metrics
+from .views import AsyncCRMGraphQLView, CRMGraphQLView
+from .models import (
+    Customer, Product, Order, OrderError, OrderLine, InsufficientStock,
+    DailyCustomerActivity, DailyOrderStats, DailyProductStats, PersistedQuery,
+)
+
+
+def execute(query, variables=None):
+    """Run a document against the project schema with a fresh request context."""
+    return schema.execute(query, variable_values=variables, context_value=SimpleNamespace())
+
+
+def nodes(connection):
+    return [edge["node"] for edge in connection["edges"]]
+
+
+# ==========================
+# DataLoader batching
+# ==========================
+class DataLoaderTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        products = [Product.objects.create(name=f"P{i}", price=10 + i, stock=i) for i in range(5)]
+        for c in range(4):
+            customer = Customer.objects.create(name=f"C{c}", email=f"c{c}@example.com")
+            for o in range(3):
+                order = Order.objects.create(customer=customer, total_amount=o)
+                order.products.set(products[o:o + 2])
+
+    def test_nested_relations_are_batched_per_level(self):
+        query = """
+        query {
+            allOrders { edges { node {
+                customer { name orders { edges { node { id } } } }
+                products { edges { node { name orders { edges { node { id } } } } } }
+            } } }
+        }
+        """
+        with CaptureQueriesContext(connection) as ctx:
+            result = execute(query)
+        self.assertIsNone(result.errors)
+        self.assertEqual(len(nodes(result.data["allOrders"])), 12)
+        # orders JOIN customer, customer.orders, products, products.orders
+        self.assertEqual(len(ctx.captured_queries), 4)
+        first = nodes(result.data["allOrders"])[0]
+        self.assertEqual(first["customer"]["name"], "C0")
+        self.assertEqual(len(first["customer"]["orders"]["edges"]), 3)
+        self.assertEqual(
+            [e["node"]["name"] for e in first["products"]["edges"]], ["P0", "P1"]
+        )
+
+    def test_loaders_issue_one_query_per_level(self):
+        loaders = Loaders()
+        orders = loaders.prime_orders(list(Order.objects.all()))
+        with self.assertNumQueries(2):
+            customers = [loaders.customer_by_id.load(o.customer_id) for o in orders]
+            products = [loaders.products_by_order.load(o.pk) for o in orders]
+        with self.assertNumQueries(2):
+            for customer in customers:
+                loaders.orders_by_customer.load(customer.pk)
+            for row in products:
+                for product in row:
+                    loaders.orders_by_product.load(product.pk)
+        self.assertEqual([p.name for p in products[0]], ["P0", "P1"])
+
+    def test_filtered_nested_connections_are_batched_per_level(self):
+        query = """
+        query {
+            allCustomers { edges { node {
+                name
+                orders(totalAmount_Gte: 1) { edges { node {
+                    totalAmount
+                    products(name: "P1") { edges { node {
+                        name
+                        orders(totalAmount_Lte: 1) { edges { node { totalAmount } } }
+                    } } }
+                } } }
+            } } }
+        }
+        """
+        with CaptureQueriesContext(connection) as ctx:
+            result = execute(query)
+        self.assertIsNone(result.errors)
+        # customers, then one query per filtered level however many parents
+        self.assertEqual(len(ctx.captured_queries), 4)
+        customers = nodes(result.data["allCustomers"])
+        self.assertEqual(len(customers), 4)
+        for customer in customers:
+            orders = nodes(customer["orders"])
+            self.assertEqual([order["totalAmount"] for order in orders], ["1.00", "2.00"])
+            self.assertEqual([nodes(order["products"]) for order in orders][1], [])
+            product = nodes(orders[0]["products"])[0]
+            self.assertEqual(product["name"], "P1")
+            self.assertEqual(len(product["orders"]["edges"]), 8)  # two per customer
+
+# ==========================
+# Selection-set query planning
+# ==========================
+class QueryPlannerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        products = [Product.objects.create(name=f"P{i}", price=10 + i, stock=i) for i in range(3)]
+        for c in range(3):
+            customer = Customer.objects.create(name=f"C{c}", email=f"c{c}@example.com")
+            order = Order.objects.create(customer=customer, total_amount=c)
+            order.products.set(products)
+
+    def test_only_requested_columns_are_loaded(self):
+        with CaptureQueriesContext(connection) as ctx:
+            result = execute("query { allProducts { edges { node { name } } } }")
+        self.assertIsNone(result.errors)
+        sql = ctx.captured_queries[0]["sql"]
+        self.assertIn('"crm_product"."name"', sql)
+        self.assertNotIn('"crm_product"."price"', sql)
+        self.assertNotIn('"crm_product"."stock"', sql)
+
+    def test_relations_are_joined_and_prefetched(self):
+        query = """
+        query {
+            allOrders { edges { node {
+                totalAmount
+                customer { name }
+                products { edges { node { name } } }
+            } } }
+        }
+        """
+        with CaptureQueriesContext(connection) as ctx:
+            result = execute(query)
+        self.assertIsNone(result.errors)
+        # orders JOIN customer, then one prefetch for products
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertNotIn('"crm_customer"."email"', ctx.captured_queries[0]["sql"])
+        self.assertEqual(len(nodes(result.data["allOrders"])[0]["products"]["edges"]), 3)
+
+    def test_back_reference_loads_its_own_columns(self):
+        query = """
+        query {
+            allCustomers { edges { node {
+                name
+                orders { edges { node { customer { email } } } }
+            } } }
+        }
+        """
+        with CaptureQueriesContext(connection) as ctx:
+            result = execute(query)
+        self.assertIsNone(result.errors)
+        self.assertEqual(len(ctx.captured_queries), 2)
+        emails = [
+            c["orders"]["edges"][0]["node"]["customer"]["email"]
+            for c in nodes(result.data["allCustomers"])
+        ]
+        self.assertEqual(emails, ["c0@example.com", "c1@example.com", "c2@example.com"])
+
+
+# ==========================
+# Keyset pagination
+# ==========================
+class KeysetPaginationTests(TestCase):
+    query = """
+    query ($first: Int, $after: String, $orderBy: String) {
+        allProducts(first: $first, after: $after, orderBy: $orderBy) {
+            edges { node { name } }
+            pageInfo { hasNextPage hasPreviousPage endCursor }
+        }
+    }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        # Duplicate prices force the pk tie-breaker to keep pages stable.
+        for i in range(7):
+            Product.objects.create(name=f"P{i}", price=10 + i % 3, stock=i)
+
+    def walk(self, order_by, first=3):
+        names, after = [], None
+        while True:
+            result = execute(self.query, {"first": first, "after": after, "orderBy": order_by})
+            self.assertIsNone(result.errors)
+            page = result.data["allProducts"]
+            names += [n["name"] for n in nodes(page)]
+            self.assertEqual(page["pageInfo"]["hasPreviousPage"], after is not None)
+            if not page["pageInfo"]["hasNextPage"]:
+                return names
+            after = page["pageInfo"]["endCursor"]
+
+    def test_pages_cover_every_row_once_in_order(self):
+        expected = list(Product.objects.order_by("price", "pk").values_list("name", flat=True))
+        self.assertEqual(self.walk("price"), expected)
+        expected = list(Product.objects.order_by("-price", "-pk").values_list("name", flat=True))
+        self.assertEqual(self.walk("-price"), expected)
+        self.assertEqual(self.walk(None, first=2), [f"P{i}" for i in range(7)])
+
+    def test_pages_seek_instead_of_offset(self):
+        page = execute(self.query, {"first": 2}).data["allProducts"]
+        with CaptureQueriesContext(connection) as ctx:
+            execute(self.query, {"first": 2, "after": page["pageInfo"]["endCursor"]})
+        sql = ctx.captured_queries[0]["sql"]
+        self.assertNotIn("OFFSET", sql)
+        self.assertIn("LIMIT 3", sql)
+
+    def test_page_size_is_capped(self):
+        result = execute(self.query, {"first": 10_000})
+        self.assertIn("exceeds the `first` limit", str(result.errors[0]))
+
+    def test_rejects_bad_cursor_and_ordering(self):
+        self.assertIn("Invalid cursor", str(execute(self.query, {"after": "nope"}).errors[0]))
+        result = execute(self.query, {"orderBy": "orders"})
+        self.assertIn("Cannot order", str(result.errors[0]))
+
+
+# ==========================
+# FilterSet-backed list fields
+# ==========================
+class FilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cheap = Product.objects.create(name="Mouse", price=25, stock=3)
+        cls.dear = Product.objects.create(name="Laptop", price=999, stock=40)
+        alice = Customer.objects.create(name="Alice", email="alice@example.com", phone="+1555")
+        bob = Customer.objects.create(name="Bob", email="bob@example.com", phone="0800")
+        Order.objects.create(customer=alice, total_amount=25).products.set([cls.cheap])
+        Order.objects.create(customer=bob, total_amount=1024).products.set([cls.cheap, cls.dear])
+
+    def test_list_fields_use_the_filtersets(self):
+        result = execute("""
+        query ($productId: Decimal) {
+            allProducts(price_Gte: 100) { edges { node { name } } }
+            allCustomers(phonePattern: "+1") { edges { node { name } } }
+            allOrders(productId: $productId, customerName: "bo") { edges { node { totalAmount } } }
+        }
+        """, {"productId": str(self.dear.pk)})
+        self.assertIsNone(result.errors)
+        self.assertEqual(nodes(result.data["allProducts"]), [{"name": "Laptop"}])
+        self.assertEqual(nodes(result.data["allCustomers"]), [{"name": "Alice"}])
+        self.assertEqual(nodes(result.data["allOrders"]), [{"totalAmount": "1024.00"}])
+
+    def test_product_filters_combine_without_duplicates(self):
+        data = {"product_id": self.cheap.pk, "product_name": "o"}  # Mouse, Laptop
+        qs = OrderFilter(data=data, queryset=Order.objects.all()).qs
+        self.assertNotIn("DISTINCT", str(qs.query))
+        self.assertEqual(sorted(qs.values_list("total_amount", flat=True)), [25, 1024])
+
+    @skipUnless(connection.vendor == "sqlite", "EXPLAIN output is SQLite-specific")
+    def test_range_filters_search_an_index(self):
+        # Substring filters (name, email) read the trigram index instead of a
+        # b-tree one; SearchTests covers them.
+        cases = [
+            (ProductFilter, {"price__gte": 5}, "price"),
+            (ProductFilter, {"price__lte": 5}, "price"),
+            (ProductFilter, {"stock__gte": 5}, "stock"),
+            (ProductFilter, {"stock__lte": 5}, "stock"),
+            (OrderFilter, {"total_amount__gte": 5}, "total_amount"),
+            (OrderFilter, {"total_amount__lte": 5}, "total_amount"),
+            (OrderFilter, {"order_date__gte": "2025-01-01T00:00:00Z"}, "order_date"),
+            (OrderFilter, {"order_date__lte": "2025-01-01T00:00:00Z"}, "order_date"),
+            (OrderFilter, {"product_id": self.cheap.pk}, "pk"),
+            (CustomerFilter, {"created_at__gte": "2025-01-01"}, "created_at"),
+            (CustomerFilter, {"created_at__lte": "2025-01-01"}, "created_at"),
+        ]
+        for filterset_class, data, ordering in cases:
+            with self.subTest(data=data):
+                model = filterset_class._meta.model
+                filterset = filterset_class(data=data, queryset=model.objects.all())
+                self.assertTrue(filterset.is_valid())
+                plan = filterset.qs.order_by(ordering, "pk").explain()
+                self.assertIn("USING INDEX", plan)
+                self.assertNotIn(f"SCAN {model._meta.db_table}", plan)
+
+
+# ==========================
+# Bulk restock mutation
+# ==========================
+class RestockTests(TestCase):
+    mutation = """
+    mutation ($threshold: Int, $amount: Int) {
+        updateLowStockProducts(threshold: $threshold, amount: $amount) {
+            success
+            message
+            updatedProducts { name stock }
+        }
+    }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        for name, stock in (("Empty", 0), ("Low", 9), ("Fine", 10), ("Plenty", 80)):
+            Product.objects.create(name=name, price=1, stock=stock)
+
+    def test_restocks_below_threshold_in_one_update(self):
+        with CaptureQueriesContext(connection) as ctx:
+            result = execute(self.mutation)
+        self.assertIsNone(result.errors)
+        payload = result.data["updateLowStockProducts"]
+        self.assertTrue(payload["success"])
+        self.assertEqual(payload["message"], "2 products restocked successfully.")
+        self.assertEqual(payload["updatedProducts"], [{"name": "Empty", "stock": 10}, {"name": "Low", "stock": 19}])
+        updates = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
+
+    def test_threshold_and_amount_arguments(self):
+        result = execute(self.mutation, {"threshold": 50, "amount": 5})
+        names = {p["name"]: p["stock"] for p in result.data["updateLowStockProducts"]["updatedProducts"]}
+        self.assertEqual(names, {"Empty": 5, "Low": 14, "Fine": 15})
+        self.assertEqual(Product.objects.get(name="Plenty").stock, 80)
+
+    def test_rejects_non_positive_amount(self):
+        result = execute(self.mutation, {"amount": 0})
+        self.assertFalse(result.data["updateLowStockProducts"]["success"])
+        self.assertEqual(Product.objects.get(name="Empty").stock, 0)
+
+    def test_backends_without_returning_read_ids_first(self):
+        with mock.patch("crm.models.supports_update_returning", return_value=False):
+            updated = Product.objects.restock(threshold=10, amount=1)
+        self.assertEqual([(p.name, p.stock) for p in updated], [("Empty", 1), ("Low", 10)])
+
+
+# ==========================
+# CRM report aggregation
+# ==========================
+class CrmStatsTests(TestCase):
+    query = "query { crmStats { customerCount orderCount revenue } }"
+
+    def test_empty_database(self):
+        result = execute(self.query)
+        self.assertEqual(result.data["crmStats"], {"customerCount": 0, "orderCount": 0, "revenue": "0.00"})
+
+    def test_counts_and_exact_revenue_in_two_queries(self):
+        alice = Customer.objects.create(name="Alice", email="alice@example.com")
+        Customer.objects.create(name="Bob", email="bob@example.com")
+        for amount in ("0.10", "0.20", "999.99"):
+            Order.objects.create(customer=alice, total_amount=amount)
+        with self.assertNumQueries(2):
+            result = execute(self.query)
+        self.assertEqual(result.data["crmStats"], {"customerCount": 2, "orderCount": 3, "revenue": "1000.29"})
+
+
+# ==========================
+# Daily revenue rollups
+# ==========================
+def rollup_snapshot():
+    return (
+        sorted(DailyOrderStats.objects.values_list("date", "order_count", "revenue", "customer_count")),
+        sorted(DailyCustomerActivity.objects.values_list("date", "customer_id", "order_count")),
+        sorted(DailyProductStats.objects.values_list("date", "product_id", "units")),
+    )
+
+
+class DailyRollupTests(TestCase):
+    def assertMatchesRebuild(self):
+        incremental = rollup_snapshot()
+        rollups.rebuild()
+        self.assertEqual(incremental, rollup_snapshot())
+
+    def test_incremental_maintenance_matches_rebuild(self):
+        day1 = datetime.datetime(2025, 3, 1, 9, tzinfo=datetime.timezone.utc)
+        day2 = datetime.datetime(2025, 3, 2, 9, tzinfo=datetime.timezone.utc)
+        alice = Customer.objects.create(name="Alice", email="alice@example.com")
+        bob = Customer.objects.create(name="Bob", email="bob@example.com")
+        mouse = Product.objects.create(name="Mouse", price=25, stock=0)
+        laptop = Product.objects.create(name="Laptop", price=999, stock=0)
+
+        first = Order.objects.create(customer=alice, order_date=day1, total_amount="25.10")
+        first.products.add(mouse, laptop)
+        second = Order.objects.create(customer=alice, order_date=day1, total_amount="10.00")
+        second.products.set([mouse])
+        third = Order.objects.create(customer=bob, order_date=day2, total_amount="5.00")
+        laptop.orders.add(third)
+        self.assertMatchesRebuild()
+        stats = DailyOrderStats.objects.get(date=day1.date())
+        self.assertEqual((stats.order_count, stats.revenue, stats.customer_count), (2, Decimal("35.10"), 1))
+
+        second.order_date = day2
+        second.total_amount = Decimal("12.00")
+        second.save()
+        first.products.remove(laptop, Product.objects.create(name="Unlinked", price=1))
+        third.products.clear()
+        self.assertMatchesRebuild()
+
+        first.delete()
+        bob.delete()
+        self.assertMatchesRebuild()
+        self.assertFalse(DailyOrderStats.objects.filter(date=day1.date()).exists())
+
+    def test_range_queries_read_the_rollup(self):
+        customer = Customer.objects.create(name="Alice", email="alice@example.com")
+        mouse = Product.objects.create(name="Mouse", price=25, stock=0)
+        keyboard = Product.objects.create(name="Keyboard", price=75, stock=0)
+        for day, amount, products in ((1, "25.00", [mouse]), (2, "100.00", [mouse, keyboard]), (9, "7.00", [keyboard])):
+            order = Order.objects.create(
+                customer=customer,
+                order_date=datetime.datetime(2025, 3, day, tzinfo=datetime.timezone.utc),
+                total_amount=amount,
+            )
+            order.products.set(products)
+
+        query = """
+        query {
+            dailyOrderStats(start: "2025-03-01", end: "2025-03-05") { date orderCount revenue customerCount }
+            revenueBetween(start: "2025-03-01", end: "2025-03-31") { orderCount revenue }
+            productSales(start: "2025-03-01", end: "2025-03-05") { product { name } units }
+        }
+        """
+        with self.assertNumQueries(4):
+            result = execute(query)
+        self.assertIsNone(result.errors)
+        self.assertEqual(
+            result.data["dailyOrderStats"],
+            [
+                {"date": "2025-03-01", "orderCount": 1, "revenue": "25.00", "customerCount": 1},
+                {"date": "2025-03-02", "orderCount": 1, "revenue": "100.00", "customerCount": 1},
+            ],
+        )
+        self.assertEqual(result.data["revenueBetween"], {"orderCount": 3, "revenue": "132.00"})
+        self.assertEqual(
+            result.data["productSales"],
+            [{"product": {"name": "Mouse"}, "units": 2}, {"product": {"name": "Keyboard"}, "units": 1}],
+        )
+
+        for first in (-1, 1000):
+            result = execute(f'query {{ productSales(start: "2025-03-01", end: "2025-03-05", first: {first}) {{ units }} }}')
+            self.assertIn("Argument 'first' must be between 0 and", result.errors[0].message)
+
+        # A rollup row left behind by a product deleted without its cascade is skipped.
+        DailyProductStats.objects.filter(product=mouse).update(product_id=10**6)
+        result = execute('query { productSales(start: "2025-03-01", end: "2025-03-05") { product { name } units } }')
+        self.assertIsNone(result.errors)
+        self.assertEqual(result.data["productSales"], [{"product": {"name": "Keyboard"}, "units": 1}])
+        DailyProductStats.objects.filter(product_id=10**6).delete()
+
+
+# ==========================
+# In-process client for scheduled jobs
+# ==========================
+class LocalClientTests(TestCase):
+    def test_executes_against_the_schema_without_http(self):
+        client = get_client()
+        self.assertIsInstance(client, LocalClient)
+        self.assertEqual(client.execute("query { hello }"), {"hello": "Hello, GraphQL!"})
+
+    def test_runs_mutations_with_variables(self):
+        Product.objects.create(name="Mouse", price=25, stock=1)
+        data = get_client().execute(
+            "mutation ($amount: Int) { updateLowStockProducts(amount: $amount) { updatedProducts { stock } } }",
+            variable_values={"amount": 4},
+        )
+        self.assertEqual(data["updateLowStockProducts"]["updatedProducts"], [{"stock": 5}])
+
+    def test_raises_on_graphql_errors(self):
+        with self.assertRaises(LocalQueryError) as ctx:
+            get_client().execute("query { nope }")
+        self.assertIn("nope", str(ctx.exception))
+
+
+class ClientSchemaArtifactTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "schema.graphql"
+        override = self.settings(CRM_CLIENT_SCHEMA_PATH=self.path)
+        override.enable()
+        self.addCleanup(override.disable)
+        patcher = mock.patch.object(client_module, "_client_schema", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_stale_artifact_is_rewritten_and_loaded_once(self):
+        self.path.write_text("# sha256: stale\ntype Query { old: String }\n")
+        loaded = client_module.client_schema()
+        self.assertIn("allOrders", loaded.query_type.fields)
+        digest, _ = client_module.read_schema_artifact()
+        self.assertNotEqual(digest, "stale")
+        with mock.patch.object(client_module, "build_schema") as build:
+            self.assertIs(client_module.client_schema(), loaded)
+            build.assert_not_called()
+
+    def test_http_client_validates_locally_without_introspection(self):
+        client_module.write_schema_artifact()
+        http = client_module.HttpClient(url="http://localhost:1/graphql")
+        self.addCleanup(http.close)
+        self.assertFalse(http.client.fetch_schema_from_transport)
+        with mock.patch.object(http.client.transport, "execute") as send:
+            with self.assertRaises(GraphQLError):
+                http.execute("query { nope }")
+            send.assert_not_called()
+
+
+# ==========================
+# Inactive customer cleanup
+# ==========================
+class CleanupInactiveCustomersTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        mouse = Product.objects.create(name="Mouse", price=25, stock=0)
+        cls.customers = {}
+        for name, ages in (("stale", [400, 800]), ("recent", [400, 10]), ("never", []), ("lapsed", [366])):
+            customer = Customer.objects.create(name=name, email=f"{name}@example.com")
+            cls.customers[name] = customer
+            for age in ages:
+                order = Order.objects.create(
+                    customer=customer, order_date=now - datetime.timedelta(days=age), total_amount=5
+                )
+                order.products.add(mouse)
+
+    def run_command(self, *args):
+        out = StringIO()
+        call_command("cleanup_inactive_customers", *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_only_counts(self):
+        output = self.run_command("--dry-run")
+        self.assertIn("would delete 2 customers (3 orders)", output)
+        self.assertEqual(Customer.objects.count(), 4)
+
+    def test_deletes_customers_whose_latest_order_is_old_in_chunks(self):
+        output = self.run_command("--chunk-size", "1", "-v", "2")
+        self.assertIn("Deleted 2 customers (3 orders)", output)
+        self.assertEqual(output.count("..."), 2)
+        self.assertEqual(
+            sorted(Customer.objects.values_list("name", flat=True)), ["never", "recent"]
+        )
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(Order.products.through.objects.count(), 2)
+
+    def test_customer_who_orders_after_selection_is_kept(self):
+        cutoff = timezone.now() - datetime.timedelta(days=365)
+        stale, lapsed = self.customers["stale"], self.customers["lapsed"]
+        fresh = Order.objects.create(customer=stale, total_amount=5)  # placed after the ids were read
+        self.assertEqual(delete_chunk([stale.pk, lapsed.pk], cutoff), (1, 1))
+        self.assertTrue(Order.objects.filter(pk=fresh.pk).exists())
+        self.assertEqual(Order.objects.filter(customer=stale).count(), 3)
+        self.assertFalse(Customer.objects.filter(pk=lapsed.pk).exists())
+
+    def test_rollups_stay_consistent(self):
+        self.run_command()
+        incremental = rollup_snapshot()
+        rollups.rebuild()
+        self.assertEqual(incremental, rollup_snapshot())
+
+
+# ==========================
+# Synthetic load data
+# ==========================
+class SeedDataTests(TestCase):
+    def seed(self, *args):
+        call_command(
+            "seed_data", "--customers", "20", "--products", "10", "--orders", "200",
+            "--batch-size", "64", *args, stdout=StringIO(),
+        )
+
+    def snapshot(self):
+        return (
+            list(Order.objects.order_by("pk").values_list("customer_id", "order_date", "total_amount")),
+            list(Order.products.through.objects.order_by("order_id", "product_id").values_list("order_id", "product_id")),
+        )
+
+    def test_counts_and_totals(self):
+        self.seed()
+        self.assertEqual(Customer.objects.count(), 20)
+        self.assertEqual(Product.objects.count(), 10)
+        self.assertEqual(Order.objects.count(), 200)
+        for order in Order.objects.prefetch_related("products"):
+            self.assertEqual(order.total_amount, sum(p.price for p in order.products.all()))
+
+    def test_same_seed_is_deterministic(self):
+        self.seed("--seed", "7")
+        first = self.snapshot()
+        Order.objects.all().delete()
+        Customer.objects.all().delete()
+        Product.objects.all().delete()
+        self.seed("--seed", "7")
+        orders, lines = self.snapshot()
+        # Ids continue after the deleted rows; dates, totals and basket sizes must match.
+        self.assertEqual([row[1:] for row in orders], [row[1:] for row in first[0]])
+        self.assertEqual(len(lines), len(first[1]))
+
+    def test_batches_commit_on_their_own(self):
+        calls = []
+
+        def fail_third_batch(model, fields, rows):
+            calls.append(model)
+            if len(calls) == 6:
+                raise OperationalError("disk I/O error")
+            return insert_rows(model, fields, rows)
+
+        with mock.patch("crm.management.commands.seed_data.insert_rows", side_effect=fail_third_batch):
+            with self.assertRaises(OperationalError):
+                self.seed()
+        self.assertEqual(Customer.objects.count(), 20)
+        # Two batches of orders were kept; the third lost its orders with its lines.
+        self.assertEqual(Order.objects.count(), 128)
+        self.assertEqual(Order.objects.filter(lines__isnull=True).count(), 0)
+        Customer.objects.create(name="After", email="after@example.com")
+
+    def test_rollups_match_orders(self):
+        self.seed()
+        self.assertEqual(DailyOrderStats.objects.aggregate(n=Sum("order_count"))["n"], 200)
+        seeded = rollup_snapshot()
+        rollups.rebuild()
+        self.assertEqual(seeded, rollup_snapshot())
+
+
+# ==========================
+# Benchmark suite
+# ==========================
+@override_settings(ALLOWED_HOSTS=["localhost"])
+class BenchmarkSuiteTests(TestCase):
+    def test_suite_measures_every_document_and_rolls_back(self):
+        call_command(
+            "seed_data", "--customers", "50", "--products", "20", "--orders", "300", stdout=StringIO()
+        )
+        stock = list(Product.objects.order_by("pk").values_list("stock", flat=True))
+        results = run_suite(repeat=3, warmup=1)
+        self.assertEqual(
+            set(results),
+            {"orders_filtered", "customers_search", "products_price_range", "restock_mutation", "report"},
+        )
+        for metrics in results.values():
+            self.assertGreater(metrics["queries"], 0)
+            self.assertLessEqual(metrics["p50_ms"], metrics["p99_ms"])
+        # Nested customers and products are batched, not fetched per order.
+        self.assertLessEqual(results["orders_filtered"]["queries"], 3)
+        self.assertEqual(stock, list(Product.objects.order_by("pk").values_list("stock", flat=True)))
+
+    def test_compare_flags_regressions(self):
+        before = {"10k": {"report": {"p50_ms": 10.0, "queries": 3, "peak_kib": 100.0}}}
+        same = {"10k": {"report": {"p50_ms": 11.0, "queries": 3, "peak_kib": 110.0}}}
+        worse = {"10k": {"report": {"p50_ms": 15.0, "queries": 4, "peak_kib": 200.0}}}
+        self.assertEqual(compare(before, same), [])
+        self.assertEqual(len(compare(before, worse)), 3)
+        self.assertEqual(compare(before, {"1m": worse["10k"]}), [])
+
+
+# ==========================
+# Resolver profiling and metrics
+# ==========================
+@override_settings(CRM_QUERY_COST_ANALYSIS=False, CRM_RESPONSE_CACHE=False)
+class ProfilingTests(TestCase):
+    QUERY = """
+        query Orders {
+          allOrders(first: 10) {
+            edges { node { customer { name } products(name: "o") { edges { node { name } } } } }
+          }
+        }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        alice = Customer.objects.create(name="Alice", email="alice@example.com")
+        mouse = Product.objects.create(name="Mouse", price=25, stock=5)
+        for _ in range(3):
+            Order.objects.create(customer=alice, total_amount=25).products.add(mouse)
+
+    def setUp(self):
+        metrics.reset()
+        self.client.force_login(User.objects.create_user("ops", is_staff=True))
+
+    def post(self):
+        return self.client.post(
+            "/graphql", json.dumps({"query": self.QUERY}), content_type="application/json"
+        ).json()
+
+    def test_disabled_by_default(self):
+        self.assertNotIn("extensions", self.post())
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
+
+    def unbatched(self):
+        # A fresh set of loaders per resolver call: the N+1 the profiler is for.
+        return mock.patch("crm.schema.get_loaders", side_effect=lambda info: Loaders())
+
+    @override_settings(CRM_PROFILING=True)
+    def test_traces_resolvers_and_flags_repeated_queries(self):
+        tracing = self.post()["extensions"]["tracing"]
+        self.assertEqual(tracing["sql"]["duplicates"], [])
+        self.assertEqual(tracing["sql"]["count"], 2)
+
+        with self.unbatched():
+            tracing = self.post()["extensions"]["tracing"]
+        resolvers = {".".join(map(str, r["path"])): r for r in tracing["execution"]["resolvers"]}
+        self.assertEqual(resolvers["allOrders"]["sqlCount"], 1)
+        self.assertGreater(resolvers["allOrders"]["duration"], 0)
+        duplicates = tracing["sql"]["duplicates"]
+        self.assertEqual([d["count"] for d in duplicates], [3])
+        self.assertEqual({f for d in duplicates for f in d["fields"]}, {"allOrders.edges.node.products"})
+        self.assertEqual(tracing["sql"]["count"], 4)
+
+    @override_settings(CRM_PROFILING=True, CRM_PROFILING_TRACE_RESPONSES=False)
+    def test_metrics_endpoint_aggregates_operations(self):
+        with self.unbatched():
+            self.assertNotIn("extensions", self.post())
+            self.post()
+        body = self.client.get("/metrics").content.decode()
+        self.assertIn('crm_graphql_operations_total{operation="Orders"} 2', body)
+        self.assertIn('crm_graphql_duplicate_sql_statements_total{operation="Orders"} 4', body)
+        self.assertIn('crm_graphql_resolver_calls_total{field="Query.allOrders"} 2', body)
+
+    @override_settings(CRM_PROFILING=True, CRM_METRICS_TOKEN="s3cret")
+    def test_metrics_endpoint_needs_staff_or_the_token(self):
+        self.client.logout()
+        self.assertEqual(self.client.get("/metrics").status_code, 302)
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer wrong").status_code, 302)
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret").status_code, 200)
+
+    @override_settings(CRM_PROFILING=True, CRM_PROFILING_TRACE_RESPONSES=False)
+    def test_metric_labels_come_from_the_executed_operation(self):
+        forged = 'x"} 1\ncrm_graphql_operations_total{operation="forged'
+        for body in ({"query": self.QUERY, "operationName": forged}, {"query": "{ hello }"}):
+            self.client.post("/graphql", json.dumps(body), content_type="application/json")
+        body = self.client.get("/metrics").content.decode()
+        self.assertNotIn("forged", body)
+        self.assertIn('crm_graphql_operations_total{operation="unknown"} 1', body)
+        self.assertIn('crm_graphql_operations_total{operation="anonymous"} 1', body)
+        self.assertEqual(label('a"b\\c\nd'), 'a\\"b\\\\c\\nd')
+
+    def test_fingerprint_ignores_values_and_in_list_length(self):
+        self.assertEqual(
+            fingerprint('SELECT * FROM "t" WHERE "id" IN (%s, %s, %s) AND "n" = 5'),
+            fingerprint('SELECT * FROM "t" WHERE "id" IN (%s) AND "n" = 7'),
+        )
+
+
+# ==========================
+# Parsed document cache
+# ==========================
+class DocumentCacheTests(TestCase):
+    def setUp(self):
+        get_document_cache().clear()
+
+    def post(self, query):
+        return self.client.post("/graphql", json.dumps({"query": query}), content_type="application/json")
+
+    def test_repeated_operations_skip_parse_and_validate(self):
+        for _ in range(3):
+            self.assertEqual(self.post("query { hello }").json()["data"], {"hello": "Hello, GraphQL!"})
+        stats = get_document_cache().stats()
+        self.assertEqual((stats["misses"], stats["hits"], stats["size"]), (1, 2, 1))
+
+    def test_invalid_documents_are_not_stored(self):
+        self.assertIn("errors", self.post("query { nope }").json())
+        self.assertIn("Syntax Error", self.post("query {").json()["errors"][0]["message"])
+        self.assertEqual(get_document_cache().stats()["size"], 0)
+
+    def test_get_still_refuses_mutations(self):
+        response = self.client.get("/graphql", {"query": "mutation { dummy }"}, HTTP_ACCEPT="application/json")
+        self.assertEqual(response.status_code, 405)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = DocumentCache(maxsize=2)
+        graphql_schema = schema.graphql_schema
+        for query in ("{ hello }", "{ crmStats { orderCount } }", "{ hello }", "{ __typename }"):
+            cache.lookup(graphql_schema, query)
+        self.assertEqual(cache.stats()["evictions"], 1)
+        cache.lookup(graphql_schema, "{ hello }")
+        self.assertEqual(cache.stats()["hits"], 2)
+        cache.lookup(graphql_schema, "{ crmStats { orderCount } }")
+        self.assertEqual(cache.stats()["misses"], 4)
+
+
+# ==========================
+# Automatic persisted queries
+# ==========================
+class PersistedQueryTests(TestCase):
+    QUERY = "query Hello { hello }"
+
+    def setUp(self):
+        cache.clear()
+        get_document_cache().clear()
+        get_persisted_queries().clear()
+
+    def post(self, query=None, sha256=None):
+        body = {}
+        if query:
+            body["query"] = query
+        if sha256:
+            body["extensions"] = {"persistedQuery": {"version": 1, "sha256Hash": sha256}}
+        return self.client.post("/graphql", json.dumps(body), content_type="application/json").json()
+
+    def error_code(self, response):
+        return response["errors"][0]["extensions"]["code"]
+
+    def register(self, *texts):
+        directory = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        for i, text in enumerate(texts):
+            (directory / f"q{i}.graphql").write_text(text)
+        call_command("register_persisted_queries", str(directory), stdout=StringIO())
+
+    def test_unknown_hash_then_register_then_hash_only(self):
+        sha256 = query_hash(self.QUERY)
+        self.assertEqual(self.error_code(self.post(sha256=sha256)), "PERSISTED_QUERY_NOT_FOUND")
+        self.assertEqual(self.post(self.QUERY, sha256)["data"], {"hello": "Hello, GraphQL!"})
+        self.assertEqual(self.post(sha256=sha256)["data"], {"hello": "Hello, GraphQL!"})
+
+    def test_get_with_hash_only(self):
+        self.post(self.QUERY, query_hash(self.QUERY))
+        extensions = json.dumps({"persistedQuery": {"version": 1, "sha256Hash": query_hash(self.QUERY)}})
+        response = self.client.get("/graphql", {"extensions": extensions}, HTTP_ACCEPT="application/json")
+        self.assertEqual(response.json()["data"], {"hello": "Hello, GraphQL!"})
+
+    def test_rejects_a_hash_that_does_not_match_the_text(self):
+        response = self.post(self.QUERY, query_hash("query { crmStats { orderCount } }"))
+        self.assertEqual(self.error_code(response), "PERSISTED_QUERY_HASH_MISMATCH")
+
+    @override_settings(
+        CRM_PERSISTED_QUERY_ALLOWLIST=True, CRM_PERSISTED_QUERY_STORE="crm.persisted_queries.DatabaseStore"
+    )
+    def test_allowlist_only_runs_registered_documents(self):
+        self.register(self.QUERY)
+        other = "query { crmStats { orderCount } }"
+        self.assertEqual(self.post(self.QUERY)["data"], {"hello": "Hello, GraphQL!"})
+        self.assertEqual(self.post(sha256=query_hash(self.QUERY))["data"], {"hello": "Hello, GraphQL!"})
+        # Registered documents were parsed and validated before the first request ran.
+        self.assertEqual(get_document_cache().stats()["misses"], 1)
+        self.assertEqual(self.error_code(self.post(other)), "PERSISTED_QUERY_NOT_ALLOWED")
+        self.assertEqual(self.error_code(self.post(other, query_hash(other))), "PERSISTED_QUERY_NOT_ALLOWED")
+
+    def test_register_command_rejects_invalid_documents(self):
+        with self.assertRaises(CommandError):
+            self.register(self.QUERY, "query { nope }")
+        self.assertEqual(PersistedQuery.objects.count(), 0)
+
+    def test_register_command_refuses_a_store_that_dies_with_it(self):
+        with self.assertRaisesMessage(CommandError, "does not outlive this process"):
+            self.register(self.QUERY)
+
+    @override_settings(CRM_PERSISTED_QUERY_ALLOWLIST=True)
+    def test_allowlist_requires_the_database_store(self):
+        with self.assertRaises(ImproperlyConfigured):
+            get_persisted_queries()
+
+    @override_settings(CRM_PERSISTED_QUERY_STORE="crm.persisted_queries.DatabaseStore", CRM_PERSISTED_QUERY_MAX_STORED=1)
+    def test_database_store_stops_storing_when_full(self):
+        other = "query { crmStats { orderCount } }"
+        self.post(self.QUERY, query_hash(self.QUERY))
+        self.assertEqual(self.post(other, query_hash(other))["data"], {"crmStats": {"orderCount": 0}})
+        self.assertEqual(list(PersistedQuery.objects.values_list("query", flat=True)), [self.QUERY])
+        with self.assertRaisesMessage(CommandError, "store is full"):
+            self.register(other)
+
+
+# ==========================
+# Query cost analysis
+# ==========================
+@override_settings(CRM_QUERY_COST_STATS_TTL=0)
+class QueryCostTests(TestCase):
+    NESTED = """
+        query Nested($n: Int) {
+          allOrders(first: $n) {
+            edges { node { customer { orders { edges { node { products { edges { node { name } } } } } } } } }
+          }
+        }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        products = Product.objects.bulk_create(Product(name=f"P{i}", price=1, stock=1) for i in range(2))
+        for c in range(2):
+            customer = Customer.objects.create(name=f"C{c}", email=f"c{c}@example.com")
+            for _ in range(5):
+                Order.objects.create(customer=customer, total_amount=2).products.set(products)
+
+    def setUp(self):
+        cache.clear()
+
+    def post(self, query, variables=None):
+        return self.client.post(
+            "/graphql", json.dumps({"query": query, "variables": variables or {}}), content_type="application/json"
+        ).json()
+
+    def cost(self, query, variables=None):
+        return CostAnalysis(schema.graphql_schema, parse(query), variables=variables).cost
+
+    def test_cost_scales_with_first_and_relation_fanout(self):
+        # n orders, n customers, 5 orders per customer, 2 products per order.
+        self.assertEqual(self.cost(self.NESTED, {"n": 1}), 1 + 1 + 5 + 10)
+        self.assertEqual(self.cost(self.NESTED, {"n": 4}), 4 * 17)
+        # Without ``first`` the page is capped by the table size (10 orders).
+        self.assertEqual(self.cost(self.NESTED), 10 * 17)
+
+    def test_fragments_cost_the_same_as_inline_selections(self):
+        fragment = """
+            query { allOrders(first: 2) { edges { node { ...Lines } } } }
+            fragment Lines on OrderType { products { edges { node { name } } } }
+        """
+        inline = "query { allOrders(first: 2) { edges { node { products { edges { node { name } } } } } } }"
+        self.assertEqual(self.cost(fragment), self.cost(inline))
+
+    def test_reports_cost_in_extensions(self):
+        response = self.post(self.NESTED, {"n": 2})
+        self.assertEqual(len(response["data"]["allOrders"]["edges"]), 2)
+        self.assertEqual(response["extensions"]["cost"]["requested"], 34)
+        self.assertEqual(response["extensions"]["cost"]["depth"], 11)
+
+    @override_settings(CRM_QUERY_MAX_COST=50)
+    def test_rejects_operations_over_budget_before_executing(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post(self.NESTED, {"n": 3})
+        # Only the row-count estimates ran; no resolver touched the database.
+        self.assertTrue(all("COUNT(*)" in q["sql"] for q in queries.captured_queries))
+        self.assertNotIn("data", response)
+        self.assertEqual(response["errors"][0]["extensions"]["code"], "QUERY_TOO_COSTLY")
+        self.assertEqual(response["extensions"]["cost"]["requested"], 51)
+        self.assertIn("data", self.post(self.NESTED, {"n": 2}))
+
+    @override_settings(CRM_QUERY_MAX_DEPTH=5)
+    def test_rejects_deep_operations(self):
+        response = self.post(self.NESTED, {"n": 1})
+        self.assertEqual(response["errors"][0]["extensions"]["code"], "QUERY_TOO_DEEP")
+
+    @override_settings(CRM_QUERY_COST_RATE=60)
+    def test_throttles_clients_over_their_rate(self):
+        first = self.post(self.NESTED, {"n": 2})
+        self.assertEqual(first["extensions"]["cost"]["throttle"]["remaining"], 26)
+        self.assertIn("data", self.post(self.NESTED, {"n": 1}))
+        limited = self.post(self.NESTED, {"n": 1})
+        self.assertEqual(limited["errors"][0]["extensions"]["code"], "COST_RATE_LIMITED")
+
+    def test_rate_window_expiring_mid_request_starts_a_new_one(self):
+        incr = cache.incr
+
+        def expire_first(key, delta):
+            if not expired:
+                expired.append(key)
+                cache.delete(key)
+                raise ValueError(f"Key '{key}' not found")
+            return incr(key, delta)
+
+        expired = []
+        with mock.patch.object(cache, "incr", side_effect=expire_first):
+            self.assertEqual(spend("crm:cost:test", 5), 5)
+            self.assertEqual(spend("crm:cost:test", 3), 8)
+        self.assertEqual(expired, ["crm:cost:test"])
+
+
+# ==========================
+# Response cache
+# ==========================
+@override_settings(CRM_QUERY_COST_ANALYSIS=False)
+class ResponseCacheTests(TestCase):
+    PRODUCTS = "query Products($min: Decimal) { allProducts(price_Gte: $min) { edges { node { name stock } } } }"
+    RESTOCK = "mutation { updateLowStockProducts(threshold: 20, amount: 5) { success } }"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.mouse = Product.objects.create(name="Mouse", price=25, stock=5)
+        Product.objects.create(name="Laptop", price=999, stock=50)
+
+    def setUp(self):
+        cache.clear()
+
+    def post(self, query, variables=None):
+        return self.client.post(
+            "/graphql", json.dumps({"query": query, "variables": variables or {}}), content_type="application/json"
+        ).json()
+
+    def names(self, response):
+        return [(e["node"]["name"], e["node"]["stock"]) for e in response["data"]["allProducts"]["edges"]]
+
+    def test_repeated_query_is_served_without_sql(self):
+        first = self.post(self.PRODUCTS, {"min": 10})
+        with CaptureQueriesContext(connection) as queries:
+            second = self.post(self.PRODUCTS, {"min": 10})
+        self.assertEqual(second["data"], first["data"])
+        self.assertEqual(len(queries), 0)
+
+    def test_key_ignores_formatting_but_not_variables(self):
+        self.post(self.PRODUCTS, {"min": 10})
+        reformatted = self.PRODUCTS.replace(" { ", "\n  {\n    ")
+        with CaptureQueriesContext(connection) as queries:
+            self.post(reformatted, {"min": 10})
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(self.names(self.post(self.PRODUCTS, {"min": 100})), [("Laptop", 50)])
+
+    def test_saving_a_model_invalidates_responses_that_read_it(self):
+        self.post(self.PRODUCTS, {"min": 10})
+        self.mouse.stock = 7
+        self.mouse.save()
+        self.assertIn(("Mouse", 7), self.names(self.post(self.PRODUCTS, {"min": 10})))
+
+    def test_bulk_restock_invalidates_responses(self):
+        self.post(self.PRODUCTS, {"min": 10})
+        self.assertTrue(self.post(self.RESTOCK)["data"]["updateLowStockProducts"]["success"])
+        self.assertIn(("Mouse", 10), self.names(self.post(self.PRODUCTS, {"min": 10})))
+
+    def test_mutations_are_not_cached(self):
+        self.post(self.RESTOCK)
+        self.post(self.RESTOCK)
+        self.mouse.refresh_from_db()
+        self.assertEqual(self.mouse.stock, 15)
+
+    def test_writes_to_unrelated_models_keep_the_entry(self):
+        self.post(self.PRODUCTS, {"min": 10})
+        Customer.objects.create(name="Alice", email="alice@example.com")
+        with CaptureQueriesContext(connection) as queries:
+            self.post(self.PRODUCTS, {"min": 10})
+        self.assertEqual(len(queries), 0)
+
+
+
+# ==========================
+# Streaming exports
+# ==========================
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = Customer.objects.create(name="Alice", email="alice@example.com", phone="+1555")
+        bob = Customer.objects.create(name="Bob", email="bob@example.com")
+        cls.mouse = Product.objects.create(name="Mouse", price=25, stock=5)
+        cls.laptop = Product.objects.create(name="Laptop", price=999, stock=2)
+        cls.orders = []
+        for customer, total, products in [
+            (cls.alice, 25, [cls.mouse]),
+            (bob, 1024, [cls.mouse, cls.laptop]),
+            (cls.alice, 999, [cls.laptop]),
+            (bob, 10, []),
+            (cls.alice, 50, [cls.mouse]),
+        ]:
+            order = Order.objects.create(customer=customer, total_amount=total)
+            order.products.set(products)
+            cls.orders.append(order)
+        cls.staff = User.objects.create_user("reporter", password="secret", is_staff=True)
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def get(self, path, **params):
+        response = self.client.get(path, params)
+        self.assertTrue(response.streaming)
+        return response, b"".join(response.streaming_content).decode()
+
+    def test_ndjson_orders_honor_the_order_filterset(self):
+        response, body = self.get("/export/orders", total_amount__gte="50", product_name="lap")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row["id"] for row in rows], [self.orders[1].pk, self.orders[2].pk])
+        self.assertEqual(rows[0]["customer_name"], "Bob")
+        self.assertEqual(rows[0]["total_amount"], "1024.00")
+        self.assertEqual(rows[0]["product_ids"], [self.mouse.pk, self.laptop.pk])
+
+    def test_csv_customers(self):
+        response, body = self.get("/export/customers", format="csv", name="ali")
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="customers.csv"')
+        lines = body.splitlines()
+        self.assertEqual(lines[0], "id,name,email,phone,created_at")
+        self.assertEqual(lines[1].split(",")[:4], [str(self.alice.pk), "Alice", "alice@example.com", "+1555"])
+        self.assertEqual(len(lines), 2)
+
+    def test_rejects_invalid_filters_formats_and_models(self):
+        for path, params in [
+            ("/export/orders", {"total_amount__gte": "lots"}),
+            ("/export/orders", {"format": "xml"}),
+            ("/export/orders", {"productName": "lap"}),
+            ("/export/invoices", {}),
+        ]:
+            response = self.client.get(path, params)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("errors", response.json())
+
+    def test_requires_a_staff_login(self):
+        self.client.logout()
+        response = self.client.get("/export/customers")
+        self.assertEqual(response.status_code, 302)
+        self.assertIn("/admin/login/", response["Location"])
+        self.client.force_login(User.objects.create_user("visitor", password="secret"))
+        self.assertEqual(self.client.get("/export/customers").status_code, 302)
+
+    def test_rows_are_read_a_chunk_at_a_time(self):
+        lines, _ = export_lines("orders", "ndjson", {}, chunk_size=2)
+        with CaptureQueriesContext(connection) as queries:
+            rows = [json.loads(line) for line in lines]
+        self.assertEqual([row["id"] for row in rows], [order.pk for order in self.orders])
+        self.assertEqual(rows[3]["product_ids"], [])
+        # One SELECT for the orders plus one order-line lookup per chunk of two.
+        self.assertEqual(len(queries), 1 + 3)
+
+    def test_command_writes_csv_to_a_file(self):
+        path = Path(self.enterContext(tempfile.TemporaryDirectory())) / "products.csv"
+        stderr = StringIO()
+        call_command("export_data", "products", "--format", "csv", "--filter", "price__lte=100",
+                     "--output", str(path), stderr=stderr)
+        self.assertEqual(path.read_text().splitlines(), ["id,name,price,stock", f"{self.mouse.pk},Mouse,25.00,5"])
+        self.assertIn("Exported 1 products.", stderr.getvalue())
+
+    def test_command_streams_ndjson_to_stdout(self):
+        stdout = StringIO()
+        call_command("export_data", "orders", "--filter", "customer_name=bob", stdout=stdout, stderr=StringIO())
+        self.assertEqual(len(stdout.getvalue().splitlines()), 2)
+        with self.assertRaises(CommandError):
+            call_command("export_data", "orders", "--filter", "customer_name", stderr=StringIO())
+        with self.assertRaises(CommandError):
+            call_command("export_data", "orders", "--filter", "customerName=bob", stderr=StringIO())
+
+# ==========================
+# Async GraphQL view
+# ==========================
+# Transactional: root fields resolve in worker threads with connections of
+# their own, which cannot see a TestCase's uncommitted rows.
+@override_settings(CRM_RESPONSE_CACHE=False)
+class AsyncGraphQLViewTests(TransactionTestCase):
+    REPORT = """
+        query Report {
+          crmStats { customerCount orderCount }
+          allCustomers(orderBy: "name") { edges { node { name orders { edges { node { totalAmount } } } } } }
+          allOrders(orderBy: "id") { edges { node { customer { name } products { edges { node { name } } } } } }
+        }
+    """
+
+    def setUp(self):
+        alice = Customer.objects.create(name="Alice", email="alice@example.com")
+        bob = Customer.objects.create(name="Bob", email="bob@example.com")
+        mouse = Product.objects.create(name="Mouse", price=25, stock=5)
+        for customer in (alice, bob, alice):
+            Order.objects.create(customer=customer, total_amount=25).products.add(mouse)
+
+    async def post(self, view_class, query):
+        view = view_class.as_view(schema=schema)
+        request = AsyncRequestFactory().post(
+            "/graphql", json.dumps({"query": query}), content_type="application/json"
+        )
+        response = await view(request) if view_class.view_is_async else view(request)
+        return json.loads(response.content)
+
+    async def test_root_fields_resolve_concurrently_with_the_same_result(self):
+        with mock.patch.object(execution, "in_worker", wraps=execution.in_worker) as in_worker:
+            concurrent = await self.post(AsyncCRMGraphQLView, self.REPORT)
+        self.assertEqual(in_worker.call_count, 3)
+        serial = await sync_to_async(lambda: self.client.post(
+            "/graphql", json.dumps({"query": self.REPORT}), content_type="application/json"
+        ).json())()
+        self.assertEqual(concurrent["data"], serial["data"])
+        self.assertEqual(concurrent["data"]["crmStats"], {"customerCount": 2, "orderCount": 3})
+
+    async def test_single_root_fields_and_mutations_run_serially(self):
+        with mock.patch.object(execution, "in_worker", wraps=execution.in_worker) as in_worker:
+            await self.post(AsyncCRMGraphQLView, "query { allProducts { edges { node { name } } } }")
+            response = await self.post(
+                AsyncCRMGraphQLView, "mutation { updateLowStockProducts(threshold: 10, amount: 5) { success } }"
+            )
+        self.assertTrue(response["data"]["updateLowStockProducts"]["success"])
+        self.assertEqual(in_worker.call_count, 0)
+
+    def test_view_flavours(self):
+        self.assertTrue(AsyncCRMGraphQLView.view_is_async)
+        self.assertFalse(CRMGraphQLView.view_is_async)
+
+    def test_throughput_benchmark_covers_both_servers(self):
+        results = run_throughput(clients=3, requests=2)
+        self.assertNotIn("restock_mutation", results)
+        for servers in results.values():
+            self.assertEqual(set(servers), {"wsgi", "asgi_sync_view", "asgi"})
+            self.assertTrue(all(m["requests"] == 6 for m in servers.values()))
+
+
+
+# ==========================
+# Order placement and stock reservation
+# ==========================
+class OrderPlacementTests(TestCase):
+    PLACE = """
+        mutation Place($customer: ID!, $lines: [OrderLineInput!]!) {
+          placeOrder(customerId: $customer, lines: $lines) {
+            success message
+            order { totalAmount lines { product { name } quantity unitPrice } }
+          }
+        }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = Customer.objects.create(name="Alice", email="alice@example.com")
+        cls.mouse = Product.objects.create(name="Mouse", price="25.50", stock=5)
+        cls.laptop = Product.objects.create(name="Laptop", price="999.99", stock=1)
+
+    def stock(self):
+        return dict(Product.objects.values_list("name", "stock"))
+
+    def test_place_reserves_stock_and_totals_the_lines(self):
+        order = Order.objects.place(self.alice, [(self.mouse.pk, 2), (self.laptop.pk, 1), (self.mouse.pk, 1)])
+        self.assertEqual(order.total_amount, Decimal("1076.49"))
+        self.assertEqual(
+            list(order.lines.order_by("product_id").values_list("product_id", "quantity", "unit_price")),
+            [(self.mouse.pk, 3, Decimal("25.50")), (self.laptop.pk, 1, Decimal("999.99"))],
+        )
+        self.assertEqual(self.stock(), {"Mouse": 2, "Laptop": 0})
+        self.assertEqual(
+            DailyProductStats.objects.get(product=self.mouse).units, 3
+        )
+
+    def test_a_short_line_rolls_back_the_whole_order(self):
+        with self.assertRaises(InsufficientStock) as raised:
+            Order.objects.place(self.alice, [(self.mouse.pk, 1), (self.laptop.pk, 2)])
+        self.assertEqual(raised.exception.product_id, self.laptop.pk)
+        self.assertEqual(self.stock(), {"Mouse": 5, "Laptop": 1})
+        self.assertFalse(Order.objects.exists())
+        for items in ([], [(self.mouse.pk, 0)], [(10_000, 1)]):
+            with self.assertRaises(OrderError):
+                Order.objects.place(self.alice, items)
+
+    def test_line_quantities_roll_up_like_a_rebuild(self):
+        day = datetime.datetime(2025, 3, 1, 9, tzinfo=datetime.timezone.utc)
+        placed = Order.objects.place(self.alice, [(self.mouse.pk, 2)], order_date=day)
+        linked = Order.objects.create(customer=self.alice, order_date=day, total_amount=10)
+        linked.products.add(self.mouse, through_defaults={"quantity": 3})
+        linked.products.add(self.laptop)
+        placed.order_date = day + datetime.timedelta(days=1)
+        placed.save()
+        incremental = rollup_snapshot()
+        rollups.rebuild()
+        self.assertEqual(incremental, rollup_snapshot())
+        self.assertEqual(DailyProductStats.objects.get(date=day.date(), product=self.mouse).units, 3)
+        linked.delete()
+        self.assertFalse(DailyProductStats.objects.filter(date=day.date()).exists())
+
+    def test_place_order_mutation(self):
+        response = self.client.post("/graphql", json.dumps({"query": self.PLACE, "variables": {
+            "customer": str(self.alice.pk),
+            "lines": [{"productId": to_global_id("ProductType", self.mouse.pk), "quantity": 2}],
+        }}), content_type="application/json").json()
+        result = response["data"]["placeOrder"]
+        self.assertTrue(result["success"])
+        self.assertEqual(result["order"]["totalAmount"], "51.00")
+        self.assertEqual(result["order"]["lines"], [{"product": {"name": "Mouse"}, "quantity": 2, "unitPrice": "25.50"}])
+
+        response = self.client.post("/graphql", json.dumps({"query": self.PLACE, "variables": {
+            "customer": str(self.alice.pk), "lines": [{"productId": str(self.laptop.pk), "quantity": 5}],
+        }}), content_type="application/json").json()
+        self.assertEqual(response["data"]["placeOrder"]["success"], False)
+        self.assertIn("Insufficient stock", response["data"]["placeOrder"]["message"])
+
+    def test_null_quantity_is_rejected(self):
+        line = {"productId": str(self.mouse.pk), "quantity": None}
+        result = execute(self.PLACE, {"customer": str(self.alice.pk), "lines": [line]})
+        self.assertIn("Expected non-nullable type 'Int!' not to be None", result.errors[0].message)
+        del line["quantity"]  # omitted: the default of 1
+        result = execute(self.PLACE, {"customer": str(self.alice.pk), "lines": [line]})
+        self.assertIsNone(result.errors)
+        self.assertEqual(result.data["placeOrder"]["order"]["lines"][0]["quantity"], 1)
+        with self.assertRaises(OrderError):
+            Order.objects.place(self.alice, [(self.mouse.pk, None)])
+        self.assertEqual(self.stock()["Mouse"], 4)
+
+
+class StockReservationConcurrencyTests(TransactionTestCase):
+    """Many threads checking out the same hot products at once never oversell."""
+
+    CLIENTS = 16
+    CHECKOUTS = 5
+
+    def test_concurrent_checkouts_never_oversell(self):
+        customer = Customer.objects.create(name="Alice", email="alice@example.com")
+        hot = Product.objects.create(name="Hot", price=10, stock=60)
+        warm = Product.objects.create(name="Warm", price=5, stock=90)
+        placed, rejected, start = [], [], threading.Barrier(self.CLIENTS)
+
+        def checkout(client):
+            start.wait()
+            try:
+                for n in range(self.CHECKOUTS):
+                    # Alternate the line order: reservations still lock in pk order.
+                    items = [(hot.pk, 1 + n % 2), (warm.pk, 1)][:: 1 if client % 2 else -1]
+                    while True:
+                        try:
+                            placed.append(Order.objects.place(customer, items).pk)
+                            break
+                        except InsufficientStock:
+                            rejected.append(client)
+                            break
+                        except OperationalError:
+                            # SQLite allows one writer at a time and the shared
+                            # in-memory test database fails instead of waiting.
+                            time.sleep(0.005)
+            finally:
+                close_old_connections()
+
+        threads = [threading.Thread(target=checkout, args=(i,)) for i in range(self.CLIENTS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        hot.refresh_from_db()
+        warm.refresh_from_db()
+        sold = dict(
+            OrderLine.objects.values("product").annotate(n=Sum("quantity")).values_list("product", "n")
+        )
+        self.assertEqual(len(placed) + len(rejected), self.CLIENTS * self.CHECKOUTS)
+        self.assertEqual(hot.stock + sold[hot.pk], 60)
+        self.assertEqual(warm.stock + sold[warm.pk], 90)
+        # Demand (112 units) far exceeds supply; at most a unit is left for want of a 1-unit line.
+        self.assertLessEqual(hot.stock, 1)
+        self.assertEqual(Order.objects.count(), len(placed))
+        self.assertEqual(sold[warm.pk], len(placed))
+
+
+# ==========================
+# Bulk order ingestion
+# ==========================
+class OrderImportTests(TestCase):
+    BULK = """
+        mutation Bulk($orders: [BulkOrderInput!]!) {
+          bulkCreateOrders(orders: $orders) { success created orderIds errors { index message } }
+        }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = Customer.objects.create(name="Alice", email="alice@example.com")
+        cls.bob = Customer.objects.create(name="Bob", email="bob@example.com")
+        cls.mouse = Product.objects.create(name="Mouse", price="25.50", stock=5)
+        cls.laptop = Product.objects.create(name="Laptop", price="999.99", stock=1)
+
+    def rows(self, count):
+        return [
+            {"customer_email": "bob@example.com", "order_date": f"2025-03-{1 + n % 3:02d}T12:00:00Z",
+             "lines": [{"product_id": self.mouse.pk, "quantity": 1 + n % 2}]}
+            for n in range(count)
+        ]
+
+    def test_valid_rows_are_created_and_bad_rows_reported(self):
+        Order.objects.place(
+            self.alice, [(self.mouse.pk, 1)], order_date=datetime.datetime(2025, 3, 1, 9, tzinfo=datetime.timezone.utc)
+        )
+        result = import_orders([
+            {"customer_email": "alice@example.com", "order_date": "2025-03-01T10:00:00Z",
+             "lines": [{"product_id": self.mouse.pk, "quantity": 2}, {"product_id": str(self.laptop.pk), "unit_price": "900"}]},
+            {"customer_email": "nobody@example.com", "lines": [{"product_id": self.mouse.pk}]},
+            {"customer_email": "bob@example.com", "order_date": "2025-03-01T11:00:00Z",
+             "lines": [{"product_id": self.mouse.pk}, {"product_id": self.mouse.pk, "quantity": 3}]},
+            {"customer_email": "bob@example.com", "lines": [{"product_id": 10_000}]},
+            {"customer_email": "bob@example.com", "lines": [{"product_id": self.mouse.pk, "quantity": 0}]},
+            {"customer_email": "bob@example.com", "order_date": "yesterday", "lines": [{"product_id": self.mouse.pk}]},
+            "not an order",
+        ], batch_size=2)
+
+        self.assertEqual(result.created, 2)
+        self.assertEqual([index for index, _ in result.errors], [1, 3, 4, 5, 6])
+        self.assertIn("nobody@example.com", result.errors[0][1])
+        self.assertIn("10000", result.errors[1][1])
+        first, second = Order.objects.filter(pk__in=result.order_ids).order_by("pk")
+        self.assertEqual(first.total_amount, Decimal("951.00"))
+        self.assertEqual(
+            list(first.lines.order_by("product_id").values_list("product_id", "quantity", "unit_price")),
+            [(self.mouse.pk, 2, Decimal("25.50")), (self.laptop.pk, 1, Decimal("900.00"))],
+        )
+        self.assertEqual(second.lines.get().quantity, 4)
+        # Imports record sales made elsewhere; only placed orders reserve stock.
+        self.assertEqual(Product.objects.get(pk=self.mouse.pk).stock, 4)
+
+        incremental = rollup_snapshot()
+        rollups.rebuild()
+        self.assertEqual(incremental, rollup_snapshot())
+        self.assertEqual(DailyOrderStats.objects.get(date=datetime.date(2025, 3, 1)).customer_count, 2)
+
+    def test_queries_do_not_grow_with_the_batch(self):
+        with CaptureQueriesContext(connection) as small:
+            import_orders(self.rows(3))
+        with CaptureQueriesContext(connection) as large:
+            self.assertEqual(import_orders(self.rows(300)).created, 300)
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(OrderLine.objects.filter(order__customer=self.bob).aggregate(n=Sum("quantity"))["n"], 454)
+
+    def test_bulk_create_orders_mutation(self):
+        response = self.client.post("/graphql", json.dumps({"query": self.BULK, "variables": {"orders": [
+            {"customerEmail": "alice@example.com", "orderDate": "2025-03-01T10:00:00+00:00",
+             "lines": [{"productId": to_global_id("ProductType", self.laptop.pk), "unitPrice": "899.50"}]},
+            {"customerEmail": "alice@example.com", "lines": [{"productId": to_global_id("CustomerType", 1)}]},
+        ]}}), content_type="application/json").json()
+        result = response["data"]["bulkCreateOrders"]
+        self.assertEqual((result["success"], result["created"]), (False, 1))
+        self.assertEqual(result["errors"][0]["index"], 1)
+        order = Order.objects.get(pk=result["orderIds"][0])
+        self.assertEqual((order.customer, order.total_amount), (self.alice, Decimal("899.50")))
+
+    def test_import_orders_command(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "orders.ndjson"
+            path.write_text("\n".join([*map(json.dumps, self.rows(4)), "{broken", ""]))
+            out, err = StringIO(), StringIO()
+            call_command("import_orders", str(path), batch_size=3, stdout=out, stderr=err)
+        self.assertIn("Imported 4 orders, rejected 1", out.getvalue())
+        self.assertIn("Row 5: Invalid JSON", err.getvalue())
+        self.assertEqual(Order.objects.filter(customer=self.bob).count(), 4)
+
+
+# ==========================
+# Customer upserts
+# ==========================
+class CustomerImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = Customer.objects.create(
+            name="Alice", email="alice@example.com", created_at=timezone.now() - datetime.timedelta(days=30)
+        )
+
+    def test_csv_upsert_by_email(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "customers.csv"
+            path.write_text(
+                "name,email,phone\n"
+                "Alice Smith, ALICE@example.com ,(555) 010-9999\n"
+                "Bob,bob@example.com,\n"
+                "Carol,carol@example,+1 555 0100\n"
+                ",dave@example.com,\n"
+                "Bobby,bob@example.com,+44 20 7946 0000\n"
+                "Erin,erin@example.com,call me\n"
+            )
+            out, err = StringIO(), StringIO()
+            call_command("import_customers", str(path), batch_size=2, stdout=out, stderr=err)
+
+        self.assertIn("Upserted 3 customers (1 created, 2 updated), rejected 3", out.getvalue())
+        self.assertIn("Row 3: 'carol@example' is not a valid email address.", err.getvalue())
+        self.assertEqual(
+            list(Customer.objects.order_by("email").values_list("name", "email", "phone")),
+            [
+                ("Alice Smith", "alice@example.com", "5550109999"),
+                ("Bobby", "bob@example.com", "+442079460000"),
+            ],
+        )
+        self.alice.refresh_from_db()
+        self.assertLess(self.alice.created_at, timezone.now() - datetime.timedelta(days=29))
+
+    def test_stored_emails_match_in_any_case(self):
+        carol = Customer.objects.create(name="Carol", email="Carol@Example.com")
+        result = upsert_customers([{"name": "Carol Jones", "email": "CAROL@example.com", "phone": "555 0100"}])
+        self.assertEqual((result.created, result.updated), (0, 1))
+        carol.refresh_from_db()
+        self.assertEqual((carol.name, carol.email, carol.phone), ("Carol Jones", "Carol@Example.com", "5550100"))
+
+        mouse = Product.objects.create(name="Mouse", price=25, stock=1)
+        result = import_orders([
+            {"customer_email": " carol@EXAMPLE.com", "lines": [{"product_id": mouse.pk}]},
+            {"customer_email": "Alice@example.com", "lines": [{"product_id": mouse.pk}]},
+        ])
+        self.assertEqual(result.errors, [])
+        self.assertEqual(
+            list(Order.objects.filter(pk__in=result.order_ids).order_by("pk").values_list("customer", flat=True)),
+            [carol.pk, self.alice.pk],
+        )
+
+    def test_ndjson_rows_are_read_lazily_in_batches(self):
+        written = []
+
+        def rows():
+            for n in range(6):
+                if n == 3:
+                    # The first batch is written before the fourth row is read.
+                    written.append(Customer.objects.count())
+                yield {"name": f"C{n}", "email": f"c{n}@example.com", "phone": None}
+            yield {"email": "no-name@example.com"}
+            yield "not a customer"
+
+        with CaptureQueriesContext(connection) as queries:
+            result = upsert_customers(rows(), batch_size=3, max_errors=1)
+        self.assertEqual((result.created, result.updated, result.rejected), (6, 0, 2))
+        self.assertEqual(written, [4])
+        self.assertEqual(result.errors, [(6, "name is required.")])
+        inserts = [q["sql"] for q in queries if q["sql"].startswith("INSERT")]
+        self.assertEqual(len(inserts), 2)
+        self.assertIn("ON CONFLICT", inserts[0])
+
+
+# ==========================
+# Denormalized customer order stats
+# ==========================
+class CustomerOrderStatsTests(TestCase):
+    CUSTOMERS = """
+        query ($filters: Boolean!, $orderBy: String, $after: String) {
+          allCustomers(orderCount_Gte: 1, noOrderSince: "2025-06-01T00:00:00+00:00", orderBy: $orderBy, first: 2, after: $after)
+            @include(if: $filters) { edges { node { name } } pageInfo { endCursor } }
+          everyone: allCustomers(orderBy: $orderBy, first: 2, after: $after) @skip(if: $filters) {
+            edges { node { name orderCount lifetimeValue lastOrderAt } } pageInfo { endCursor hasNextPage }
+          }
+        }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.mouse = Product.objects.create(name="Mouse", price="25.50", stock=100)
+        cls.alice, cls.bob, cls.carol = (
+            Customer.objects.create(name=name, email=f"{name.lower()}@example.com") for name in ("Alice", "Bob", "Carol")
+        )
+
+    @staticmethod
+    def at(month, day=1):
+        return datetime.datetime(2025, month, day, 9, tzinfo=datetime.timezone.utc)
+
+    def stats(self, customer):
+        customer.refresh_from_db()
+        return customer.order_count, customer.lifetime_value, customer.last_order_at
+
+    def test_stats_follow_every_order_write(self):
+        march = Order.objects.place(self.alice, [(self.mouse.pk, 2)], order_date=self.at(3))
+        may = Order.objects.create(customer=self.alice, order_date=self.at(5), total_amount=10)
+        self.assertEqual(self.stats(self.alice), (2, Decimal("61.00"), self.at(5)))
+
+        may.total_amount = 15
+        may.order_date = self.at(2)
+        may.save()
+        self.assertEqual(self.stats(self.alice), (2, Decimal("66.00"), self.at(3)))
+
+        march.customer = self.bob
+        march.save()
+        self.assertEqual(self.stats(self.alice), (1, Decimal("15.00"), self.at(2)))
+        self.assertEqual(self.stats(self.bob), (1, Decimal("51.00"), self.at(3)))
+
+        may.delete()
+        self.assertEqual(self.stats(self.alice), (0, Decimal("0.00"), None))
+        import_orders([{"customer_email": "bob@example.com", "order_date": "2025-07-01T09:00:00Z",
+                        "lines": [{"product_id": self.mouse.pk}]}] * 2)
+        self.assertEqual(self.stats(self.bob), (3, Decimal("102.00"), self.at(7)))
+        self.assertEqual(rollups.reconcile_customers(dry_run=True), (3, 0))
+
+    def test_reconcile_repairs_drift(self):
+        Order.objects.create(customer=self.alice, order_date=self.at(3), total_amount=10)
+        Order.objects.create(customer=self.bob, order_date=self.at(4), total_amount=20)
+        Order.objects.filter(customer=self.bob).update(total_amount=25)  # untracked
+        Customer.objects.filter(pk=self.carol.pk).update(order_count=4, last_order_at=self.at(1))
+
+        out = StringIO()
+        call_command("reconcile_customer_stats", "--chunk-size", "2", stdout=out)
+        self.assertIn("Checked 3 customers, repaired 2", out.getvalue())
+        self.assertEqual(self.stats(self.bob), (1, Decimal("25.00"), self.at(4)))
+        self.assertEqual(self.stats(self.carol), (0, Decimal("0.00"), None))
+        self.assertEqual(self.stats(self.alice), (1, Decimal("10.00"), self.at(3)))
+
+    def test_filters_and_sorts_never_read_orders(self):
+        Order.objects.create(customer=self.alice, order_date=self.at(3), total_amount=300)
+        Order.objects.create(customer=self.bob, order_date=self.at(8), total_amount=100)
+        Order.objects.create(customer=self.bob, order_date=self.at(1), total_amount=100)
+
+        with CaptureQueriesContext(connection) as queries:
+            result = execute(self.CUSTOMERS, {"filters": True, "orderBy": "-lifetimeValue"})
+        self.assertIsNone(result.errors)
+        self.assertEqual([node["name"] for node in nodes(result.data["allCustomers"])], ["Alice"])
+        self.assertFalse([q for q in queries if '"crm_order"' in q["sql"]])
+
+        names, after = [], None
+        while True:
+            page = execute(self.CUSTOMERS, {"filters": False, "orderBy": "lastOrderAt", "after": after})
+            self.assertIsNone(page.errors)
+            names += [node["name"] for node in nodes(page.data["everyone"])]
+            if not page.data["everyone"]["pageInfo"]["hasNextPage"]:
+                break
+            after = page.data["everyone"]["pageInfo"]["endCursor"]
+        # Customers who never ordered sort last in either direction.
+        self.assertEqual(names, ["Alice", "Bob", "Carol"])
+        top = execute(self.CUSTOMERS, {"filters": False, "orderBy": "-lastOrderAt"}).data["everyone"]
+        self.assertEqual(nodes(top)[0], {
+            "name": "Bob", "orderCount": 2, "lifetimeValue": "200.00", "lastOrderAt": self.at(8).isoformat(),
+        })
+
+
+# ==========================
+# Trigram search
+# ==========================
+@skipUnless(connection.vendor == "sqlite", "the search index is SQLite-only")
+class SearchTests(TestCase):
+    SEARCH = """
+        query ($query: String!, $first: Int) {
+          searchCustomers(query: $query, first: $first) { name }
+          searchProducts(query: $query, first: $first) { name }
+        }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        for name, email, phone in [
+            ("Anna Bell", "anna@example.com", None),
+            ("Bella Jones", "bj@example.com", "+15550100"),
+            ("Carl Smith", "carl@bellmail.com", None),
+            ("Dora Lee", "dora@example.com", "5550199"),
+        ]:
+            Customer.objects.create(name=name, email=email, phone=phone)
+        for name in ("Bell Pepper Seeds", "Doorbell", "Lamp"):
+            Product.objects.create(name=name, price=5, stock=1)
+
+    def names(self, model, text):
+        ids = search.search(model, text, 20)
+        rows = model.objects.in_bulk(ids)
+        return [rows[pk].name for pk in ids]
+
+    def test_prefix_matches_rank_first_then_bm25(self):
+        self.assertEqual(self.names(Customer, "bell"), ["Bella Jones", "Anna Bell", "Carl Smith"])
+        self.assertEqual(self.names(Customer, "BELL JON"), ["Bella Jones"])
+        self.assertEqual(self.names(Customer, "555 01"), ["Bella Jones", "Dora Lee"])  # short word: icontains
+        self.assertEqual(self.names(Product, "bell"), ["Bell Pepper Seeds", "Doorbell"])
+        self.assertEqual(self.names(Customer, '"bell'), [])
+        with override_settings(CRM_SEARCH_CANDIDATES=2):  # too broad for bm25
+            self.assertEqual(self.names(Customer, "bell"), ["Bella Jones", "Anna Bell", "Carl Smith"])
+
+    def test_index_follows_every_write(self):
+        dora = Customer.objects.get(name="Dora Lee")
+        dora.name = "Dora Bellamy"
+        dora.save()
+        Customer.objects.get(name="Anna Bell").delete()
+        Customer.objects.filter(name="Carl Smith").update(email="carl@example.com")
+        upsert_customers([{"name": "Bellatrix", "email": "bj@example.com"}, {"name": "Ed Bell", "email": "ed@example.com"}])
+        # Order stats are written to the customer row without touching the index.
+        Order.objects.create(customer=dora, total_amount=10)
+        self.assertEqual(self.names(Customer, "bell"), ["Bellatrix", "Ed Bell", "Dora Bellamy"])
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO crm_customer_fts(crm_customer_fts, rank) VALUES ('integrity-check', 1)")
+
+    def test_dropped_triggers_disable_the_index_until_repaired(self):
+        # As after a migration that rebuilt crm_customer.
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER "crm_customer_fts_update"')
+        Customer.objects.filter(name="Anna Bell").update(name="Anna Smith")
+        qs = CustomerFilter(data={"name": "bell"}, queryset=Customer.objects.all()).qs
+        self.assertIn("LIKE", str(qs.query))
+        self.assertEqual(set(qs.values_list("name", flat=True)), {"Bella Jones"})
+
+        self.assertEqual(search.repair(connection), ["crm_customer_fts"])
+        self.assertEqual(search.repair(connection), [])
+        self.assertEqual(self.names(Customer, "bell"), ["Bella Jones", "Carl Smith"])
+
+    def test_filters_read_the_index(self):
+        cases = [
+            (CustomerFilter, {"name": "bell"}, {"Anna Bell", "Bella Jones"}),
+            (CustomerFilter, {"email": "BELLMAIL"}, {"Carl Smith"}),
+            (ProductFilter, {"name": "pepper"}, {"Bell Pepper Seeds"}),
+        ]
+        for filterset_class, data, expected in cases:
+            with self.subTest(data=data):
+                model = filterset_class._meta.model
+                qs = filterset_class(data=data, queryset=model.objects.all()).qs
+                self.assertNotIn("LIKE", str(qs.query))
+                self.assertEqual(set(qs.values_list("name", flat=True)), expected)
+                with override_settings(CRM_SEARCH_CANDIDATES=0):  # too broad: a LIKE scan
+                    fallback = filterset_class(data=data, queryset=model.objects.all()).qs
+                self.assertIn("LIKE", str(fallback.query))
+                self.assertEqual(set(fallback.values_list("name", flat=True)), expected)
+
+        Order.objects.create(customer=Customer.objects.get(name="Carl Smith"), total_amount=5).products.set(
+            [Product.objects.get(name="Doorbell")]
+        )
+        qs = OrderFilter(data={"customer_name": "smith", "product_name": "rbel"}, queryset=Order.objects.all()).qs
+        self.assertEqual(qs.count(), 1)
+
+    def test_graphql_fields(self):
+        result = execute(self.SEARCH, {"query": "bell", "first": 2})
+        self.assertIsNone(result.errors)
+        self.assertEqual(result.data["searchCustomers"], [{"name": "Bella Jones"}, {"name": "Anna Bell"}])
+        self.assertEqual(result.data["searchProducts"], [{"name": "Bell Pepper Seeds"}, {"name": "Doorbell"}])
+
+        with mock.patch.object(search, "available", return_value=False):  # e.g. PostgreSQL
+            result = execute(self.SEARCH, {"query": "bell"})
+        self.assertEqual([row["name"] for row in result.data["searchCustomers"]], ["Bella Jones", "Anna Bell", "Carl Smith"])
+
+        result = execute(self.SEARCH, {"query": "bell", "first": 1000})
+        self.assertIn("between 0 and", result.errors[0].message)
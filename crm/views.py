@@ -1,3 +1,289 @@
-from django.shortcuts import render
+import json
+from inspect import isawaitable
 
-# Create your views here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import close_old_connections, connection, transaction
+from django.http import (
+    Http404, HttpResponse, HttpResponseBadRequest, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse,
+)
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_GET
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.views import GraphQLView, HttpError
+from graphql import ExecutionResult, OperationType, execute, get_operation_ast, validate_schema
+
+from .cost import QueryCostError, check_budget, cost_settings
+from .documents import get_document_cache
+from .execution import ConcurrentRootExecutionContext
+from .exports import ExportError, export_lines
+from .persisted_queries import PersistedQueryError, get_persisted_queries, persisted_queries_enabled
+from .response_cache import get_response_cache, response_cache_enabled
+from .profiling import ProfilingMiddleware, Trace, metrics, profiling_enabled
+
+
+# ==========================
+# GraphQL Endpoint
+# ==========================
+class CRMGraphQLView(GraphQLView):
+    """
+    GraphQLView that takes parsed, validated documents from the LRU in
+    ``crm.documents``, so a repeated operation skips straight to execution.
+
+    Operations are costed before they run (``crm.cost``) and rejected over
+    budget; successful queries are cached in ``crm.response_cache`` until a
+    model they read is written. Also serves automatic persisted queries when
+    ``CRM_PERSISTED_QUERIES`` is on.
+
+    With ``CRM_PROFILING`` on, each operation gets a ``Trace``: resolver
+    timings from ``ProfilingMiddleware`` and every SQL statement from a DB
+    execute wrapper. Traces feed the process-wide metrics and, with
+    ``CRM_PROFILING_TRACE_RESPONSES``, are returned as
+    ``extensions.tracing``. With it off, nothing extra runs.
+    """
+
+    # Resolve the root fields of a query concurrently (see ``AsyncCRMGraphQLView``).
+    concurrent_root_fields = False
+
+    def get_response(self, request, data, show_graphiql=False):
+        if persisted_queries_enabled():
+            try:
+                data = self.resolve_persisted_query(request, data)
+            except PersistedQueryError as error:
+                return self.json_encode(request, {"errors": [self.format_error(error.as_graphql_error())]}), 200
+        if not profiling_enabled():
+            return super().get_response(request, data, show_graphiql)
+        # Named in execute_document from the operation actually run, never
+        # from the client's operationName.
+        request.crm_trace = Trace()
+        try:
+            return super().get_response(request, data, show_graphiql)
+        finally:
+            metrics.record(request.crm_trace)
+            del request.crm_trace
+
+    def resolve_persisted_query(self, request, data):
+        """Swap an APQ hash for its query text (see ``crm.persisted_queries``)."""
+        queries = get_persisted_queries()
+        if queries.allowlist:
+            queries.warm(self.schema.graphql_schema)
+        extensions = request.GET.get("extensions") or data.get("extensions")
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest("Extensions are invalid JSON."))
+        query = request.GET.get("query") or data.get("query")
+        resolved = queries.resolve(query, (extensions or {}).get("persistedQuery"))
+        if resolved == query:
+            return data
+        return {**data, "query": resolved}
+
+    def get_middleware(self, request):
+        middleware = super().get_middleware(request)
+        trace = getattr(request, "crm_trace", None)
+        if trace is None:
+            return middleware
+        # Outermost, so the timings include any other middleware.
+        return [ProfilingMiddleware(trace), *(middleware or ())]
+
+    def execute_graphql_request(self, request, *args, **kwargs):
+        trace = getattr(request, "crm_trace", None)
+        if trace is None:
+            return self.execute_document(request, *args, **kwargs)
+        with trace.recording():
+            return self.execute_document(request, *args, **kwargs)
+
+    def execute_document(self, request, data, query, variables, operation_name, show_graphiql=False):
+        """``GraphQLView.execute_graphql_request`` with parse + validate replaced by a cache lookup."""
+        if not query:
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        schema = self.schema.graphql_schema
+        schema_validation_errors = validate_schema(schema)
+        if schema_validation_errors:
+            return ExecutionResult(data=None, errors=schema_validation_errors)
+
+        document, errors = get_document_cache().lookup(
+            schema, query, self.validation_rules, graphene_settings.MAX_VALIDATION_ERRORS
+        )
+        if document is None:
+            return ExecutionResult(errors=errors)
+
+        operation_ast = get_operation_ast(document, operation_name)
+        trace = getattr(request, "crm_trace", None)
+        if trace is not None and operation_ast is not None:
+            trace.operation_name = operation_ast.name.value if operation_ast.name else "anonymous"
+        if (
+            request.method.lower() == "get"
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            if show_graphiql:
+                return None
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ["POST"],
+                    f"Can only perform a {operation_ast.operation.value} operation from a POST request.",
+                )
+            )
+        if errors:
+            return ExecutionResult(data=None, errors=errors)
+
+        if cost_settings()["enabled"]:
+            try:
+                request.crm_cost = check_budget(request, schema, document, operation_name, variables)
+            except QueryCostError as error:
+                request.crm_cost = error.report
+                return ExecutionResult(data=None, errors=[error.as_graphql_error()])
+
+        cache_key = None
+        if response_cache_enabled():
+            responses = get_response_cache()
+            plan = responses.plan(schema, document, query, operation_name)
+            if plan.cacheable:
+                cache_key = responses.key(plan, operation_name, variables)
+                data = responses.get(cache_key)
+                if data is not None:
+                    return ExecutionResult(data=data)
+
+        try:
+            execute_options = {
+                "root_value": self.get_root_value(request),
+                "context_value": self.get_context(request),
+                "variable_values": variables,
+                "operation_name": operation_name,
+                "middleware": self.get_middleware(request),
+            }
+            if self.execution_context_class:
+                execute_options["execution_context_class"] = self.execution_context_class
+
+            if (
+                operation_ast is not None
+                and operation_ast.operation == OperationType.MUTATION
+                and (
+                    graphene_settings.ATOMIC_MUTATIONS is True
+                    or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
+                )
+            ):
+                with transaction.atomic():
+                    result = execute(schema, document, **execute_options)
+                    if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                        transaction.set_rollback(True)
+                return result
+
+            if (
+                self.concurrent_root_fields
+                and operation_ast is not None
+                and operation_ast.operation == OperationType.QUERY
+                and len(operation_ast.selection_set.selections) > 1
+                and getattr(request, "crm_trace", None) is None
+            ):
+                result = async_to_sync(self.execute_concurrently)(schema, document, execute_options)
+            else:
+                result = execute(schema, document, **execute_options)
+            if cache_key is not None and not result.errors:
+                responses.set(cache_key, result.data)
+            return result
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+    @staticmethod
+    async def execute_concurrently(schema, document, execute_options):
+        result = execute(
+            schema, document, **{**execute_options, "execution_context_class": ConcurrentRootExecutionContext}
+        )
+        return await result if isawaitable(result) else result
+
+    def json_encode(self, request, d, pretty=False):
+        extensions = {}
+        cost = getattr(request, "crm_cost", None)
+        if cost is not None:
+            extensions["cost"] = cost
+        trace = getattr(request, "crm_trace", None)
+        if trace is not None and getattr(settings, "CRM_PROFILING_TRACE_RESPONSES", True):
+            extensions["tracing"] = trace.as_extension()
+        if extensions:
+            d = {**d, "extensions": extensions}
+        return super().json_encode(request, d, pretty)
+
+
+class AsyncCRMGraphQLView(CRMGraphQLView):
+    """
+    ASGI-native endpoint. Under ASGI a sync view runs on the single
+    thread-sensitive thread, so concurrent requests and their queries queue
+    up behind each other. Here each request is handled in a worker thread of
+    its own, and the root fields of a query are awaited together on the
+    event loop, each resolving in its own thread and DB connection (see
+    ``crm.execution``). Mutations and profiled requests execute serially.
+    """
+
+    view_is_async = True
+    concurrent_root_fields = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        return await sync_to_async(self.dispatch_in_worker, thread_sensitive=False)(request, *args, **kwargs)
+
+    def dispatch_in_worker(self, request, *args, **kwargs):
+        # request_finished only tidies the thread-sensitive thread's connection.
+        close_old_connections()
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            close_old_connections()
+
+
+# ==========================
+# Metrics Endpoint
+# ==========================
+def metrics_view(request):
+    """
+    Aggregated profiling counters in Prometheus text format (this process
+    only), for staff users or a scraper holding ``CRM_METRICS_TOKEN``.
+    """
+    if not profiling_enabled():
+        raise Http404("Profiling is disabled.")
+    token = getattr(settings, "CRM_METRICS_TOKEN", None)
+    if token and constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return render_metrics(request)
+    return staff_member_required(render_metrics)(request)
+
+
+def render_metrics(request):
+    lines = [metrics.render()]
+    for name, value in get_response_cache().stats().items():
+        lines.append(f"# TYPE crm_graphql_response_cache_{name}_total counter\n")
+        lines.append(f"crm_graphql_response_cache_{name}_total {value}\n")
+    for name, value in get_document_cache().stats().items():
+        kind = "gauge" if name in ("size", "maxsize") else "counter"
+        suffix = "" if kind == "gauge" else "_total"
+        lines.append(f"# TYPE crm_graphql_document_cache_{name}{suffix} {kind}\n")
+        lines.append(f"crm_graphql_document_cache_{name}{suffix} {value}\n")
+    return HttpResponse("".join(lines), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# ==========================
+# Export Endpoint
+# ==========================
+@require_GET
+@staff_member_required
+def export_view(request, name):
+    """
+    Stream every ``name`` row matching the query-string filters (the
+    FilterSet fields of ``crm/filters.py``) as NDJSON, or CSV with
+    ``?format=csv``. Rows are read and written a chunk at a time. Staff
+    only, like the admin: exports carry customer contact details.
+    """
+    params = request.GET.copy()
+    export_format = params.pop("format", ["ndjson"])[-1]
+    try:
+        lines, content_type = export_lines(name, export_format, params)
+    except ExportError as error:
+        return JsonResponse({"errors": [{"message": str(error)}]}, status=400)
+    response = StreamingHttpResponse(lines, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{name}.{export_format}"'
+    return response
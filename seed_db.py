@@ -1,4 +1,3 @@
-from django.utils import timezone
 import os
 import django
 
@@ -26,16 +25,10 @@ def run():
     for p in products:
         Product.objects.get_or_create(**p)
 
-    # Example order
+    # Example order: reserves stock and totals the lines in SQL
     customer = Customer.objects.first()
-    product_items = Product.objects.all()[:2]
-    total = sum(p.price for p in product_items)
-    order, _ = Order.objects.get_or_create(
-        customer=customer,
-        total_amount=total,
-        order_date=timezone.now()
-    )
-    order.products.set(product_items)
+    product_items = Product.objects.order_by("pk")[:2]
+    Order.objects.place(customer, [(p.pk, 1) for p in product_items])
 
     print("Database seeded successfully!")
 